@@ -0,0 +1,371 @@
+"""
+BENCHMARK DO PIPELINE:
+- gera uma escada de instâncias (de ~50 a ~5000 UMs) com sementes fixas usando o gerador
+- mede cada etapa separadamente: carga, construção do modelo, heurística, solver (tempo limite fixo),
+  extração, gráficos e exportação
+- separa o tempo do solver (Gurobi) do overhead em Python, que é o que dá para otimizar
+- acumula as execuções em um histórico JSONL e compara com uma base salva para apontar regressões
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+import importlib.util
+from datetime import datetime
+
+import numpy as np
+import gurobipy as gp
+
+import dissertacao_visualizacoes as dv
+
+# ====================== ⚙️ CONFIGURAÇÕES ======================
+PASTA_BENCHMARK = os.path.join(os.path.dirname(__file__), 'Otimizacao', 'Benchmarks')
+PASTA_INSTANCIAS_BENCHMARK = os.path.join(PASTA_BENCHMARK, 'instancias')
+PASTA_VISUALIZACOES_BENCHMARK = os.path.join(PASTA_BENCHMARK, 'visualizacoes')
+# CSVs exportados e logs do Gurobi ficam fora de Otimizacao/Resultados, junto dos resultados reais do lote
+PASTA_RESULTADOS_BENCHMARK = os.path.join(PASTA_BENCHMARK, 'resultados')
+ARQUIVO_HISTORICO = os.path.join(PASTA_BENCHMARK, 'historico.jsonl')
+ARQUIVO_BASE = os.path.join(PASTA_BENCHMARK, 'base.json')
+
+# Semente própria do benchmark: as instâncias são sempre as mesmas entre execuções e máquinas
+SEMENTE_BENCHMARK = 7
+# Tempo limite do solver em cada degrau (s): fixo para que as execuções sejam comparáveis
+LIMITE_SOLVER = 10
+THREADS_BENCHMARK = 1
+REPETICOES = 1
+
+# Uma etapa regrediu se ficou TOLERANCIA_REGRESSAO mais lenta que a base e pelo menos
+# LIMIAR_REGRESSAO segundos mais lenta (evita alarmes por ruído em etapas de milissegundos)
+TOLERANCIA_REGRESSAO = 0.20
+LIMIAR_REGRESSAO = 0.05
+
+# Escada de tamanhos, no mesmo formato das CONFIGURACOES do gerador (o rótulo é o max_ums)
+ESCADA_TAMANHOS = [
+    {'num_veiculos': 4, 'max_ums': 50, 'num_clientes': 4, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},
+    {'num_veiculos': 10, 'max_ums': 200, 'num_clientes': 10, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},
+    {'num_veiculos': 30, 'max_ums': 500, 'num_clientes': 30, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},
+    {'num_veiculos': 50, 'max_ums': 1000, 'num_clientes': 60, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},
+    {'num_veiculos': 80, 'max_ums': 2000, 'num_clientes': 120, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},
+    {'num_veiculos': 150, 'max_ums': 5000, 'num_clientes': 300, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},
+]
+
+# Ordem das etapas no relatório; 'otimizacao' é o tempo do Gurobi, as demais são overhead em Python
+ETAPAS = ('carregar_dados', 'presolve', 'construcao_modelo', 'heuristica_construtiva', 'otimizacao',
+          'extracao_solucao', 'visualizacoes', 'exportacao_csv')
+ETAPA_SOLVER = 'otimizacao'
+
+# ====================== 🔧 GERADOR ======================
+
+
+def importar_gerador():
+    # O arquivo do gerador tem hífen no nome, então não dá para usar import direto
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gerador-instancias.py')
+    spec = importlib.util.spec_from_file_location('gerador_instancias', caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules['gerador_instancias'] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def gerar_escada(gerador, tamanhos):
+    # Gera (ou regenera, com o mesmo conteúdo) uma instância por degrau e devolve [(rótulo, caminho)]
+    escada = []
+    for config in ESCADA_TAMANHOS:
+        if tamanhos and config['max_ums'] not in tamanhos:
+            continue
+        rng = np.random.default_rng(
+            gerador.semente_instancia(config, 1, 'centro', SEMENTE_BENCHMARK))
+        info = gerador.gerar_instancia(config, 'centro', 1, rng,
+                                       pasta_saida=PASTA_INSTANCIAS_BENCHMARK)
+        escada.append((config['max_ums'], os.path.join(
+            PASTA_INSTANCIAS_BENCHMARK, f"{info['Arquivo']}.csv")))
+    return escada
+
+# ====================== ⏱️ MEDIÇÃO ======================
+
+
+def medir_degrau(caminho):
+    # Executa o pipeline completo de uma instância medindo cada etapa com medir_fase
+    fases = dv.nova_medicao()
+    nome = dv.nome_da_instancia(os.path.basename(caminho))
+
+    with dv.medir_fase(fases, 'carregar_dados'):
+        instancia = dv.criar_instancia(caminho)
+
+    # Mesmo caminho de executar_instancia_com_timeout: o modelo é construído sobre a instância reduzida
+    reduzida, relatorio = instancia, None
+    if dv.presolve_aplicavel():
+        with dv.medir_fase(fases, 'presolve'):
+            reduzida, relatorio = dv.presolve_instancia(instancia)
+
+    erro = None
+    resultados = None
+    try:
+        resultados = dv.resolver_instancia(nome, reduzida, THREADS_BENCHMARK, fases)
+        if resultados and relatorio is not None:
+            resultados = dv.restaurar_resultados_presolve(resultados, instancia, relatorio)
+    except gp.GurobiError as e:
+        # Ex.: licença limitada ("Model too large"); as etapas medidas até aqui continuam valendo
+        erro = str(e)
+
+    if resultados and resultados['melhor_solucao'] is not None:
+        # Mede o formato de gráficos que o lote de fato usa (FORMATO_GRAFICOS, registrado nos parâmetros)
+        if dv.FORMATO_GRAFICOS == 'relatorio':
+            with dv.medir_fase(fases, 'visualizacoes'):
+                dv.gerar_relatorio_lote([resultados], [instancia], os.path.join(
+                    PASTA_VISUALIZACOES_BENCHMARK, f"relatorio_{nome}.pdf"))
+        else:
+            fases_graficos = dv.nova_medicao()
+            dv.gerar_visualizacoes(resultados, instancia, PASTA_VISUALIZACOES_BENCHMARK, fases_graficos)
+            fases.append({
+                'fase': 'visualizacoes',
+                'tempo_parede': sum(f['tempo_parede'] for f in fases_graficos),
+                'tempo_cpu': sum(f['tempo_cpu'] for f in fases_graficos),
+                'memoria_pico_mb': max((f['memoria_pico_mb'] for f in fases_graficos
+                                        if f['memoria_pico_mb'] is not None), default=None),
+            })
+        with dv.medir_fase(fases, 'exportacao_csv'):
+            dv.exportar_resultados_csv([resultados], [instancia], PASTA_RESULTADOS_BENCHMARK)
+
+    etapas = {f['fase']: {'tempo_parede': f['tempo_parede'], 'tempo_cpu': f['tempo_cpu'],
+                          'memoria_pico_mb': f['memoria_pico_mb']} for f in fases}
+    return {
+        'instancia': nome,
+        'ums': len(instancia['ums']),
+        'veiculos': len(instancia['veiculos']),
+        'status': resultados['status'] if resultados else None,
+        'melhor_solucao': resultados['melhor_solucao'] if resultados else None,
+        'nos_explorados': resultados.get('nos_explorados') if resultados else None,
+        'erro': erro,
+        'etapas': etapas,
+    }
+
+
+def resumir_repeticoes(medicoes):
+    # Mediana de cada etapa entre as repetições; tempo do solver e overhead Python separados
+    degrau = dict(medicoes[-1])
+    etapas = {}
+    for etapa in ETAPAS:
+        valores = [m['etapas'][etapa] for m in medicoes if etapa in m['etapas']]
+        if not valores:
+            continue
+        memorias = [v['memoria_pico_mb'] for v in valores if v['memoria_pico_mb'] is not None]
+        etapas[etapa] = {
+            'tempo_parede': statistics.median(v['tempo_parede'] for v in valores),
+            'tempo_cpu': statistics.median(v['tempo_cpu'] for v in valores),
+            'memoria_pico_mb': max(memorias) if memorias else None,
+        }
+    degrau['etapas'] = etapas
+    degrau['tempo_total'] = sum(e['tempo_parede'] for e in etapas.values())
+    degrau['tempo_solver'] = etapas.get(ETAPA_SOLVER, {}).get('tempo_parede', 0.0)
+    degrau['overhead_python'] = degrau['tempo_total'] - degrau['tempo_solver']
+    degrau['repeticoes'] = len(medicoes)
+    return degrau
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar_benchmark(tamanhos=None, repeticoes=REPETICOES, usar_cache=False):
+    # Configura o módulo principal para medir só o pipeline: sem memo, sem cache de modelo,
+    # sem trajetória e com o mesmo tempo limite em todos os degraus
+    dv.INSTRUMENTACAO = 'rss'
+    dv.TIMEOUT = LIMITE_SOLVER
+    dv.USAR_CACHE_BINARIO = usar_cache
+    dv.USAR_CACHE_MODELO = False
+    dv.CAPTURAR_TRAJETORIA = False
+    dv.MODO_SOLUCAO = 'mip'
+    dv.MODO_DECOMPOSICAO = False
+    dv.PASTA_LOGS_GUROBI = PASTA_RESULTADOS_BENCHMARK
+
+    escada = gerar_escada(importar_gerador(), tamanhos)
+    degraus = []
+    for rotulo, caminho in escada:
+        if usar_cache:
+            # Aquece o cache binário: a carga medida é a leitura do cache, não a do CSV
+            dv.carregar_dados(caminho)
+        medicoes = [medir_degrau(caminho) for _ in range(repeticoes)]
+        degrau = resumir_repeticoes(medicoes)
+        degrau['degrau'] = rotulo
+        degraus.append(degrau)
+
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'ambiente': {
+            'python': platform.python_version(),
+            'gurobi': '.'.join(map(str, gp.gurobi.version())),
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parametros': {
+            'semente': SEMENTE_BENCHMARK,
+            'limite_solver': LIMITE_SOLVER,
+            'threads': THREADS_BENCHMARK,
+            'repeticoes': repeticoes,
+            'cache_binario': usar_cache,
+            'presolve': dv.presolve_aplicavel(),
+            'simetria': dv.QUEBRA_SIMETRIA,
+            'formato_graficos': dv.FORMATO_GRAFICOS,
+        },
+        'degraus': degraus,
+    }
+
+# ====================== 📚 HISTÓRICO E COMPARAÇÃO ======================
+
+
+def gravar_historico(execucao):
+    os.makedirs(PASTA_BENCHMARK, exist_ok=True)
+    with open(ARQUIVO_HISTORICO, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(execucao, ensure_ascii=False) + '\n')
+
+
+def ultima_execucao():
+    try:
+        with open(ARQUIVO_HISTORICO, encoding='utf-8') as f:
+            linhas = [linha for linha in f if linha.strip()]
+    except OSError:
+        return None
+    return json.loads(linhas[-1]) if linhas else None
+
+
+def degraus_com_falha(execucao):
+    # Degraus em que o solver falhou: as etapas depois dele não foram medidas
+    return [d for d in execucao['degraus'] if d.get('erro')]
+
+
+def salvar_base(execucao):
+    os.makedirs(PASTA_BENCHMARK, exist_ok=True)
+    with open(ARQUIVO_BASE, 'w', encoding='utf-8') as f:
+        json.dump(execucao, f, ensure_ascii=False, indent=2)
+    print(f"📌 Base salva em: {ARQUIVO_BASE} (commit {execucao.get('commit') or 'N/A'})")
+
+
+def comparar_com_base(execucao, base):
+    # Lista de regressões (degrau, medida, base, atual). O tempo do solver é fixado pelo limite,
+    # então só o overhead Python e as etapas Python são avaliados
+    regressoes = []
+    if execucao['parametros'] != base['parametros']:
+        print(f"⚠️ Parâmetros diferentes da base: {base['parametros']} -> {execucao['parametros']}")
+
+    degraus_base = {d['degrau']: d for d in base['degraus']}
+    for degrau in execucao['degraus']:
+        anterior = degraus_base.get(degrau['degrau'])
+        if anterior is None:
+            continue
+        medidas = [('overhead_python', anterior['overhead_python'], degrau['overhead_python'])]
+        medidas += [(etapa, anterior['etapas'][etapa]['tempo_parede'], degrau['etapas'][etapa]['tempo_parede'])
+                    for etapa in ETAPAS
+                    if etapa != ETAPA_SOLVER and etapa in degrau['etapas'] and etapa in anterior['etapas']]
+        for medida, valor_base, valor_atual in medidas:
+            if (valor_atual > valor_base * (1 + TOLERANCIA_REGRESSAO)
+                    and valor_atual - valor_base > LIMIAR_REGRESSAO):
+                regressoes.append((degrau['degrau'], medida, valor_base, valor_atual))
+    return regressoes
+
+
+def imprimir_execucao(execucao, base=None):
+    degraus_base = {d['degrau']: d for d in base['degraus']} if base else {}
+    print(f"\n{'='*80}")
+    print(f" ⏱️ BENCHMARK {execucao['data']} (commit {execucao.get('commit') or 'N/A'})")
+    print(f"{'='*80}")
+    for degrau in execucao['degraus']:
+        print(f"\n📦 {degrau['instancia']} ({degrau['ums']} UMs, {degrau['veiculos']} veículos)")
+        if degrau.get('erro'):
+            print(f"  ❌ Solver: {degrau['erro']}")
+        elif degrau.get('nos_explorados') is not None:
+            print(f"  🌳 Nós explorados: {degrau['nos_explorados']}")
+        anterior = degraus_base.get(degrau['degrau'])
+        for etapa in ETAPAS:
+            if etapa not in degrau['etapas']:
+                continue
+            valor = degrau['etapas'][etapa]['tempo_parede']
+            linha = f"  {etapa:<24} {valor:9.3f}s"
+            if anterior and etapa in anterior['etapas']:
+                linha += f"  (base {anterior['etapas'][etapa]['tempo_parede']:9.3f}s)"
+            print(linha)
+        linha = (f"  {'solver (Gurobi)':<24} {degrau['tempo_solver']:9.3f}s | "
+                 f"overhead Python {degrau['overhead_python']:9.3f}s")
+        if anterior:
+            linha += f"  (base {anterior['overhead_python']:9.3f}s)"
+        print(linha)
+
+# ====================== 🚀 EXECUÇÃO PRINCIPAL ======================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline em uma escada de tamanhos')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=None,
+                        help=f"Degraus a executar (max_ums): {[c['max_ums'] for c in ESCADA_TAMANHOS]}")
+    parser.add_argument('--limite', type=float, default=LIMITE_SOLVER,
+                        help='Tempo limite do solver em cada degrau (s)')
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES,
+                        help='Repetições por degrau (o histórico guarda a mediana)')
+    parser.add_argument('--presolve', action='store_true',
+                        help='Reduz cada instância com o presolve antes de construir o modelo')
+    parser.add_argument('--simetria', choices=['ativacao', 'carga'], default=None,
+                        help='Quebra a simetria entre veículos idênticos (ver dissertacao_visualizacoes)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Mede a carga a partir do cache binário em vez do CSV')
+    parser.add_argument('--salvar-base', action='store_true',
+                        help='Usa esta execução como base das próximas comparações')
+    parser.add_argument('--comparar', action='store_true',
+                        help='Compara com a base e termina com código 1 se houver regressão')
+    parser.add_argument('--ultimo', action='store_true',
+                        help='Não executa: usa a última execução do histórico (com --comparar/--salvar-base)')
+    args = parser.parse_args()
+
+    LIMITE_SOLVER = args.limite
+    dv.PRESOLVE = args.presolve
+    dv.QUEBRA_SIMETRIA = args.simetria or False
+
+    if args.ultimo:
+        execucao = ultima_execucao()
+        if execucao is None:
+            sys.exit(f"❌ Histórico vazio: {ARQUIVO_HISTORICO}")
+    else:
+        execucao = executar_benchmark(args.tamanhos, args.repeticoes, args.cache)
+        gravar_historico(execucao)
+        print(f"\n📄 Execução registrada em: {ARQUIVO_HISTORICO}")
+
+    base = None
+    if args.comparar:
+        try:
+            with open(ARQUIVO_BASE, encoding='utf-8') as f:
+                base = json.load(f)
+        except OSError:
+            sys.exit(f"❌ Nenhuma base salva em {ARQUIVO_BASE} (use --salvar-base)")
+
+    imprimir_execucao(execucao, base)
+
+    falhas = degraus_com_falha(execucao)
+    if falhas:
+        print(f"\n🔴 Solver falhou em {len(falhas)} degrau(s); as etapas seguintes não foram medidas:")
+        for degrau in falhas:
+            print(f"  degrau {degrau['degrau']}: {degrau['erro']}")
+        if args.salvar_base:
+            print("❌ Execução incompleta: a base não foi salva")
+        sys.exit(1)
+
+    if args.salvar_base:
+        salvar_base(execucao)
+
+    if base is not None:
+        regressoes = comparar_com_base(execucao, base)
+        if regressoes:
+            print(f"\n🔴 {len(regressoes)} regressão(ões) em relação à base (commit {base.get('commit') or 'N/A'}):")
+            for degrau, medida, valor_base, valor_atual in regressoes:
+                print(f"  degrau {degrau}: {medida} {valor_base:.3f}s -> {valor_atual:.3f}s "
+                      f"(+{(valor_atual / valor_base - 1) * 100 if valor_base else float('inf'):.0f}%)")
+            sys.exit(1)
+        print("\n✅ Nenhuma regressão em relação à base")
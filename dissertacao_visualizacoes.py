@@ -9,11 +9,23 @@ import pandas as pd
 # utilizar PANDAS para ler/processar os arquivos CSV de forma mais avançada, analisar os resultados da otimização e gerar relatórios
 
 import csv  # Leitura e escrita de arquivos no formato CSV
+import json
+import hashlib
+import shutil
+import tempfile
 # Cria dicionários com valores padrão para chaves não existentes (destino_para_clientes = defaultdict(list))
 from collections import defaultdict
 import os  # Para operações com caminhos de arquivo
 
 from datetime import datetime
+import time
+import tracemalloc
+from contextlib import contextmanager
+import threading
+import multiprocessing as mp
+import multiprocessing.connection
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import os
 # os.environ['GRB_LICENSE_ID'] = '5afd4a9d-d0cd-4de6-a329-20ed5d23f84b' #configura uma variável de ambiente que o Gurobi verificará automaticamente
@@ -21,92 +33,508 @@ import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.ticker import PercentFormatter
+from matplotlib.backends.backend_pdf import PdfPages
 import numpy as np
+import scipy.sparse as sp
 
 TIMEOUT = 60  # em segundos
+# Constrói o modelo apenas com as variáveis x[i,v,c] viáveis (ver criar_modelo_esparso)
+MODELO_ESPARSO = True
+# Construtor do modelo: 'quicksum' (criar_modelo, uma restrição por vez) ou 'matricial' (criar_modelo_matricial)
+CONSTRUTOR_MODELO = 'quicksum'
+# Formulação: 'ivc' (x[i,v,c] com ligação x_ivc <= y_vc) ou 'iv' (x[i,v] com ligação agregada por par (v, c))
+FORMULACAO = 'ivc'
+# Resolve cada região (R1-R4) como um subproblema independente em paralelo (ver resolver_por_regiao)
+MODO_DECOMPOSICAO = False
+# Reduz a instância antes de construir o modelo (ver presolve_instancia): remove veículos, UMs e clientes
+# que não podem fazer parte de nenhuma solução e restaura os resultados para a instância original
+PRESOLVE = False
+# Versão das regras do presolve: alterar invalida os modelos em cache das instâncias reduzidas
+VERSAO_PRESOLVE = 1
+# Quebra de simetria entre veículos idênticos (mesmo tipo, região, capacidades, custo e carga mínima,
+# ver adicionar_quebra_simetria): False desliga; 'ativacao' ordena alpha dentro de cada classe;
+# 'carga' ordena também o peso carregado
+QUEBRA_SIMETRIA = False
+# Fornece a solução da heurística construtiva como MIP start ao Gurobi
+SOLUCAO_INICIAL = True
+# 'mip' resolve com o Gurobi; 'heuristica' usa apenas o solver heurístico (resolver_heuristica), com TIMEOUT como orçamento
+MODO_SOLUCAO = 'mip'
+# Constantes de execução repassadas aos workers do lote paralelo (ver configuracao_atual)
+CONFIGURACAO_EXECUCAO = ('TIMEOUT', 'MODELO_ESPARSO', 'CONSTRUTOR_MODELO', 'FORMULACAO',
+                         'MODO_DECOMPOSICAO', 'SOLUCAO_INICIAL', 'MODO_SOLUCAO', 'PRESOLVE',
+                         'QUEBRA_SIMETRIA', 'USAR_CACHE_BINARIO', 'USAR_CACHE_MODELO',
+                         'USAR_MEMO_RESULTADOS', 'FORCAR_RESOLUCAO', 'INSTRUMENTACAO', 'CAPTURAR_TRAJETORIA',
+                         'FORMATO_GRAFICOS', 'AGRUPAMENTO_HEATMAP')
+# Prazo de cada worker do lote paralelo: LIMITE_WORKER_FATOR * TIMEOUT + LIMITE_WORKER_FOLGA segundos
+LIMITE_WORKER_FATOR = 2
+LIMITE_WORKER_FOLGA = 120
+# Guarda cada instância lida em formato binário (pasta <arquivo>.cache ao lado do CSV, ver carregar_dados)
+USAR_CACHE_BINARIO = True
+# Versão do formato do cache binário: alterar invalida os caches existentes
+VERSAO_CACHE = 1
+# Reaproveita modelos já construídos (.mps.gz + mapa de variáveis em Otimizacao/cache_modelos, ver construir_modelo)
+USAR_CACHE_MODELO = False
+# Formato do arquivo do modelo em cache: 'mps.gz' lê ~2x mais rápido que 'mps.bz2' com tamanho parecido;
+# 'mps' (sem compressão) é o mais rápido mas ocupa ~8x mais disco
+FORMATO_CACHE_MODELO = 'mps.gz'
+# Versão dos construtores de modelo: incrementar sempre que a formulação gerada mudar
+VERSAO_MODELO = 1
+PASTA_CACHE_MODELOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Otimizacao', 'cache_modelos')
+# Guarda os resultados de cada instância do lote e os reaproveita enquanto instância, parâmetros e
+# versão do código não mudarem (ver _executar_arquivo); FORCAR_RESOLUCAO resolve tudo de novo
+USAR_MEMO_RESULTADOS = True
+FORCAR_RESOLUCAO = False
+# Versão do código que produz os resultados (heurísticas, decomposição, extração): incrementar invalida o memo
+VERSAO_RESULTADOS = 2
+# Constantes que alteram o resultado de uma instância e por isso entram na chave do memo
+PARAMETROS_RESULTADO = ('TIMEOUT', 'MODELO_ESPARSO', 'CONSTRUTOR_MODELO', 'FORMULACAO',
+                        'MODO_DECOMPOSICAO', 'SOLUCAO_INICIAL', 'MODO_SOLUCAO', 'PRESOLVE',
+                        'QUEBRA_SIMETRIA')
+PASTA_MEMO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     'Otimizacao', 'Resultados', 'memo')
+# Registro por instância do lote em andamento, gravado assim que a instância termina (ver --retomar)
+PASTA_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'Otimizacao', 'Resultados', 'checkpoint')
+# Medição por fase (carga, construção, heurística, otimização, extração, cada gráfico):
+# False desliga; 'rss' registra o pico do RSS do processo (inclui o Gurobi) amostrado durante cada fase;
+# 'tracemalloc' registra o pico das alocações Python/NumPy dentro de cada fase (mais lento)
+INSTRUMENTACAO = False
+# Intervalo (s) entre as amostras de RSS no modo 'rss'
+INTERVALO_RSS = 0.01
+# Registra a trajetória do Gurobi (incumbente, bound, nós e gap ao longo do tempo) via callback
+CAPTURAR_TRAJETORIA = False
+# Intervalo mínimo (s) entre amostras nos eventos MIP; toda nova incumbente (MIPSOL) é sempre registrada
+INTERVALO_TRAJETORIA = 0.5
+# Gráficos por instância: gerados em um pool de processos em segundo plano (ver iniciar_fila_graficos),
+# sem bloquear a resolução da próxima instância; False não gera gráficos
+GERAR_GRAFICOS = True
+WORKERS_GRAFICOS = 1
+# 'relatorio': um único PDF por lote (visão geral do lote + uma página por instância, ver gerar_relatorio_lote);
+# 'png': os arquivos PNG separados de gerar_visualizacoes para cada instância
+FORMATO_GRAFICOS = 'relatorio'
+# Linhas do heatmap de compatibilidade: 'perfil' (um padrão de compatibilidade por linha) ou
+# 'regiao' (padrão de compatibilidade dentro de cada região de destino)
+AGRUPAMENTO_HEATMAP = 'perfil'
+PASTA_VISUALIZACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Otimizacao', 'Visualizacoes')
+# Pasta dos logs do Gurobi (gurobi_log_<instância>.log), criada por resolver_instancia se não existir
+PASTA_LOGS_GUROBI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Otimizacao', 'Resultados')
+
+# ====================== INSTRUMENTAÇÃO ====================== #
+
+
+def nova_medicao():
+    # Lista onde medir_fase acumula as fases de uma instância; None quando a instrumentação está desligada
+    return [] if INSTRUMENTACAO else None
+
+
+def _rss_atual_mb():
+    # RSS atual do processo (não o pico da vida do processo, como ru_maxrss); None fora do Linux
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _iniciar_amostragem_rss():
+    # Thread que amostra o RSS a cada INTERVALO_RSS enquanto a fase executa; o pico fica em amostragem['pico']
+    amostragem = {'pico': _rss_atual_mb(), 'parar': threading.Event(), 'thread': None}
+    if amostragem['pico'] is None:
+        return amostragem
+
+    def amostrar():
+        while not amostragem['parar'].wait(INTERVALO_RSS):
+            amostragem['pico'] = max(amostragem['pico'], _rss_atual_mb() or 0.0)
+
+    amostragem['thread'] = threading.Thread(target=amostrar, daemon=True)
+    amostragem['thread'].start()
+    return amostragem
+
+
+def _encerrar_amostragem_rss(amostragem):
+    # Pico de RSS (MB) observado entre o início e o fim da fase
+    if amostragem['thread'] is None:
+        return None
+    amostragem['parar'].set()
+    amostragem['thread'].join()
+    return max(amostragem['pico'], _rss_atual_mb() or 0.0)
+
+
+@contextmanager
+def medir_fase(fases, nome):
+    # Registra tempo de parede, tempo de CPU e pico de memória do bloco em 'fases'
+    # Com fases=None (instrumentação desligada) não mede nada
+    if fases is None:
+        yield
+        return
+
+    amostragem = None
+    if INSTRUMENTACAO == 'tracemalloc':
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    else:
+        amostragem = _iniciar_amostragem_rss()
+    inicio_parede = time.perf_counter()
+    inicio_cpu = time.process_time()
+    try:
+        yield
+    finally:
+        if INSTRUMENTACAO == 'tracemalloc':
+            memoria = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        else:
+            memoria = _encerrar_amostragem_rss(amostragem)
+        fases.append({
+            'fase': nome,
+            'tempo_parede': time.perf_counter() - inicio_parede,
+            'tempo_cpu': time.process_time() - inicio_cpu,
+            'memoria_pico_mb': memoria,
+        })
+
 # ====================== CARREGAMENTO DE DADOS ====================== #
 
 # Lê o arquivo csv e organiza os dados em estruturas Python
 # Retorna um dicionário com parametros, veiculos, ums e clientes
+# Com USAR_CACHE_BINARIO, a primeira leitura grava o cache e as seguintes o usam enquanto o CSV não mudar
 
 
 def carregar_dados(caminho_arquivo):
+    if not USAR_CACHE_BINARIO:
+        return ler_instancia_csv(caminho_arquivo)
+
+    meta = cache_valido(caminho_arquivo)
+    if meta is not None:
+        return ler_cache(pasta_cache(caminho_arquivo), meta)
+
+    dados = ler_instancia_csv(caminho_arquivo)
+    try:
+        salvar_cache(caminho_arquivo, dados)
+    except OSError as e:
+        # Pasta somente leitura, disco cheio etc.: segue sem cache
+        print(f"⚠️ Não foi possível gravar o cache de {caminho_arquivo}: {e}")
+    return dados
+
+
+def ler_instancia_csv(caminho_arquivo):
 
     dados = {
         'parametros': {},  # Dados globais (ex penalidades)
         'veiculos': [],   # Lista de veículos disponíveis
         'ums': [],        # Unidades Metalicas para transportar
-        'clientes': []    # Clientes por região
+        'clientes': [],   # Clientes por região
+        'colunas': {}     # Visão colunar das UMs (arrays NumPy alinhados com 'ums')
     }
 
-    # Abre o arquivo CSV no modo leitura ('r') com encoding UTF-8
-    with open(caminho_arquivo, mode='r', encoding='utf-8') as file:
-        # DictReader lê cada linha como um dicionário
-        reader = csv.DictReader(file, delimiter=';')
-        for row in reader:  # para cada linha do arquivo
-            tipo = row['tipo']
-
-            if tipo == 'parametro':  # Ex: Tipo: Penalidade por não alocação | Valor: 0.1
-                dados['parametros'][row['descricao']] = float(row['valor'])
-
-            elif tipo == 'cliente':
-                dados['clientes'].append({
-                    'id': int(row['id']),
-                    'nome': row['descricao'],
-                    'destino': row['destino']
-                })
+    # Lê o arquivo inteiro de uma vez como texto (células vazias permanecem '') e converte cada seção
+    # com operações vetorizadas, em vez de linha a linha
+    df = pd.read_csv(caminho_arquivo, sep=';', dtype=str, keep_default_na=False,
+                     encoding='utf-8')
+    secoes = {tipo: grupo for tipo, grupo in df.groupby('tipo', sort=False)}
+    vazio = df.iloc[0:0]
+
+    # Ex: Tipo: Penalidade por não alocação | Valor: 0.1
+    parametros = secoes.get('parametro', vazio)
+    dados['parametros'] = dict(zip(parametros['descricao'],
+                                   parametros['valor'].astype(float).tolist()))
+
+    clientes = secoes.get('cliente', vazio)
+    dados['clientes'] = [
+        {'id': id_, 'nome': nome, 'destino': destino}
+        for id_, nome, destino in zip(clientes['id'].astype(int).tolist(),
+                                      clientes['descricao'].tolist(),
+                                      clientes['destino'].tolist())
+    ]
 
-            elif tipo == 'veiculo':
-                dados['veiculos'].append({
-                    'id': int(row['id']),
-                    'tipo': row['descricao'].replace('Veiculo_', ''),
-                    'capacidade_peso': float(row['capacidade_peso']),
-                    'capacidade_volume': float(row['capacidade_vol']),
-                    'custo': float(row['custo']),
-                    'carga_minima': float(row['carga_minima']),
-                    'destino': row['destino'] if 'destino' in row else None
-                })
+    veiculos = secoes.get('veiculo', vazio)
+    destinos_veiculos = (veiculos['destino'].tolist() if 'destino' in veiculos.columns
+                         else [None] * len(veiculos))
+    dados['veiculos'] = [
+        {
+            'id': id_,
+            'tipo': tipo,
+            'capacidade_peso': cap_peso,
+            'capacidade_volume': cap_vol,
+            'custo': custo,
+            'carga_minima': carga_minima,
+            'destino': destino
+        }
+        for id_, tipo, cap_peso, cap_vol, custo, carga_minima, destino in zip(
+            veiculos['id'].astype(int).tolist(),
+            veiculos['descricao'].str.replace(
+                'Veiculo_', '', regex=False).tolist(),
+            veiculos['capacidade_peso'].astype(float).tolist(),
+            veiculos['capacidade_vol'].astype(float).tolist(),
+            veiculos['custo'].astype(float).tolist(),
+            veiculos['carga_minima'].astype(float).tolist(),
+            destinos_veiculos)
+    ]
 
-            elif tipo == 'um':
-                cliente_id = int(row['cliente'])
-                # Se o cliente for encontrado, pega o campo 'destino'. Se não for encontrado, define um valor padrão (vazio)
-                # Encontra o cliente correspondente na lista de clientes
-                destino = next(
-                    (c['destino'] for c in dados['clientes'] if c['id'] == cliente_id), '')
-
-                compatibilidade = row['compatibilidade'].strip()
-                if not compatibilidade:
-                    compatibilidade = ",".join(
-                        str(v['tipo']) for v in dados['veiculos'])
-
-                dados['ums'].append({
-                    'id': int(row['id']),
-                    'tipo': row['descricao'],
-                    'peso': float(row['peso']),
-                    'volume': float(row['volume']),
-                    'destino': destino,
-                    'cliente': cliente_id,
-                    'compatibilidade': row['compatibilidade'] or ",".join(str(v['tipo']) for v in dados['veiculos']),
-                    'restricao': row['restricao'],
-                    'penalidade': float(row['penalidade'])
-                })
+    ums = secoes.get('um', vazio)
+    # Destino da UM = destino do seu cliente (índice por id em vez de busca linear; '' se não encontrado)
+    destino_cliente = {c['id']: c['destino'] for c in dados['clientes']}
+    # Compatibilidade padrão (UM sem restrição de veículo): todos os tipos da frota, calculada uma vez
+    compatibilidade_padrao = ",".join(str(v['tipo']) for v in dados['veiculos'])
+
+    # Perfis de compatibilidade (formato compacto): linhas 'compatibilidade' com a lista de tipos e
+    # UMs referenciando o perfil como '#id'. Arquivos antigos trazem a lista completa em cada UM.
+    perfis_arquivo = secoes.get('compatibilidade', vazio)
+    textos_perfil = dict(zip(('#' + perfis_arquivo['id']).tolist(),
+                             perfis_arquivo['compatibilidade'].tolist()))
+    # Cada texto distinto é decodificado uma única vez; UMs do mesmo perfil compartilham o texto e o conjunto
+    perfis = {}
+    codigo_perfil = []
+    for um_id, compat in zip(ums['id'].tolist(), ums['compatibilidade'].tolist()):
+        if compat not in perfis:
+            # '#id' sem linha 'compatibilidade' correspondente não é uma lista de tipos: lido como texto,
+            # deixaria a UM sem nenhum veículo compatível
+            if compat.startswith('#') and compat not in textos_perfil:
+                raise ValueError(
+                    f"UM {um_id} referencia o perfil de compatibilidade {compat}, que não existe no arquivo")
+            texto = textos_perfil.get(compat, compat) or compatibilidade_padrao
+            perfis[compat] = (len(perfis), texto, frozenset(vc.strip() for vc in texto.split(',')))
+        codigo_perfil.append(compat)
+
+    ids = ums['id'].astype(int).to_numpy()
+    peso = ums['peso'].astype(float).to_numpy()
+    volume = ums['volume'].astype(float).to_numpy()
+    penalidade = ums['penalidade'].astype(float).to_numpy()
+    cliente = ums['cliente'].astype(int).to_numpy()
+    destino = [destino_cliente.get(c, '') for c in cliente.tolist()]
+
+    dados['ums'] = [
+        {
+            'id': id_,
+            'tipo': tipo,
+            'peso': p,
+            'volume': vol,
+            'destino': dest,
+            'cliente': cli,
+            'compatibilidade': perfis[compat][1],
+            'tipos_compativeis': perfis[compat][2],
+            'restricao': restricao,
+            'penalidade': pen
+        }
+        for id_, tipo, p, vol, dest, cli, compat, restricao, pen in zip(
+            ids.tolist(), ums['descricao'].tolist(), peso.tolist(), volume.tolist(), destino,
+            cliente.tolist(), codigo_perfil, ums['restricao'].tolist(),
+            penalidade.tolist())
+    ]
 
-    # #Verifica se os dados foram carregados corretamente
-    # print(f"{'='*80}")
-    # print(f"Dados carregados: Clientes: {dados['clientes']}")
-    # print(f"Veículos: {dados['veiculos']}")
-    # print(f"Ums: {dados['ums']}")
-    # for um in dados['ums']:
-    #     print(f"Um: {um}")
-    #     for k, v in um.items():
-    #         print(f"{k}: {v}")
-    #         print(f"Compatibilidade " v.split(','))
-    # print(f"Parâmetros: {dados['parametros']}")
-    # print(f"{'='*80}")
+    dados['colunas'] = {
+        'id': ids,
+        'peso': peso,
+        'volume': volume,
+        'penalidade': penalidade,
+        'cliente': cliente,
+        'regiao': np.array(destino, dtype=object),
+        # Índice do perfil de compatibilidade de cada UM (linhas de instancia['perfis_compatibilidade'])
+        'perfil': np.array([perfis[c][0] for c in codigo_perfil], dtype=np.int64),
+    }
+    dados['perfis_compatibilidade'] = [conjunto for _, _, conjunto in perfis.values()]
 
     return dados
 
 
+# ====================== CACHE BINÁRIO DE INSTÂNCIAS ====================== #
+
+# Colunas numéricas das UMs gravadas como .npy (lidas com mmap, sem conversão de texto)
+COLUNAS_CACHE = ('id', 'peso', 'volume', 'penalidade', 'cliente', 'perfil', 'tipo', 'restricao')
+
+
+def hash_arquivo(caminho_arquivo):
+    # SHA-256 do conteúdo do arquivo, lido em blocos de 1 MB
+    h = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def pasta_cache(caminho_arquivo):
+    return caminho_arquivo + '.cache'
+
+
+def _assinatura_arquivo(caminho_arquivo):
+    info = os.stat(caminho_arquivo)
+    return {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+
+def cache_valido(caminho_arquivo):
+    # Retorna o meta.json do cache se ele corresponde ao conteúdo atual do CSV; senão None
+    # Tamanho e mtime iguais dispensam o hash; se só o mtime mudou (cópia, touch) o hash decide
+    caminho_meta = os.path.join(pasta_cache(caminho_arquivo), 'meta.json')
+    try:
+        with open(caminho_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('versao') != VERSAO_CACHE:
+        return None
+
+    assinatura = _assinatura_arquivo(caminho_arquivo)
+    origem = meta['origem']
+    if assinatura['tamanho'] == origem['tamanho'] and assinatura['mtime_ns'] == origem['mtime_ns']:
+        return meta
+    if assinatura['tamanho'] != origem['tamanho'] or hash_arquivo(caminho_arquivo) != origem['sha256']:
+        return None
+
+    # Mesmo conteúdo com outro mtime: atualiza a assinatura para não recalcular o hash da próxima vez
+    origem.update(assinatura)
+    try:
+        _gravar_json_atomico(caminho_meta, meta)
+    except OSError:
+        pass
+    return meta
+
+
+def hash_instancia(caminho_arquivo):
+    # Hash do CSV da instância; reaproveita o guardado no cache binário quando ele está válido
+    meta = cache_valido(caminho_arquivo) if USAR_CACHE_BINARIO else None
+    return meta['origem']['sha256'] if meta is not None else hash_arquivo(caminho_arquivo)
+
+
+def _valor_json(valor):
+    # Escalares e arrays NumPy que aparecem nos resultados viram tipos nativos do JSON
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+def _gravar_json_atomico(caminho, conteudo):
+    # Grava num temporário da mesma pasta e renomeia: leitores nunca veem um arquivo pela metade
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(conteudo, f, ensure_ascii=False, default=_valor_json)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def salvar_cache(caminho_arquivo, dados):
+    # Grava o cache numa pasta temporária e a renomeia no final, para que workers paralelos lendo a
+    # mesma instância nunca vejam um cache incompleto
+    assinatura = _assinatura_arquivo(caminho_arquivo)
+    sha256 = hash_arquivo(caminho_arquivo)
+    destino = pasta_cache(caminho_arquivo)
+    temporaria = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(caminho_arquivo)),
+                                  prefix=os.path.basename(destino) + '.')
+    try:
+        ums = dados['ums']
+        colunas = dados['colunas']
+        # Texto das UMs (tipo da carga e restrição) codificado como índice numa lista de categorias
+        categorias = {'tipo': {}, 'restricao': {}}
+        codigos = {campo: np.array([categorias[campo].setdefault(i[campo], len(categorias[campo]))
+                                    for i in ums], dtype=np.int32)
+                   for campo in categorias}
+        perfis = {}
+        for i, p in zip(ums, colunas['perfil'].tolist()):
+            perfis.setdefault(p, i['compatibilidade'])
+
+        arrays = {
+            'id': colunas['id'], 'peso': colunas['peso'], 'volume': colunas['volume'],
+            'penalidade': colunas['penalidade'], 'cliente': colunas['cliente'],
+            'perfil': colunas['perfil'], 'tipo': codigos['tipo'], 'restricao': codigos['restricao']
+        }
+        for nome in COLUNAS_CACHE:
+            np.save(os.path.join(temporaria, f'{nome}.npy'), np.ascontiguousarray(arrays[nome]))
+
+        meta = {
+            'versao': VERSAO_CACHE,
+            'origem': dict(assinatura, sha256=sha256),
+            'parametros': dados['parametros'],
+            'clientes': dados['clientes'],
+            'veiculos': dados['veiculos'],
+            'perfis': [perfis[p] for p in range(len(perfis))],
+            'categorias': {campo: list(valores) for campo, valores in categorias.items()}
+        }
+        _gravar_json_atomico(os.path.join(temporaria, 'meta.json'), meta)
+
+        # Cache antigo (CSV alterado) é substituído; se outro processo gravou antes, fica o dele
+        if os.path.isdir(destino) and cache_valido(caminho_arquivo) is None:
+            shutil.rmtree(destino, ignore_errors=True)
+        try:
+            os.rename(temporaria, destino)
+        except OSError:
+            if not os.path.isdir(destino):
+                raise
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+
+def ler_cache(pasta, meta):
+    # Reconstrói o mesmo dicionário de ler_instancia_csv; as colunas numéricas ficam mapeadas em memória
+    arrays = {nome: np.load(os.path.join(pasta, f'{nome}.npy'), mmap_mode='r')
+              for nome in COLUNAS_CACHE}
+
+    clientes = meta['clientes']
+    destino_cliente = {c['id']: c['destino'] for c in clientes}
+    destino = [destino_cliente.get(c, '') for c in arrays['cliente'].tolist()]
+
+    textos_perfil = meta['perfis']
+    conjuntos_perfil = [frozenset(vc.strip() for vc in texto.split(',')) for texto in textos_perfil]
+    tipos = meta['categorias']['tipo']
+    restricoes = meta['categorias']['restricao']
+
+    ums = [
+        {
+            'id': id_,
+            'tipo': tipos[t],
+            'peso': p,
+            'volume': vol,
+            'destino': dest,
+            'cliente': cli,
+            'compatibilidade': textos_perfil[perfil],
+            'tipos_compativeis': conjuntos_perfil[perfil],
+            'restricao': restricoes[r],
+            'penalidade': pen
+        }
+        for id_, t, p, vol, dest, cli, perfil, r, pen in zip(
+            arrays['id'].tolist(), arrays['tipo'].tolist(), arrays['peso'].tolist(),
+            arrays['volume'].tolist(), destino, arrays['cliente'].tolist(),
+            arrays['perfil'].tolist(), arrays['restricao'].tolist(), arrays['penalidade'].tolist())
+    ]
+
+    return {
+        'parametros': meta['parametros'],
+        'veiculos': meta['veiculos'],
+        'ums': ums,
+        'clientes': clientes,
+        'colunas': {
+            'id': arrays['id'],
+            'peso': arrays['peso'],
+            'volume': arrays['volume'],
+            'penalidade': arrays['penalidade'],
+            'cliente': arrays['cliente'],
+            'regiao': np.array(destino, dtype=object),
+            'perfil': arrays['perfil'],
+        },
+        'perfis_compatibilidade': conjuntos_perfil
+    }
+
+
+def colunas_ums(instancia):
+    # Arrays das UMs: usa a visão colunar de carregar_dados quando a instância a possui
+    # (subinstâncias e instâncias montadas à mão recaem na conversão da lista de dicionários)
+    colunas = instancia.get("colunas")
+    if colunas and len(colunas['id']) == len(instancia["ums"]):
+        return colunas
+    ums = instancia["ums"]
+    return {
+        'id': np.array([i['id'] for i in ums], dtype=np.int64),
+        'peso': np.array([i['peso'] for i in ums], dtype=float),
+        'volume': np.array([i['volume'] for i in ums], dtype=float),
+        'penalidade': np.array([i['penalidade'] for i in ums], dtype=float),
+        'cliente': np.array([i['cliente'] for i in ums], dtype=np.int64),
+        'regiao': np.array([i['destino'] for i in ums], dtype=object),
+    }
+
+
 def criar_instancia(tipo_instancia):
     # Armazena um dicionário com os dados na variável dados
     dados = carregar_dados(tipo_instancia)
@@ -115,13 +543,40 @@ def criar_instancia(tipo_instancia):
         "veiculos": dados['veiculos'],
         "ums": dados['ums'],
         "clientes": dados['clientes'],
-        # "penalidade": dados['parametros']['Penalidade por não alocação']
+        "penalidade": dados['parametros'].get('Penalidade por não alocação', 0),
+        "colunas": dados['colunas'],
+        "perfis_compatibilidade": dados['perfis_compatibilidade'],
+        # Hash do conteúdo do arquivo: identifica a instância nos caches (subinstâncias não o herdam)
+        "hash": hash_instancia(tipo_instancia)
     }
 
+
+# Arquivos de instância aceitos; .csv.gz (gerado com compressão) é lido diretamente pelo pandas
+EXTENSOES_INSTANCIA = ('.csv.gz', '.csv')
+
+
+def listar_instancias(pasta):
+    # Arquivos de instância da pasta em ordem fixa, ignorando os resumos 00_* do gerador
+    return sorted(f for f in os.listdir(pasta)
+                  if f.endswith(EXTENSOES_INSTANCIA) and not f.startswith('00_'))
+
+
+def nome_da_instancia(arquivo):
+    # Nome do arquivo sem a extensão (.csv ou .csv.gz)
+    for extensao in EXTENSOES_INSTANCIA:
+        if arquivo.endswith(extensao):
+            return arquivo[:-len(extensao)]
+    return arquivo
+
 # ====================== MODELO GUROBI ====================== #
 
 
-def criar_modelo(instancia):
+def criar_modelo(instancia, esparso=False, formulacao='ivc'):
+    # Modo esparso: cria somente as triplas (i, v, c) que podem assumir valor 1
+    # A formulação 'iv' (x[i,v], ver criar_modelo_esparso) é sempre esparsa
+    if esparso or formulacao == 'iv':
+        return criar_modelo_esparso(instancia, formulacao)
+
     # Cria um novo modelo de otimização no Gurobi chamado "AlocacaoCargas"
     model = gp.Model("AlocacaoCargas")
 
@@ -258,13 +713,11 @@ def criar_modelo(instancia):
             name=f"alocacao_unica_{i['id']}"
         )
 
+        # R4:
+        # Tipos compatíveis já decodificados (sem espaços nas pontas) por carregar_dados
+        veiculos_compatíveis = veiculos_compativeis_um(i)
         for v in veiculos:
             for c in clientes:
-                # R4:
-                # Remove espaços em branco no início e final de cada elemento:
-                veiculos_compatíveis = [vc.strip()
-                                        for vc in i['compatibilidade'].split(',')]
-                # importante caso haja espaços acidentais (ex: "Veiculo_Truck, Veiculo_Bi-truck")
                 gamma = 1 if v['tipo'] in veiculos_compatíveis else 0
                 model.addConstr(
                     x[(i["id"], v["id"], c["id"])] <= gamma,
@@ -306,40 +759,1144 @@ def criar_modelo(instancia):
 
     return model, x, y, z, alpha
 
+
+def veiculos_compativeis_um(um):
+    # Usa o conjunto pré-calculado em carregar_dados; UMs montadas à mão só têm o texto
+    if 'tipos_compativeis' in um:
+        return um['tipos_compativeis']
+    # Conjunto de tipos de veículo compatíveis com a UM (sem espaços acidentais)
+    return frozenset(vc.strip() for vc in um['compatibilidade'].split(','))
+
+
+def perfis_ums(instancia):
+    # Perfil de cada UM (array de índices) e o conjunto de tipos compatíveis de cada perfil. Usa os perfis
+    # de carregar_dados quando a instância os possui; subinstâncias e instâncias montadas à mão agrupam
+    # os conjuntos das UMs
+    colunas = instancia.get("colunas")
+    if (colunas and 'perfil' in colunas and instancia.get("perfis_compatibilidade") is not None
+            and len(colunas['perfil']) == len(instancia["ums"])):
+        return colunas['perfil'], instancia["perfis_compatibilidade"]
+    perfis = {}
+    perfil_um = np.array([perfis.setdefault(veiculos_compativeis_um(i), len(perfis))
+                          for i in instancia["ums"]], dtype=np.int64)
+    return perfil_um, list(perfis)
+
+
+def matriz_compatibilidade_perfis(instancia):
+    # Matriz perfil x veículo (True = o tipo do veículo está no perfil) e o perfil de cada UM:
+    # a compatibilidade UM x veículo é compat_perfil[perfil_um], sem percorrer UM por UM
+    perfil_um, perfis = perfis_ums(instancia)
+    tipos_veiculo = np.array([v['tipo'] for v in instancia["veiculos"]], dtype=object)
+    compat_perfil = np.zeros((len(perfis), len(tipos_veiculo)), dtype=bool)
+    for p, compativeis in enumerate(perfis):
+        compat_perfil[p] = np.isin(tipos_veiculo, list(compativeis))
+    return perfil_um, compat_perfil
+
+
+def triplas_viaveis(instancia):
+    # Pares (UM, veículo) que podem assumir x = 1, na ordem das UMs. O cliente da tripla é sempre o da UM:
+    #   - o tipo do veículo está na compatibilidade da UM (gamma = 1)
+    #   - o veículo atende a região do cliente da UM (delta = 1)
+    destino_cliente = {c['id']: c['destino'] for c in instancia["clientes"]}
+
+    # Veículos por região (delta_{cv} = 1 se o destino do veículo é o destino do cliente)
+    veiculos_por_destino = defaultdict(list)
+    for v in instancia["veiculos"]:
+        veiculos_por_destino[v['destino']].append(v)
+
+    triplas = []
+    for i in instancia["ums"]:
+        compativeis = veiculos_compativeis_um(i)
+        for v in veiculos_por_destino.get(destino_cliente.get(i['cliente']), []):
+            if v['tipo'] in compativeis:
+                triplas.append((i, v))
+    return triplas
+
+
+def limite_ums_no_veiculo(ums_par, veiculo):
+    # Maior quantidade de UMs do conjunto que cabe no veículo (soma das menores por peso e por volume)
+    # Usado como coeficiente M na ligação agregada sum_i x_iv <= M * y_vc
+    pesos = np.cumsum(sorted(i['peso'] for i in ums_par))
+    volumes = np.cumsum(sorted(i['volume'] for i in ums_par))
+    limite_peso = int(np.searchsorted(
+        pesos, veiculo['capacidade_peso'] + 1e-9, side='right'))
+    limite_volume = int(np.searchsorted(
+        volumes, veiculo['capacidade_volume'] + 1e-9, side='right'))
+    return max(1, min(len(ums_par), limite_peso, limite_volume))
+
+
+def criar_modelo_esparso(instancia, formulacao='ivc'):
+    # Mesma formulação de criar_modelo, mas sem o cubo denso UM x veículo x cliente.
+    # Uma UM só pertence ao seu próprio cliente, então x[i,v,c] só é criada quando:
+    #   - c é o cliente da UM i
+    #   - o tipo do veículo v está na compatibilidade da UM (gamma = 1)
+    #   - o veículo v atende a região do cliente c (delta = 1)
+    # As demais variáveis seriam fixadas em zero pelas restrições compat_*, destino_* e aloc_uso_*,
+    # por isso essas restrições deixam de ser necessárias.
+    #
+    # formulacao='iv': como o cliente da UM é fixo, o índice c é redundante e a variável passa a ser x[i,v].
+    # A ligação desagregada x_ivc <= y_vc (uma linha por x) é trocada por uma linha por par (v, c):
+    #     sum_{i do cliente c} x_iv <= M_vc * y_vc
+    # onde M_vc é o maior número de UMs de c que cabem em v. Nas soluções inteiras as duas ligações são
+    # equivalentes: se alguma x_iv = 1 ambas exigem y_vc = 1, e se todas são 0 ambas permitem y_vc = 0;
+    # como M_vc limita apenas o que a capacidade já limita, nenhuma solução inteira é cortada.
+    # Para manter o contrato de executar_instancia_com_timeout, o dicionário x continua indexado por
+    # (i, v, c) com c = cliente da UM.
+    model = gp.Model("AlocacaoCargas")
+
+    veiculos = instancia["veiculos"]
+    ums = instancia["ums"]
+
+    x = {}
+    y = {}
+    alpha = {}
+    z = {}
+
+    # Agrupamentos das variáveis x usados nas restrições
+    x_por_um = defaultdict(list)        # i_id -> [x]
+    x_por_veiculo = defaultdict(list)   # v_id -> [(UM, x)]
+    x_por_par = defaultdict(list)       # (v_id, c_id) -> [(UM, x)]
+
+    for i, v in triplas_viaveis(instancia):
+        c_id = i['cliente']
+        nome = (f"x_{i['id']}_{v['id']}" if formulacao == 'iv'
+                else f"x_{i['id']}_{v['id']}_{c_id}")
+        var = model.addVar(vtype=GRB.BINARY, name=nome)
+        x[(i["id"], v["id"], c_id)] = var
+        x_por_um[i["id"]].append(var)
+        x_por_veiculo[v["id"]].append((i, var))
+        x_por_par[(v["id"], c_id)].append((i, var))
+
+    for v in veiculos:
+        alpha[v["id"]] = model.addVar(
+            vtype=GRB.BINARY, name=f"alpha_{v['id']}")
+        z[v["id"]] = model.addVar(lb=0, name=f"z_{v['id']}")
+
+    # y[v,c] só existe para os pares que possuem alguma x
+    for (v_id, c_id) in x_por_par:
+        y[(v_id, c_id)] = model.addVar(
+            vtype=GRB.BINARY, name=f"y_{v_id}_{c_id}")
+
+    y_por_veiculo = defaultdict(list)
+    for (v_id, c_id), var in y.items():
+        y_por_veiculo[v_id].append(var)
+
+    # ====================== FUNÇÃO OBJETIVO ====================== #
+
+    custo_nao_alocacao = gp.quicksum(
+        i["peso"] * i["penalidade"] * (1 - gp.quicksum(x_por_um[i["id"]]))
+        for i in ums
+    )
+    custo_frete_morto = gp.quicksum(z[v["id"]] for v in veiculos)
+    custo_transporte = gp.quicksum(
+        v["custo"] * alpha[v["id"]] for v in veiculos)
+
+    model.setObjective(custo_nao_alocacao +
+                       custo_frete_morto + custo_transporte, GRB.MINIMIZE)
+
+    # ====================== RESTRIÇÕES ====================== #
+
+    for v in veiculos:
+        carga_peso = gp.quicksum(i["peso"] * var
+                                 for i, var in x_por_veiculo[v["id"]])
+        # R1
+        model.addConstr(carga_peso <= v["capacidade_peso"],
+                        name=f"cap_peso_{v['id']}")
+        model.addConstr(
+            gp.quicksum(i["volume"] * var
+                        for i, var in x_por_veiculo[v["id"]]) <= v["capacidade_volume"],
+            name=f"cap_vol_{v['id']}"
+        )
+        # R2
+        model.addConstr(
+            z[v["id"]] >= alpha[v["id"]] * v["carga_minima"] - carga_peso,
+            name=f"frete_morto_{v['id']}"
+        )
+        # alpha só pode ser 1 se o veículo for usado para algum cliente (uma única vez por veículo)
+        model.addConstr(
+            alpha[v["id"]] <= gp.quicksum(y_por_veiculo[v["id"]]),
+            name=f"ativacao_max_{v['id']}"
+        )
+
+    for (v_id, c_id), var_y in y.items():
+        model.addConstr(alpha[v_id] >= var_y,
+                        name=f"ativacao_{v_id}_{c_id}")
+
+    for i in ums:
+        # R3
+        if x_por_um[i["id"]]:
+            model.addConstr(gp.quicksum(x_por_um[i["id"]]) <= 1,
+                            name=f"alocacao_unica_{i['id']}")
+
+    if formulacao == 'iv':
+        # R5 agregada: uma linha por par (v, c)
+        veiculo_por_id = {v['id']: v for v in veiculos}
+        for (v_id, c_id), itens in x_por_par.items():
+            limite = limite_ums_no_veiculo(
+                [i for i, _ in itens], veiculo_por_id[v_id])
+            model.addConstr(
+                gp.quicksum(var for _, var in itens) <= limite *
+                y[(v_id, c_id)],
+                name=f"aloc_uso_{v_id}_{c_id}")
+    else:
+        # R5: x_ivc <= y_vc (R4 e R6 já estão garantidas pela geração das variáveis)
+        for (i_id, v_id, c_id), var in x.items():
+            model.addConstr(var <= y[(v_id, c_id)],
+                            name=f"aloc_uso_{i_id}_{v_id}_{c_id}")
+
+    return model, x, y, z, alpha
+
+
+def criar_modelo_matricial(instancia, nomes=False, formulacao='ivc'):
+    # Mesma formulação de criar_modelo_esparso, montada com vetores NumPy e matrizes scipy.sparse.
+    # Todas as variáveis são criadas em um único addMVar e cada grupo de restrições em um único addMConstr,
+    # evitando os laços gp.quicksum e os nomes f-string linha a linha.
+    # nomes=True atribui os mesmos nomes do construtor quicksum (útil para depurar/escrever o .lp).
+    # formulacao='iv' usa a ligação agregada por par (v, c) descrita em criar_modelo_esparso.
+    model = gp.Model("AlocacaoCargas")
+
+    veiculos = instancia["veiculos"]
+    ums = instancia["ums"]
+
+    triplas = triplas_viaveis(instancia)
+    pos_um = {i['id']: k for k, i in enumerate(ums)}
+    pos_veiculo = {v['id']: k for k, v in enumerate(veiculos)}
+
+    n_x = len(triplas)
+    n_v = len(veiculos)
+    x_um = np.array([pos_um[i['id']] for i, _ in triplas], dtype=np.int64)
+    x_veiculo = np.array([pos_veiculo[v['id']]
+                         for _, v in triplas], dtype=np.int64)
+
+    # Pares (v, c) com alguma x, na ordem de primeira ocorrência
+    chaves_x = [(i['id'], v['id'], i['cliente']) for i, v in triplas]
+    pares = {}
+    x_par = np.array([pares.setdefault((v_id, c_id), len(pares))
+                     for _, v_id, c_id in chaves_x], dtype=np.int64)
+    chaves_y = list(pares)
+    n_y = len(chaves_y)
+    y_veiculo = np.array([pos_veiculo[v_id]
+                         for v_id, _ in chaves_y], dtype=np.int64)
+
+    colunas = colunas_ums(instancia)
+    peso = colunas['peso']
+    volume = colunas['volume']
+    penalidade = colunas['penalidade']
+    cap_peso = np.array([v['capacidade_peso'] for v in veiculos], dtype=float)
+    cap_vol = np.array([v['capacidade_volume']
+                       for v in veiculos], dtype=float)
+    custo = np.array([v['custo'] for v in veiculos], dtype=float)
+    carga_minima = np.array([v['carga_minima']
+                            for v in veiculos], dtype=float)
+
+    # ====================== VARIÁVEIS E FUNÇÃO OBJETIVO ====================== #
+    # Colunas: [x (n_x) | y (n_y) | alpha (n_v) | z (n_v)]
+    n_total = n_x + n_y + 2 * n_v
+    vtype = np.array([GRB.BINARY] * (n_x + n_y + n_v) +
+                     [GRB.CONTINUOUS] * n_v)
+    # custo_nao_alocacao = sum(peso*pen) - sum(peso*pen*x): a parte constante vai para ObjCon
+    obj = np.concatenate([
+        -(peso * penalidade)[x_um],
+        np.zeros(n_y),
+        custo,
+        np.ones(n_v)
+    ])
+    ub = np.concatenate([np.ones(n_x + n_y + n_v), np.full(n_v, GRB.INFINITY)])
+    variaveis = model.addMVar(n_total, lb=0.0, ub=ub, obj=obj, vtype=vtype)
+    model.ModelSense = GRB.MINIMIZE
+    model.ObjCon = float(np.sum(peso * penalidade))
+
+    col_y = n_x
+    col_alpha = n_x + n_y
+    col_z = n_x + n_y + n_v
+
+    def bloco(linhas, colunas, valores, n_linhas):
+        return sp.csr_matrix((valores, (linhas, colunas)), shape=(n_linhas, n_total))
+
+    # ====================== RESTRIÇÕES ====================== #
+    faixa_x = np.arange(n_x)
+    faixa_y = np.arange(n_y)
+    faixa_v = np.arange(n_v)
+    grupos = []
+
+    # R1: capacidade de peso e de volume por veículo
+    grupos.append(('cap_peso', bloco(x_veiculo, faixa_x, peso[x_um], n_v),
+                   cap_peso))
+    grupos.append(('cap_vol', bloco(x_veiculo, faixa_x, volume[x_um], n_v),
+                   cap_vol))
+
+    # R2: frete morto -> carga_minima*alpha - sum(peso*x) - z <= 0
+    grupos.append(('frete_morto', bloco(
+        np.concatenate([x_veiculo, faixa_v, faixa_v]),
+        np.concatenate([faixa_x, col_alpha + faixa_v, col_z + faixa_v]),
+        np.concatenate([-peso[x_um], carga_minima, -np.ones(n_v)]),
+        n_v), np.zeros(n_v)))
+
+    # y - alpha <= 0
+    grupos.append(('ativacao', bloco(
+        np.concatenate([faixa_y, faixa_y]),
+        np.concatenate([col_y + faixa_y, col_alpha + y_veiculo]),
+        np.concatenate([np.ones(n_y), -np.ones(n_y)]),
+        n_y), np.zeros(n_y)))
+
+    # alpha - sum_c(y) <= 0
+    grupos.append(('ativacao_max', bloco(
+        np.concatenate([faixa_v, y_veiculo]),
+        np.concatenate([col_alpha + faixa_v, col_y + faixa_y]),
+        np.concatenate([np.ones(n_v), -np.ones(n_y)]),
+        n_v), np.zeros(n_v)))
+
+    # R3: alocação única (apenas UMs com alguma x)
+    ums_com_x, linha_um = np.unique(x_um, return_inverse=True)
+    grupos.append(('alocacao_unica', bloco(linha_um, faixa_x, np.ones(n_x), len(ums_com_x)),
+                   np.ones(len(ums_com_x))))
+
+    if formulacao == 'iv':
+        # R5 agregada: sum_{i de c} x_iv - M_vc * y_vc <= 0
+        itens_par = defaultdict(list)
+        for (i, v), k in zip(triplas, x_par):
+            itens_par[k].append(i)
+        limites = np.array([limite_ums_no_veiculo(itens_par[k], veiculos[y_veiculo[k]])
+                            for k in range(n_y)], dtype=float)
+        grupos.append(('aloc_uso', bloco(
+            np.concatenate([x_par, faixa_y]),
+            np.concatenate([faixa_x, col_y + faixa_y]),
+            np.concatenate([np.ones(n_x), -limites]),
+            n_y), np.zeros(n_y)))
+    else:
+        # R5: x - y <= 0
+        grupos.append(('aloc_uso', bloco(
+            np.concatenate([faixa_x, faixa_x]),
+            np.concatenate([faixa_x, col_y + x_par]),
+            np.concatenate([np.ones(n_x), -np.ones(n_x)]),
+            n_x), np.zeros(n_x)))
+
+    restricoes = {}
+    for nome, A, b in grupos:
+        restricoes[nome] = model.addMConstr(A, variaveis, GRB.LESS_EQUAL, b)
+
+    model.update()
+
+    # ====================== DICIONÁRIOS (MESMO CONTRATO DE criar_modelo) ====================== #
+    lista = variaveis.tolist()
+    x = dict(zip(chaves_x, lista[:n_x]))
+    y = dict(zip(chaves_y, lista[col_y:col_alpha]))
+    alpha = dict(zip((v['id'] for v in veiculos), lista[col_alpha:col_z]))
+    z = dict(zip((v['id'] for v in veiculos), lista[col_z:]))
+
+    if nomes:
+        nomes_x = ([f"x_{i}_{v}" for i, v, _ in chaves_x] if formulacao == 'iv'
+                   else [f"x_{i}_{v}_{c}" for i, v, c in chaves_x])
+        nomes_vars = (nomes_x +
+                      [f"y_{v}_{c}" for v, c in chaves_y] +
+                      [f"alpha_{v['id']}" for v in veiculos] +
+                      [f"z_{v['id']}" for v in veiculos])
+        model.setAttr('VarName', lista, nomes_vars)
+
+        nomes_restricoes = {
+            'cap_peso': [f"cap_peso_{v['id']}" for v in veiculos],
+            'cap_vol': [f"cap_vol_{v['id']}" for v in veiculos],
+            'frete_morto': [f"frete_morto_{v['id']}" for v in veiculos],
+            'ativacao': [f"ativacao_{v}_{c}" for v, c in chaves_y],
+            'ativacao_max': [f"ativacao_max_{v['id']}" for v in veiculos],
+            'alocacao_unica': [f"alocacao_unica_{ums[k]['id']}" for k in ums_com_x],
+            'aloc_uso': ([f"aloc_uso_{v}_{c}" for v, c in chaves_y] if formulacao == 'iv'
+                         else [f"aloc_uso_{i}_{v}_{c}" for i, v, c in chaves_x]),
+        }
+        for nome, mconstr in restricoes.items():
+            model.setAttr('ConstrName', mconstr.tolist(),
+                          nomes_restricoes[nome])
+        model.update()
+
+    return model, x, y, z, alpha
+
+
+def construir_modelo(instancia, formulacao=None):
+    # Escolhe o construtor de acordo com CONSTRUTOR_MODELO / MODELO_ESPARSO / FORMULACAO
+    # Com USAR_CACHE_MODELO, o modelo de uma instância já construída é relido do disco
+    formulacao = formulacao or FORMULACAO
+
+    base_cache = None
+    if USAR_CACHE_MODELO and instancia.get("hash"):
+        base_cache = os.path.join(PASTA_CACHE_MODELOS, chave_cache_modelo(instancia, formulacao))
+        em_cache = carregar_modelo_cache(base_cache)
+        if em_cache is not None:
+            return em_cache
+
+    if CONSTRUTOR_MODELO == 'matricial':
+        construido = criar_modelo_matricial(instancia, formulacao=formulacao)
+    else:
+        construido = criar_modelo(instancia, esparso=MODELO_ESPARSO, formulacao=formulacao)
+
+    if QUEBRA_SIMETRIA:
+        modelo, x, _, _, alpha = construido
+        restricoes = adicionar_quebra_simetria(modelo, x, alpha, instancia, QUEBRA_SIMETRIA)
+        print(f"🔀 Quebra de simetria ({QUEBRA_SIMETRIA}): {restricoes} restrições")
+
+    if base_cache is not None:
+        try:
+            salvar_modelo_cache(base_cache, *construido)
+        except (OSError, gp.GurobiError) as e:
+            print(f"⚠️ Não foi possível gravar o modelo em cache: {e}")
+    return construido
+
+def modelo_restrito_por_regiao():
+    # True quando o construtor selecionado só cria x para o cliente da própria UM (esparso, matricial ou
+    # formulação 'iv'). No denso (criar_modelo com MODELO_ESPARSO=False e 'ivc') x[i,v,c] existe para
+    # qualquer cliente c, e a UM pode viajar em um veículo de outra região junto com outro cliente
+    return CONSTRUTOR_MODELO == 'matricial' or MODELO_ESPARSO or FORMULACAO == 'iv'
+
+# ====================== QUEBRA DE SIMETRIA ====================== #
+
+# A frota é sorteada a partir de poucos tipos base, então várias vezes há veículos idênticos na mesma
+# região. Trocar dois veículos idênticos entre si gera outra solução com o mesmo custo e o branch-and-bound
+# explora cada uma dessas permutações. Dentro de cada classe de veículos idênticos (ordem da instância):
+#   - 'ativacao': alpha[v1] >= alpha[v2] >= ... (os primeiros veículos da classe são ativados antes)
+#   - 'carga': além disso, peso carregado em v1 >= peso carregado em v2 >= ...
+# Ambas são válidas: reordenar os veículos de uma classe pelo peso carregado leva qualquer solução a
+# uma de mesmo custo que satisfaz as duas ordenações (um veículo ativo e vazio nunca é necessário).
+
+
+def classes_veiculos_identicos(instancia):
+    # Listas de índices posicionais dos veículos intercambiáveis (apenas classes com 2 ou mais veículos)
+    classes = defaultdict(list)
+    for k, v in enumerate(instancia["veiculos"]):
+        classes[(v['tipo'], v['destino'], v['capacidade_peso'], v['capacidade_volume'],
+                 v['custo'], v['carga_minima'])].append(k)
+    return [membros for membros in classes.values() if len(membros) > 1]
+
+
+def adicionar_quebra_simetria(modelo, x, alpha, instancia, modo):
+    # Adiciona as restrições de ordenação de cada classe de veículos idênticos; retorna quantas foram criadas
+    veiculos = instancia["veiculos"]
+    classes = classes_veiculos_identicos(instancia)
+
+    carga = None
+    if modo == 'carga':
+        peso_um = {i['id']: i['peso'] for i in instancia["ums"]}
+        termos = defaultdict(list)
+        for (i_id, v_id, _), var in x.items():
+            termos[v_id].append((peso_um[i_id], var))
+        carga = {v_id: gp.LinExpr([p for p, _ in lista], [var for _, var in lista])
+                 for v_id, lista in termos.items()}
+
+    restricoes = 0
+    for membros in classes:
+        for anterior, seguinte in zip(membros, membros[1:]):
+            v1, v2 = veiculos[anterior]['id'], veiculos[seguinte]['id']
+            modelo.addConstr(alpha[v1] >= alpha[v2], name=f"simetria_ativacao_{v1}_{v2}")
+            restricoes += 1
+            if carga is not None:
+                modelo.addConstr(carga.get(v1, gp.LinExpr()) >= carga.get(v2, gp.LinExpr()),
+                                 name=f"simetria_carga_{v1}_{v2}")
+                restricoes += 1
+    return restricoes
+
+
+def ordenar_atribuicao_simetria(instancia, atribuicao):
+    # Renumera os veículos de cada classe idêntica em ordem decrescente de peso carregado, para que a
+    # solução (ex.: o MIP start da heurística) satisfaça as restrições de adicionar_quebra_simetria
+    peso = colunas_ums(instancia)['peso']
+    alocada = atribuicao >= 0
+    n_v = len(instancia["veiculos"])
+    carga = np.bincount(atribuicao[alocada], weights=peso[alocada], minlength=n_v)
+    quantidade = np.bincount(atribuicao[alocada], minlength=n_v)
+    mapa = np.arange(n_v)
+    for membros in classes_veiculos_identicos(instancia):
+        # Mais carregados primeiro; entre cargas iguais, os ativos antes dos vazios (ordem estável)
+        ordem = sorted(membros, key=lambda k: (-carga[k], -quantidade[k]))
+        mapa[ordem] = membros
+    ordenada = atribuicao.copy()
+    ordenada[alocada] = mapa[atribuicao[alocada]]
+    return ordenada
+
+# ====================== CACHE DE MODELOS ====================== #
+
+
+def chave_cache_modelo(instancia, formulacao):
+    # Conteúdo da instância + formulação + construtor + versão do código dos construtores
+    if CONSTRUTOR_MODELO == 'matricial':
+        construtor = 'matricial'
+    else:
+        construtor = 'esparso' if MODELO_ESPARSO or formulacao == 'iv' else 'denso'
+    # As restrições de simetria fazem parte do modelo gravado
+    simetria = f"_sim{QUEBRA_SIMETRIA}" if QUEBRA_SIMETRIA else ""
+    return f"{instancia['hash'][:24]}_{formulacao}_{construtor}{simetria}_v{VERSAO_MODELO}"
+
+
+def salvar_modelo_cache(base, modelo, x, y, z, alpha):
+    # Grava o modelo em <base>.<FORMATO_CACHE_MODELO> e o mapa chave -> índice da variável em <base>.npz
+    # O mapa é gravado por último: se ele existe, o modelo correspondente está completo
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    modelo.update()
+    temporario = f"{base}.{os.getpid()}.tmp"
+
+    modelo.write(f"{temporario}.{FORMATO_CACHE_MODELO}")
+    os.replace(f"{temporario}.{FORMATO_CACHE_MODELO}", f"{base}.{FORMATO_CACHE_MODELO}")
+
+    mapa = {}
+    for nome, variaveis in (('x', x), ('y', y), ('z', z), ('alpha', alpha)):
+        mapa[f'{nome}_chaves'] = np.array(list(variaveis.keys()), dtype=np.int64)
+        mapa[f'{nome}_indices'] = np.array([var.index for var in variaveis.values()], dtype=np.int64)
+    with open(temporario + '.npz', 'wb') as f:
+        np.savez(f, **mapa)
+    os.replace(temporario + '.npz', base + '.npz')
+
+
+def carregar_modelo_cache(base):
+    # Relê o modelo salvo por salvar_modelo_cache e remonta os dicionários x, y, z e alpha; None se não houver
+    arquivo_modelo = f"{base}.{FORMATO_CACHE_MODELO}"
+    if not (os.path.exists(base + '.npz') and os.path.exists(arquivo_modelo)):
+        return None
+
+    modelo = gp.read(arquivo_modelo)
+    variaveis = modelo.getVars()
+
+    def dicionario(mapa, nome):
+        chaves = mapa[f'{nome}_chaves']
+        # Chaves compostas (x e y) voltam como tuplas; as de veículo (z e alpha) como inteiros
+        chaves = map(tuple, chaves.tolist()) if chaves.ndim == 2 else chaves.tolist()
+        return {chave: variaveis[k] for chave, k in zip(chaves, mapa[f'{nome}_indices'].tolist())}
+
+    with np.load(base + '.npz') as mapa:
+        x, y, z, alpha = (dicionario(mapa, nome) for nome in ('x', 'y', 'z', 'alpha'))
+    return modelo, x, y, z, alpha
+
+# ====================== HEURÍSTICA CONSTRUTIVA ====================== #
+
+
+def arrays_heuristica(instancia):
+    # Visão da instância em arrays NumPy usada pelas heurísticas (índices posicionais de UMs e veículos)
+    ums = instancia["ums"]
+    veiculos = instancia["veiculos"]
+    destino_cliente = {c['id']: c['destino'] for c in instancia["clientes"]}
+
+    # Regiões codificadas como inteiros (UM herda a região do seu cliente)
+    codigos_regiao = {}
+    regiao_veiculo = np.array([codigos_regiao.setdefault(v['destino'], len(codigos_regiao))
+                               for v in veiculos], dtype=np.int64)
+    regiao_um = np.array([codigos_regiao.setdefault(destino_cliente.get(i['cliente'], ''), len(codigos_regiao))
+                          for i in ums], dtype=np.int64)
+
+    # Compatibilidade por perfil: UMs com o mesmo conjunto de tipos compatíveis compartilham uma linha
+    perfil_um, compat_perfil = matriz_compatibilidade_perfis(instancia)
+
+    colunas = colunas_ums(instancia)
+    return {
+        'peso': colunas['peso'],
+        'volume': colunas['volume'],
+        'penalidade': colunas['penalidade'],
+        'regiao_um': regiao_um,
+        'perfil_um': perfil_um,
+        'compat_perfil': compat_perfil,
+        'regiao_veiculo': regiao_veiculo,
+        'cap_peso': np.array([v['capacidade_peso'] for v in veiculos], dtype=float),
+        'cap_vol': np.array([v['capacidade_volume'] for v in veiculos], dtype=float),
+        'custo': np.array([v['custo'] for v in veiculos], dtype=float),
+        'carga_minima': np.array([v['carga_minima'] for v in veiculos], dtype=float),
+    }
+
+
+def objetivo_atribuicao(arr, atribuicao):
+    # Valor da função objetivo do modelo para uma atribuição UM -> veículo (-1 = não alocada)
+    n_v = len(arr['custo'])
+    alocada = atribuicao >= 0
+    carga = np.bincount(atribuicao[alocada], weights=arr['peso'][alocada],
+                        minlength=n_v)
+    ativo = np.bincount(atribuicao[alocada], minlength=n_v) > 0
+    frete_morto = np.where(ativo, np.maximum(
+        0.0, arr['carga_minima'] - carga), 0.0)
+    custo_nao_alocacao = np.sum(
+        (arr['peso'] * arr['penalidade'])[~alocada])
+    return float(np.sum(arr['custo'][ativo]) + np.sum(frete_morto) + custo_nao_alocacao)
+
+
+def _encher_veiculo(arr, v, candidatos):
+    # First-fit vetorizado: percorre os candidatos (já ordenados) e aceita cada UM que ainda cabe.
+    # A cada passo descarta as UMs que não cabem na capacidade restante e aceita o maior prefixo que cabe.
+    resto_peso = arr['cap_peso'][v]
+    resto_vol = arr['cap_vol'][v]
+    aceitas = []
+    while candidatos.size:
+        candidatos = candidatos[(arr['peso'][candidatos] <= resto_peso + 1e-9) &
+                                (arr['volume'][candidatos] <= resto_vol + 1e-9)]
+        if not candidatos.size:
+            break
+        acum_peso = np.cumsum(arr['peso'][candidatos])
+        acum_vol = np.cumsum(arr['volume'][candidatos])
+        cabe = (acum_peso <= resto_peso + 1e-9) & (acum_vol <= resto_vol + 1e-9)
+        k = int(np.argmin(cabe)) if not cabe.all() else len(candidatos)
+        aceitas.append(candidatos[:k])
+        resto_peso -= acum_peso[k - 1]
+        resto_vol -= acum_vol[k - 1]
+        candidatos = candidatos[k:]
+    return np.concatenate(aceitas) if aceitas else np.empty(0, dtype=np.int64)
+
+
+def heuristica_construtiva(instancia, arr=None):
+    # Heurística gulosa região a região:
+    #   - UMs ordenadas por peso * penalidade (maior custo de não alocação primeiro)
+    #   - a cada passo, cada veículo livre da região é preenchido (first-fit) com as UMs livres compatíveis
+    #     e avaliado pelo custo da carga que de fato levaria: custo + frete morto, onde
+    #     frete morto = carga_minima - peso carregado. Assim um veículo grande com carga mínima alta não é
+    #     escolhido para uma carga pequena só por ter o menor custo por kg de capacidade
+    #   - é ativado o veículo de maior economia (penalidade evitada - custo - frete morto). Comparar o custo
+    #     por kg levado preferiria um veículo pequeno cheio e deixaria o resto da região sem veículo
+    #   - a região termina quando nenhum veículo livre compensa (economia <= 0)
+    # Veículos idênticos (mesmo tipo, capacidades, custo e carga mínima) dão o mesmo preenchimento, então
+    # só o primeiro de cada classe é avaliado por passo: o custo é O(classes x veículos ativados)
+    # Retorna a atribuição UM -> veículo (índices posicionais, -1 = não alocada) e o objetivo
+    inicio = time.perf_counter()
+    arr = arr if arr is not None else arrays_heuristica(instancia)
+
+    valor = arr['peso'] * arr['penalidade']
+    atribuicao = np.full(len(valor), -1, dtype=np.int64)
+    ordem_ums = np.argsort(-valor, kind='stable')
+    classe_veiculo = [(arr['compat_perfil'][:, v].tobytes(), arr['cap_peso'][v], arr['cap_vol'][v],
+                       arr['custo'][v], arr['carga_minima'][v]) for v in range(len(arr['custo']))]
+
+    for regiao in np.unique(arr['regiao_veiculo']):
+        ums_regiao = ordem_ums[arr['regiao_um'][ordem_ums] == regiao]
+        veiculos_livres = np.flatnonzero((arr['regiao_veiculo'] == regiao) &
+                                         (arr['cap_peso'] > 0)).tolist()
+
+        while veiculos_livres:
+            livres = ums_regiao[atribuicao[ums_regiao] < 0]
+            if not livres.size:
+                break
+            melhor = None
+            avaliadas = set()
+            for v in veiculos_livres:
+                if classe_veiculo[v] in avaliadas:
+                    continue
+                avaliadas.add(classe_veiculo[v])
+                candidatos = livres[arr['compat_perfil'][arr['perfil_um'][livres], v]]
+                carga = _encher_veiculo(arr, v, candidatos)
+                if not carga.size:
+                    continue
+                peso_carga = arr['peso'][carga].sum()
+                custo_carga = arr['custo'][v] + max(0.0, arr['carga_minima'][v] - peso_carga)
+                economia = valor[carga].sum() - custo_carga
+                if economia <= 0:
+                    continue
+                if melhor is None or economia > melhor[0]:
+                    melhor = (economia, v, carga)
+            if melhor is None:
+                break
+            _, v, carga = melhor
+            atribuicao[carga] = v
+            veiculos_livres.remove(v)
+
+    return {
+        'atribuicao': atribuicao,
+        'objetivo': objetivo_atribuicao(arr, atribuicao),
+        'tempo': time.perf_counter() - inicio,
+    }
+
+
+def aplicar_solucao_inicial(modelo, x, y, z, alpha, instancia, solucao):
+    # Injeta a atribuição da heurística como MIP start (atributo Start) em x, y, alpha e z
+    ums = instancia["ums"]
+    veiculos = instancia["veiculos"]
+    atribuicao = solucao['atribuicao']
+    if QUEBRA_SIMETRIA:
+        atribuicao = ordenar_atribuicao_simetria(instancia, atribuicao)
+
+    veiculo_da_um = {ums[k]['id']: veiculos[v]['id']
+                     for k, v in enumerate(atribuicao) if v >= 0}
+    carga = defaultdict(float)
+    pares = set()
+    for i in ums:
+        v_id = veiculo_da_um.get(i['id'])
+        if v_id is not None:
+            carga[v_id] += i['peso']
+            pares.add((v_id, i['cliente']))
+
+    cliente_da_um = {i['id']: i['cliente'] for i in ums}
+    modelo.setAttr('Start', list(x.values()),
+                   [1.0 if veiculo_da_um.get(i_id) == v_id and cliente_da_um[i_id] == c_id else 0.0
+                    for (i_id, v_id, c_id) in x.keys()])
+    modelo.setAttr('Start', list(y.values()),
+                   [1.0 if chave in pares else 0.0 for chave in y.keys()])
+    modelo.setAttr('Start', list(alpha.values()),
+                   [1.0 if v_id in carga else 0.0 for v_id in alpha.keys()])
+    carga_minima = {v['id']: v['carga_minima'] for v in veiculos}
+    modelo.setAttr('Start', list(z.values()),
+                   [max(0.0, carga_minima[v_id] - carga[v_id]) if v_id in carga else 0.0
+                    for v_id in z.keys()])
+
+# ====================== SOLVER HEURÍSTICO ====================== #
+
+
+def busca_local(arr, atribuicao, tempo_limite, semente=0, candidatos_por_um=8):
+    # Busca local por primeira melhora sobre uma atribuição UM -> veículo, sempre dentro da mesma região:
+    #   - realocar: move a UM para outro veículo compatível (ou a retira / insere se não alocada)
+    #   - trocar: troca duas UMs entre veículos quando a realocação não cabe
+    #   - fechar: esvazia um veículo e reinsere suas UMs nos demais veículos ativos
+    #   - substituir: passa a carga de um veículo ativo para um inativo da região (custo + frete morto do
+    #     novo veículo contra o do antigo); o novo veículo também recebe UMs não alocadas e, se ficar abaixo
+    #     da carga mínima, UMs de veículos que continuam acima da sua. O que não couber é reinserido
+    #   - abrir: ativa um veículo inativo com UMs não alocadas da região (e as de veículos com folga)
+    # Sem substituir/abrir a busca não troca o tipo de veículo usado pela construtiva: realocar e trocar
+    # só movem UMs entre veículos já ativos.
+    # Cada UM avalia no máximo 'candidatos_por_um' veículos sorteados, então uma passada é O(UMs).
+    # Quando nenhum movimento melhora e ainda há tempo, a busca é iterada: um veículo ativo sorteado é
+    # fechado ou substituído à força e a descida recomeça, sempre a partir da melhor solução conhecida;
+    # por isso a busca usa todo o tempo_limite.
+    # O frete morto cria platôs (mover carga entre dois veículos abaixo da carga mínima não muda o custo)
+    # que só esse recomeço atravessa.
+    inicio = time.perf_counter()
+    rng = random.Random(semente)
+
+    peso = arr['peso'].tolist()
+    volume = arr['volume'].tolist()
+    valor = (arr['peso'] * arr['penalidade']).tolist()
+    cap_peso = arr['cap_peso'].tolist()
+    cap_vol = arr['cap_vol'].tolist()
+    custo = arr['custo'].tolist()
+    carga_minima = arr['carga_minima'].tolist()
+    perfil = arr['perfil_um'].tolist()
+    regiao = arr['regiao_um'].tolist()
+    compat = arr['compat_perfil']
+
+    n_v = len(custo)
+    atrib = atribuicao.tolist()
+    carga_p = [0.0] * n_v
+    carga_v = [0.0] * n_v
+    # Membros de cada veículo com posição para remoção O(1)
+    membros = [[] for _ in range(n_v)]
+    posicao = [0] * len(atrib)
+
+    def carregar(nova):
+        # Reconstrói o estado (cargas e membros) a partir de uma atribuição
+        for v in range(n_v):
+            carga_p[v] = carga_v[v] = 0.0
+            membros[v].clear()
+        for i, v in enumerate(nova):
+            atrib[i] = v
+            if v >= 0:
+                posicao[i] = len(membros[v])
+                membros[v].append(i)
+                carga_p[v] += peso[i]
+                carga_v[v] += volume[i]
+
+    carregar(list(atrib))
+
+    # Veículos de cada região e UMs de cada região (maior penalidade primeiro), para substituir/abrir.
+    # Veículos idênticos (mesmos perfis, capacidades, custo e carga mínima) são avaliados uma vez só
+    regiao_veiculo = arr['regiao_veiculo'].tolist()
+    veiculos_por_regiao = defaultdict(list)
+    for v in np.flatnonzero(arr['cap_peso'] > 0).tolist():
+        veiculos_por_regiao[regiao_veiculo[v]].append(v)
+    ums_por_regiao = defaultdict(list)
+    for i in sorted(range(len(atrib)), key=lambda k: -valor[k]):
+        ums_por_regiao[regiao[i]].append(i)
+    classe_veiculo = [(compat[:, v].tobytes(), cap_peso[v], cap_vol[v], custo[v], carga_minima[v])
+                      for v in range(n_v)]
+
+    # Veículos que podem receber cada combinação (perfil, região)
+    opcoes_cache = {}
+
+    def opcoes(i):
+        chave = (perfil[i], regiao[i])
+        if chave not in opcoes_cache:
+            opcoes_cache[chave] = np.flatnonzero(
+                compat[perfil[i]] & (arr['regiao_veiculo'] == regiao[i]) & (arr['cap_peso'] > 0)).tolist()
+        return opcoes_cache[chave]
+
+    def custo_veiculo(v, carga, qtd):
+        return 0.0 if qtd == 0 else custo[v] + max(0.0, carga_minima[v] - carga)
+
+    def cabe(v, p, vol):
+        return carga_p[v] + p <= cap_peso[v] + 1e-9 and carga_v[v] + vol <= cap_vol[v] + 1e-9
+
+    def retirar(i):
+        v = atrib[i]
+        ultimo = membros[v].pop()
+        if ultimo != i:
+            membros[v][posicao[i]] = ultimo
+            posicao[ultimo] = posicao[i]
+        carga_p[v] -= peso[i]
+        carga_v[v] -= volume[i]
+        atrib[i] = -1
+
+    def inserir(i, v):
+        posicao[i] = len(membros[v])
+        membros[v].append(i)
+        carga_p[v] += peso[i]
+        carga_v[v] += volume[i]
+        atrib[i] = v
+
+    def delta_saida(i):
+        a = atrib[i]
+        if a < 0:
+            return -valor[i]
+        qtd = len(membros[a])
+        return custo_veiculo(a, carga_p[a] - peso[i], qtd - 1) - custo_veiculo(a, carga_p[a], qtd)
+
+    def delta_entrada(i, b):
+        qtd = len(membros[b])
+        return custo_veiculo(b, carga_p[b] + peso[i], qtd + 1) - custo_veiculo(b, carga_p[b], qtd)
+
+    def tentar_realocar_ou_trocar(i):
+        a = atrib[i]
+        d_saida = delta_saida(i)
+        melhor_delta, melhor_movimento = 0.0, None
+        if a >= 0:
+            melhor_delta, melhor_movimento = d_saida + valor[i], ('retirar', -1, -1)
+
+        lista = opcoes(i)
+        amostra = lista if len(lista) <= candidatos_por_um else rng.sample(
+            lista, candidatos_por_um)
+        for b in amostra:
+            if b == a:
+                continue
+            if cabe(b, peso[i], volume[i]):
+                delta = d_saida + delta_entrada(i, b)
+                if delta < melhor_delta:
+                    melhor_delta, melhor_movimento = delta, ('realocar', b, -1)
+            elif membros[b]:
+                # Troca com uma UM sorteada de b
+                j = membros[b][rng.randrange(len(membros[b]))]
+                if a >= 0 and not compat[perfil[j], a]:
+                    continue
+                nova_b_p = carga_p[b] - peso[j] + peso[i]
+                nova_b_v = carga_v[b] - volume[j] + volume[i]
+                if nova_b_p > cap_peso[b] + 1e-9 or nova_b_v > cap_vol[b] + 1e-9:
+                    continue
+                qtd_b = len(membros[b])
+                delta = custo_veiculo(b, nova_b_p, qtd_b) - \
+                    custo_veiculo(b, carga_p[b], qtd_b)
+                if a >= 0:
+                    nova_a_p = carga_p[a] - peso[i] + peso[j]
+                    nova_a_v = carga_v[a] - volume[i] + volume[j]
+                    if nova_a_p > cap_peso[a] + 1e-9 or nova_a_v > cap_vol[a] + 1e-9:
+                        continue
+                    qtd_a = len(membros[a])
+                    delta += custo_veiculo(a, nova_a_p, qtd_a) - \
+                        custo_veiculo(a, carga_p[a], qtd_a)
+                else:
+                    delta += valor[j] - valor[i]
+                if delta < melhor_delta:
+                    melhor_delta, melhor_movimento = delta, ('trocar', b, j)
+
+        if melhor_movimento is None or melhor_delta > -1e-9:
+            return False
+
+        movimento, b, j = melhor_movimento
+        if a >= 0:
+            retirar(i)
+        if movimento == 'realocar':
+            inserir(i, b)
+        elif movimento == 'trocar':
+            retirar(j)
+            inserir(i, b)
+            if a >= 0:
+                inserir(j, a)
+        return True
+
+    def reinserir(saindo, a):
+        # Reinsere (first-fit) as UMs de 'saindo' em veículos ativos da região diferentes de a; as que não
+        # couberem ficam não alocadas. Devolve a variação de custo e o destino de cada UM reinserida
+        delta = 0.0
+        extra_p, extra_v, extra_q = defaultdict(float), defaultdict(float), defaultdict(int)
+        destino = {}
+        for i in sorted(saindo, key=lambda k: -valor[k]):
+            lista = opcoes(i)
+            limite = 4 * candidatos_por_um
+            for b in (lista if len(lista) <= limite else rng.sample(lista, limite)):
+                if b == a or not membros[b]:
+                    continue
+                if (carga_p[b] + extra_p[b] + peso[i] <= cap_peso[b] + 1e-9 and
+                        carga_v[b] + extra_v[b] + volume[i] <= cap_vol[b] + 1e-9):
+                    destino[i] = b
+                    extra_p[b] += peso[i]
+                    extra_v[b] += volume[i]
+                    extra_q[b] += 1
+                    break
+            else:
+                delta += valor[i]
+        for b in extra_q:
+            qtd = len(membros[b])
+            delta += custo_veiculo(b, carga_p[b] + extra_p[b], qtd + extra_q[b]) - \
+                custo_veiculo(b, carga_p[b], qtd)
+        return delta, destino
+
+    def tentar_fechar(a, forcar=False):
+        # Esvazia o veículo a e reinsere suas UMs em outros veículos ativos da região
+        if not membros[a]:
+            return False
+        delta, destino = reinserir(membros[a], a)
+        delta -= custo_veiculo(a, carga_p[a], len(membros[a]))
+        if delta > -1e-9 and not forcar:
+            return False
+        for i in list(membros[a]):
+            retirar(i)
+            if i in destino:
+                inserir(i, destino[i])
+        return True
+
+    def completar(b, p0, vol0, livres):
+        # First-fit das UMs não alocadas compatíveis em b a partir da carga (p0, vol0)
+        adicionadas = []
+        for i in livres:
+            if (compat[perfil[i], b] and p0 + peso[i] <= cap_peso[b] + 1e-9 and
+                    vol0 + volume[i] <= cap_vol[b] + 1e-9):
+                adicionadas.append(i)
+                p0 += peso[i]
+                vol0 += volume[i]
+        return adicionadas, p0
+
+    def puxar(b, p0, vol0, a):
+        # Completa b até a carga mínima com UMs de outros veículos ativos da região (exceto a) que continuam
+        # acima da própria carga mínima, então o custo dos doadores não muda
+        puxadas = []
+        for d in veiculos_por_regiao[regiao_veiculo[b]]:
+            if p0 >= carga_minima[b]:
+                break
+            if d == a or d == b or not membros[d]:
+                continue
+            folga = carga_p[d] - carga_minima[d]
+            for i in sorted(membros[d], key=lambda k: -peso[k]):
+                if p0 >= carga_minima[b]:
+                    break
+                if (peso[i] <= folga and compat[perfil[i], b] and p0 + peso[i] <= cap_peso[b] + 1e-9 and
+                        vol0 + volume[i] <= cap_vol[b] + 1e-9):
+                    puxadas.append(i)
+                    folga -= peso[i]
+                    p0 += peso[i]
+                    vol0 += volume[i]
+        return puxadas, p0
+
+    def tentar_substituir(a, r, sorteado=None):
+        # a >= 0: troca o veículo ativo a por um inativo da região r. O novo veículo é preenchido (first-fit,
+        # maior penalidade primeiro) com a carga de a e as UMs não alocadas; o que sobrar de a é
+        # reinserido nos demais veículos ativos ou fica não alocado
+        # a < 0: abre um veículo inativo da região r com as UMs não alocadas
+        # sorteado: avalia só esse veículo e aplica a troca mesmo que piore (perturbação)
+        livres = [i for i in ums_por_regiao[r] if atrib[i] < 0]
+        if a >= 0:
+            candidatos = sorted(membros[a] + livres, key=lambda k: -valor[k])
+            base = -custo_veiculo(a, carga_p[a], len(membros[a]))
+        elif livres:
+            candidatos, base = livres, 0.0
+        else:
+            return False
+
+        melhor_delta, melhor = (-1e-9, None) if sorteado is None else (float('inf'), None)
+        avaliadas = set()
+        for b in (veiculos_por_regiao[r] if sorteado is None else [sorteado]):
+            if membros[b] or classe_veiculo[b] in avaliadas:
+                continue
+            avaliadas.add(classe_veiculo[b])
+            adicionadas, p_b = completar(b, 0.0, 0.0, candidatos)
+            if not adicionadas:
+                continue
+            puxadas, p_b = puxar(b, p_b, sum(volume[i] for i in adicionadas), a)
+            delta = base + custo_veiculo(b, p_b, len(adicionadas) + len(puxadas)) - \
+                sum(valor[i] for i in adicionadas if atrib[i] < 0)
+            destino = {}
+            if a >= 0:
+                no_novo = set(adicionadas)
+                d_resto, destino = reinserir([i for i in membros[a] if i not in no_novo], a)
+                delta += d_resto
+            if delta < melhor_delta:
+                melhor_delta, melhor = delta, (b, adicionadas + puxadas, destino)
+
+        if melhor is None:
+            return False
+        b, adicionadas, destino = melhor
+        if a >= 0:
+            for i in list(membros[a]):
+                retirar(i)
+                if i in destino:
+                    inserir(i, destino[i])
+        for i in adicionadas:
+            if atrib[i] >= 0:
+                retirar(i)
+            inserir(i, b)
+        return True
+
+    def descer():
+        # Aplica os movimentos até nenhum melhorar; devolve False se o tempo acabou antes
+        ordem = list(range(len(atrib)))
+        melhorou = True
+        while melhorou:
+            melhorou = False
+            rng.shuffle(ordem)
+            for k, i in enumerate(ordem):
+                if k % 256 == 0 and time.perf_counter() - inicio > tempo_limite:
+                    return False
+                if opcoes(i) and tentar_realocar_ou_trocar(i):
+                    melhorou = True
+            for a in range(n_v):
+                if time.perf_counter() - inicio > tempo_limite:
+                    return False
+                if tentar_fechar(a) or (membros[a] and tentar_substituir(a, regiao_veiculo[a])):
+                    melhorou = True
+            for r in veiculos_por_regiao:
+                if time.perf_counter() - inicio > tempo_limite:
+                    return False
+                while tentar_substituir(-1, r):
+                    melhorou = True
+        return True
+
+    def perturbar():
+        # Fecha ou substitui à força um veículo ativo sorteado
+        ativos = [a for a in range(n_v) if membros[a]]
+        if not ativos:
+            return False
+        a = rng.choice(ativos)
+        inativos = [b for b in veiculos_por_regiao[regiao_veiculo[a]] if not membros[b]]
+        if inativos and rng.random() < 0.5:
+            return tentar_substituir(a, regiao_veiculo[a], rng.choice(inativos))
+        return tentar_fechar(a, forcar=True)
+
+    melhor, melhor_objetivo = list(atrib), float('inf')
+    while True:
+        convergiu = descer()
+        objetivo = objetivo_atribuicao(arr, np.array(atrib, dtype=np.int64))
+        if objetivo < melhor_objetivo - 1e-9:
+            melhor, melhor_objetivo = list(atrib), objetivo
+        elif atrib != melhor:
+            carregar(melhor)
+        if not convergiu or time.perf_counter() - inicio > tempo_limite or not perturbar():
+            break
+
+    return np.array(melhor, dtype=np.int64)
+
+
+def montar_alocacoes(instancia, cargas_por_veiculo, frete_por_veiculo):
+    # Lista 'alocacoes' de resultados: um registro por veículo com carga, na ordem dos veículos
+    um_por_id = {i['id']: i for i in instancia["ums"]}
+    alocacoes = []
+    for v in instancia["veiculos"]:
+        cargas = cargas_por_veiculo.get(v["id"])
+        if not cargas:
+            continue
+        peso_total = sum(um_por_id[i]["peso"] for i in cargas)
+        volume_total = sum(um_por_id[i]["volume"] for i in cargas)
+        alocacoes.append({
+            'veiculo_id': v["id"],
+            'veiculo_tipo': v["tipo"],
+            'destino': v["destino"],
+            'cargas': cargas,
+            'peso_total': peso_total,
+            'peso_minimo': v["carga_minima"],
+            'capacidade_peso': v["capacidade_peso"],
+            'volume_total': volume_total,
+            'capacidade_volume': v["capacidade_volume"],
+            'custo_veiculo': v["custo"],
+            'frete_morto': frete_por_veiculo.get(v["id"], 0),
+            'taxa_utilizacao_peso': (peso_total / v["capacidade_peso"]) * 100,
+            'taxa_utilizacao_volume': (volume_total / v["capacidade_volume"]) * 100
+        })
+    return alocacoes
+
+
+def resolver_heuristica(tipo_instancia, instancia, tempo_limite=None, semente=0):
+    # Solver sem Gurobi para instâncias grandes demais para o MIP: heurística construtiva + busca local.
+    # Preenche o mesmo dicionário de resultados de resolver_instancia (status GRB.SUBOPTIMAL, sem bound).
+    # tempo_limite=None usa o TIMEOUT vigente na chamada (não o do import), como o memo registra
+    tempo_limite = TIMEOUT if tempo_limite is None else tempo_limite
+    inicio = time.perf_counter()
+    arr = arrays_heuristica(instancia)
+    construtiva = heuristica_construtiva(instancia, arr)
+    restante = max(0.0, tempo_limite - (time.perf_counter() - inicio))
+    atribuicao = busca_local(arr, construtiva['atribuicao'], restante, semente)
+    objetivo = objetivo_atribuicao(arr, atribuicao)
+    tempo_execucao = time.perf_counter() - inicio
+    print(f"🧭 Heurística: construtiva {construtiva['objetivo']:.2f} -> busca local {objetivo:.2f} "
+          f"em {tempo_execucao:.2f} segundos")
+
+    ums = instancia["ums"]
+    veiculos = instancia["veiculos"]
+    alocada = atribuicao >= 0
+    n_v = len(veiculos)
+    carga = np.bincount(atribuicao[alocada], weights=arr['peso'][alocada],
+                        minlength=n_v)
+    ativo = np.bincount(atribuicao[alocada], minlength=n_v) > 0
+    frete = np.where(ativo, np.maximum(0.0, arr['carga_minima'] - carga), 0.0)
+
+    # y_vc implícito: veículo v atende o cliente c se leva alguma UM de c
+    pares = {(veiculos[v]['id'], ums[k]['cliente'])
+             for k, v in enumerate(atribuicao.tolist()) if v >= 0}
+    custo_por_veiculo = {v['id']: v['custo'] for v in veiculos}
+
+    cargas_por_veiculo = defaultdict(list)
+    for k, v in enumerate(atribuicao.tolist()):
+        if v >= 0:
+            cargas_por_veiculo[veiculos[v]['id']].append(ums[k]['id'])
+
+    ums_alocadas = int(alocada.sum())
+    return {
+        'tipo_instancia': tipo_instancia,
+        'status': GRB.SUBOPTIMAL,
+        'tempo_execucao': tempo_execucao,
+        'tempo_construcao_modelo': 0.0,
+        'custo_total': objetivo,
+        'veiculos_ativos': int(ativo.sum()),
+        'veiculos_inativos': n_v - int(ativo.sum()),
+        'ums_alocadas': ums_alocadas,
+        'ums_nao_alocadas': len(ums) - ums_alocadas,
+        'peso_nao_alocado': float(arr['peso'][~alocada].sum()),
+        'volume_nao_alocado': float(arr['volume'][~alocada].sum()),
+        'frete_morto_total': float(frete.sum()),
+        'custo_transporte': float(sum(custo_por_veiculo[v_id] for v_id, _ in pares)),
+        'custo_nao_alocacao': float(arr['peso'][~alocada].sum() * instancia.get("penalidade", 0)),
+        'alocacoes': montar_alocacoes(instancia, cargas_por_veiculo,
+                                      {veiculos[v]['id']: float(frete[v]) for v in np.flatnonzero(ativo)}),
+        'tempo_para_otimo': None,
+        'melhor_solucao': objetivo,
+        'solucao_relaxada': None,
+        'gap_otimizacao': None,
+        'nos_explorados': None,
+        'custo_heuristica': construtiva['objetivo'],
+        'tempo_heuristica': construtiva['tempo'],
+    }
+
 # ====================== FUNÇÕES DE VISUALIZAÇÃO ====================== #
 
 
-def gerar_visualizacoes(resultados, instancia, pasta_saida):
+def gerar_visualizacoes(resultados, instancia, pasta_saida, fases=None):
 
     # Gera e salva todas as visualizações para uma instância.
 
     #     resultados: Dicionário com os resultados da otimização
     #     instancia: Dicionário com os dados da instância
     #     pasta_saida: Caminho para salvar as imagens
+    #     fases: lista de nova_medicao() (cada gráfico é medido como uma fase)
 
     os.makedirs(pasta_saida, exist_ok=True)
     nome_base = resultados['tipo_instancia']
 
-    # 1. Gráficos de Desempenho
-    plot_tempo_execucao(resultados, pasta_saida, nome_base)
-    plot_gap_otimizacao(resultados, pasta_saida, nome_base)
-    plot_status_solucao(resultados, pasta_saida, nome_base)
-
-    # 2. Alocação de Recursos
-    plot_utilizacao_veiculos(resultados, pasta_saida, nome_base)
-    plot_distribuicao_utilizacao(resultados, pasta_saida, nome_base)
-    plot_ums_por_veiculo(resultados, pasta_saida, nome_base)
-
-    # 3. Custos e Penalidades
-    plot_composicao_custos(resultados, pasta_saida, nome_base)
-    plot_custo_por_componente(resultados, pasta_saida, nome_base)
-    plot_penalidades_nao_alocacao(resultados, pasta_saida, nome_base)
+    graficos = [
+        # 1. Gráficos de Desempenho
+        (plot_tempo_execucao, (resultados,)),
+        (plot_gap_otimizacao, (resultados,)),
+        (plot_status_solucao, (resultados,)),
+
+        # 2. Alocação de Recursos
+        (plot_utilizacao_veiculos, (resultados,)),
+        (plot_distribuicao_utilizacao, (resultados,)),
+        (plot_ums_por_veiculo, (resultados,)),
+
+        # 3. Custos e Penalidades
+        (plot_composicao_custos, (resultados,)),
+        (plot_custo_por_componente, (resultados,)),
+        (plot_penalidades_nao_alocacao, (resultados,)),
+    ]
 
     # 4. UMs Não Alocadas
     if resultados['ums_nao_alocadas'] > 0:
-        plot_heatmap_compatibilidade(instancia, pasta_saida, nome_base)
-        plot_distribuicao_ums_nao_alocadas(
-            instancia, resultados, pasta_saida, nome_base)
+        graficos += [
+            (plot_heatmap_compatibilidade, (instancia,)),
+            (plot_distribuicao_ums_nao_alocadas, (instancia, resultados)),
+        ]
+
+    for plot, argumentos in graficos:
+        with medir_fase(fases, plot.__name__):
+            plot(*argumentos, pasta_saida, nome_base)
 
 
 def plot_tempo_execucao(resultados, pasta_saida, nome_base):
@@ -373,7 +1930,8 @@ def plot_status_solucao(resultados, pasta_saida, nome_base):
         GRB.TIME_LIMIT: "Timeout",
         GRB.INFEASIBLE: "Inviável",
         GRB.INF_OR_UNBD: "Infinito/Ilimitado",
-        GRB.UNBOUNDED: "Ilimitado"
+        GRB.UNBOUNDED: "Ilimitado",
+        GRB.SUBOPTIMAL: "Heurística"
     }
     status = status_map.get(resultados['status'], "Desconhecido")
 
@@ -526,44 +2084,88 @@ def plot_penalidades_nao_alocacao(resultados, pasta_saida, nome_base):
     plt.close()
 
 
-def plot_heatmap_compatibilidade(instancia, pasta_saida, nome_base):
-    # Cria matriz de compatibilidade
-    compat_data = []
-    for um in instancia['ums']:
-        compat_veiculos = []
-        for veiculo in instancia['veiculos']:
-            compat = 1 if veiculo['tipo'] in um['compatibilidade'].split(
-                ',') else 0
-            compat_veiculos.append(compat)
-        compat_data.append(compat_veiculos)
-
-    df = pd.DataFrame(
-        compat_data,
-        index=[f"UM_{um['id']}" for um in instancia['ums']],
-        columns=[f"V_{v['id']}({v['tipo']})" for v in instancia['veiculos']]
+def tabela_heatmap_compatibilidade(instancia):
+    # Matriz de compatibilidade agregada: uma linha por padrão distinto de compatibilidade (com o número
+    # de UMs que o têm) e uma coluna por tipo de veículo (com o número de veículos do tipo). O custo
+    # depende do número de padrões e de tipos, não do número de UMs e veículos.
+    # None se a instância não tiver UMs ou veículos
+    perfil_um, compat_perfil = matriz_compatibilidade_perfis(instancia)
+    tipos_veiculo = np.array([v['tipo'] for v in instancia['veiculos']], dtype=object)
+    if len(perfil_um) == 0 or len(tipos_veiculo) == 0:
+        return None
+
+    # Veículos do mesmo tipo têm colunas iguais: mantém a primeira coluna de cada tipo
+    tipos, primeira_coluna, veiculos_por_tipo = np.unique(
+        tipos_veiculo.astype(str), return_index=True, return_counts=True)
+    compat_tipo = compat_perfil[:, primeira_coluna]
+
+    # Perfis com o mesmo padrão de linha (ex.: '#1' e o texto equivalente) são somados
+    padroes, padrao_perfil = np.unique(compat_tipo, axis=0, return_inverse=True)
+    padrao_um = padrao_perfil.ravel()[perfil_um]
+
+    # Grupo de cada UM: o padrão ou o par (região, padrão)
+    if AGRUPAMENTO_HEATMAP == 'regiao':
+        regioes, regiao_um = np.unique(colunas_ums(instancia)['regiao'].astype(str), return_inverse=True)
+        grupos, grupo_um = np.unique(regiao_um.ravel() * len(padroes) + padrao_um, return_inverse=True)
+        rotulos = [f"{regioes[g // len(padroes)] or '?'} · padrão {g % len(padroes) + 1}" for g in grupos]
+        padrao_grupo = grupos % len(padroes)
+    else:
+        grupo_um = padrao_um
+        rotulos = [f"Padrão {k + 1}" for k in range(len(padroes))]
+        padrao_grupo = np.arange(len(padroes))
+    ums_por_grupo = np.bincount(grupo_um.ravel(), minlength=len(rotulos))
+    ordem = [g for g in np.argsort(-ums_por_grupo, kind='stable') if ums_por_grupo[g] > 0]
+
+    # Célula = número de UMs do grupo que podem ir em veículos do tipo (0 = incompatível)
+    return pd.DataFrame(
+        padroes[padrao_grupo[ordem]] * ums_por_grupo[ordem, None],
+        index=[f"{rotulos[g]} ({ums_por_grupo[g]} UMs)" for g in ordem],
+        columns=[f"{t} ({n})" for t, n in zip(tipos, veiculos_por_tipo)]
     )
 
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(df, cmap="Blues", cbar=False)
-    plt.title('Matriz de Compatibilidade UMs x Veículos')
-    plt.tight_layout()
-    plt.savefig(os.path.join(
+
+def desenhar_heatmap_compatibilidade(ax, instancia, df):
+    # Desenha a tabela de tabela_heatmap_compatibilidade no eixo (PNG e página do relatório do lote)
+    sns.heatmap(df, cmap="Blues", cbar=False, annot=len(df) * len(df.columns) <= 400, fmt='d',
+                linewidths=0.5, linecolor='white', ax=ax)
+    ax.set_title(f"Compatibilidade UMs x Tipos de Veículo ({len(instancia['ums'])} UMs, "
+                 f"{len(instancia['veiculos'])} veículos)")
+    ax.set_ylabel('Região e padrão' if AGRUPAMENTO_HEATMAP == 'regiao' else 'Padrão de compatibilidade')
+    ax.set_xlabel('Tipo de veículo (quantidade)')
+    ax.tick_params(axis='x', labelrotation=45)
+    plt.setp(ax.get_xticklabels(), ha='right')
+
+
+def tamanho_heatmap_compatibilidade(df):
+    # A altura da figura acompanha o número de linhas (padrões) da tabela
+    return (12, max(4, 0.4 * len(df) + 2))
+
+
+def plot_heatmap_compatibilidade(instancia, pasta_saida, nome_base):
+    df = tabela_heatmap_compatibilidade(instancia)
+    if df is None:
+        return
+
+    fig, ax = plt.subplots(figsize=tamanho_heatmap_compatibilidade(df))
+    desenhar_heatmap_compatibilidade(ax, instancia, df)
+    fig.tight_layout()
+    fig.savefig(os.path.join(
         pasta_saida, f"{nome_base}_heatmap_compatibilidade.png"), dpi=300)
-    plt.close()
+    plt.close(fig)
 
 
 def plot_distribuicao_ums_nao_alocadas(instancia, resultados, pasta_saida, nome_base):
-    alocados_ids = set()
-    for aloc in resultados['alocacoes']:
-        alocados_ids.update(aloc['cargas'])
+    alocados_ids = [um_id for aloc in resultados['alocacoes']
+                    for um_id in aloc['cargas']]
 
-    ums_nao_alocadas = [um for um in instancia['ums']
-                        if um['id'] not in alocados_ids]
+    colunas = colunas_ums(instancia)
+    nao_alocada = ~np.isin(colunas['id'], alocados_ids)
 
-    if not ums_nao_alocadas:
+    if not nao_alocada.any():
         return
 
-    df = pd.DataFrame(ums_nao_alocadas)
+    df = pd.DataFrame({'peso': colunas['peso'][nao_alocada],
+                       'volume': colunas['volume'][nao_alocada]})
 
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
 
@@ -578,211 +2180,791 @@ def plot_distribuicao_ums_nao_alocadas(instancia, resultados, pasta_saida, nome_
         pasta_saida, f"{nome_base}_distribuicao_ums_nao_alocadas.png"), dpi=300)
     plt.close()
 
+
+def desenhar_trajetorias(ax_primal, ax_gap, resultados_lista):
+    # Sobrepõe as trajetórias do solver das instâncias do lote: gap primal e gap incumbente/bound
+    # ao longo do tempo, para escolher o TIMEOUT a partir dos dados
+    for resultados in resultados_lista:
+        pontos = resultados.get('trajetoria')
+        if not pontos:
+            continue
+        tempos = [t for t, _, _, _ in pontos]
+        incumbentes = [inc for _, inc, _, _ in pontos if inc is not None]
+        if not incumbentes:
+            continue
+        referencia = min(incumbentes)
+        ax_primal.step(tempos, [gap_primal(inc, referencia) for _, inc, _, _ in pontos],
+                       where='post', label=resultados['tipo_instancia'])
+        gaps = [gap_relativo(inc, bnd) for _, inc, bnd, _ in pontos]
+        ax_gap.step([t for t, g in zip(tempos, gaps) if g is not None],
+                    [g * 100 for g in gaps if g is not None],
+                    where='post', label=resultados['tipo_instancia'])
+
+    ax_primal.set_xlabel('Tempo (segundos)')
+    ax_primal.set_ylabel('Gap primal')
+    ax_primal.set_title('Gap Primal ao Longo do Tempo')
+    ax_gap.axhline(y=1, color='r', linestyle='--', label='1%')
+    ax_gap.set_yscale('symlog', linthresh=1)
+    ax_gap.set_ylim(bottom=0)
+    ax_gap.set_xlabel('Tempo (segundos)')
+    ax_gap.set_ylabel('GAP (%)')
+    ax_gap.set_title('GAP de Otimização ao Longo do Tempo')
+    for ax in (ax_primal, ax_gap):
+        ax.axvline(x=TIMEOUT, color='gray', linestyle=':')
+    ax_gap.legend(fontsize='small', loc='upper right')
+
+
+def plot_trajetorias_lote(resultados_lista, pasta_saida):
+    if not any(r.get('trajetoria') for r in resultados_lista):
+        return
+
+    fig, (ax_primal, ax_gap) = plt.subplots(1, 2, figsize=(14, 6))
+    desenhar_trajetorias(ax_primal, ax_gap, resultados_lista)
+    plt.tight_layout()
+    os.makedirs(pasta_saida, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    plt.savefig(os.path.join(
+        pasta_saida, f"trajetorias_lote_{timestamp}.png"), dpi=300)
+    plt.close()
+
+# ====================== RELATÓRIO DO LOTE ====================== #
+
+# Um PDF por lote no lugar dos PNGs por instância: a figura de cada tipo de página é criada uma vez
+# e reaproveitada (os eixos são limpos e redesenhados para cada instância)
+
+ROTULOS_STATUS = {
+    GRB.OPTIMAL: "Ótimo",
+    GRB.TIME_LIMIT: "Timeout",
+    GRB.INFEASIBLE: "Inviável",
+    GRB.INF_OR_UNBD: "Infinito/Ilimitado",
+    GRB.UNBOUNDED: "Ilimitado",
+    GRB.SUBOPTIMAL: "Heurística"
+}
+COMPONENTES_CUSTO = (('Transporte', 'custo_transporte', '#66b3ff'),
+                     ('Frete Morto', 'frete_morto_total', '#ff9999'),
+                     ('Não Alocação', 'custo_nao_alocacao', '#99ff99'))
+
+
+def desenhar_visao_geral(eixos, resultados_lista):
+    # Página 1: tempo, gap, status e composição do custo de todas as instâncias lado a lado
+    ax_tempo, ax_gap, ax_status, ax_custo = eixos.flat
+    nomes = [r['tipo_instancia'] for r in resultados_lista]
+    x = np.arange(len(nomes))
+
+    ax_tempo.bar(x, [r['tempo_execucao'] for r in resultados_lista], color='skyblue')
+    ax_tempo.axhline(y=TIMEOUT, color='r', linestyle='--', label='Timeout')
+    ax_tempo.set_ylabel('Tempo (segundos)')
+    ax_tempo.set_title('Tempo de Execução')
+    ax_tempo.legend()
+
+    ax_gap.bar(x, [r['gap_otimizacao'] or 0 for r in resultados_lista], color='orange')
+    ax_gap.set_ylabel('GAP (%)')
+    ax_gap.set_title('GAP de Otimização')
+
+    rotulos, contagens = np.unique(
+        [ROTULOS_STATUS.get(r['status'], "Desconhecido") for r in resultados_lista], return_counts=True)
+    ax_status.bar(rotulos, contagens, color='lightgreen')
+    ax_status.set_ylabel('Instâncias')
+    ax_status.set_title('Status da Solução')
+
+    base = np.zeros(len(nomes))
+    for rotulo, chave, cor in COMPONENTES_CUSTO:
+        valores = np.array([r[chave] for r in resultados_lista], dtype=float)
+        ax_custo.bar(x, valores, bottom=base, color=cor, label=rotulo)
+        base += valores
+    ax_custo.set_ylabel('Custo (R$)')
+    ax_custo.set_title('Composição do Custo Total')
+    ax_custo.legend()
+
+    for ax in (ax_tempo, ax_gap, ax_custo):
+        ax.set_xticks(x)
+        ax.set_xticklabels(nomes, rotation=45, ha='right', fontsize='small')
+
+
+def desenhar_instancia(eixos, resultados, instancia):
+    # Página de uma instância: utilização dos veículos, UMs por veículo, custos e UMs não alocadas
+    ax_peso, ax_utilizacao, ax_ums, ax_custo, ax_nao_alocadas, ax_resumo = eixos.flat
+    alocacoes = sorted(resultados['alocacoes'], key=lambda a: a['veiculo_id'])
+    ids = [str(a['veiculo_id']) for a in alocacoes]
+    x = np.arange(len(alocacoes))
+
+    # Peso real vs peso mínimo, com a capacidade de cada veículo
+    ax_peso.bar(x - 0.2, [a['peso_total'] for a in alocacoes], 0.4, label='Peso Real')
+    ax_peso.bar(x + 0.2, [a['peso_minimo'] for a in alocacoes], 0.4, label='Peso Mínimo')
+    ax_peso.scatter(x, [a['capacidade_peso'] for a in alocacoes], color='r', marker='_', s=200,
+                    label='Capacidade')
+    ax_peso.set_xticks(x)
+    ax_peso.set_xticklabels(ids, fontsize='small')
+    ax_peso.set_xlabel('Veículos')
+    ax_peso.set_ylabel('Peso (kg)')
+    ax_peso.set_title('Peso Real vs Peso Mínimo')
+    ax_peso.legend(fontsize='small')
+
+    ax_utilizacao.hist([a['taxa_utilizacao_peso'] for a in alocacoes], bins=10, color='skyblue',
+                       edgecolor='white')
+    ax_utilizacao.set_xlabel('Taxa de Utilização de Peso (%)')
+    ax_utilizacao.set_ylabel('Número de Veículos')
+    ax_utilizacao.set_title('Distribuição das Taxas de Utilização')
+
+    tipos = sorted({a['veiculo_tipo'] for a in alocacoes})
+    cores = dict(zip(tipos, sns.color_palette(n_colors=len(tipos))))
+    ax_ums.bar(x, [len(a['cargas']) for a in alocacoes],
+               color=[cores[a['veiculo_tipo']] for a in alocacoes])
+    for tipo in tipos:
+        ax_ums.bar([0], [0], color=cores[tipo], label=tipo)
+    ax_ums.set_xticks(x)
+    ax_ums.set_xticklabels(ids, fontsize='small')
+    ax_ums.set_xlabel('ID do Veículo')
+    ax_ums.set_ylabel('UMs Transportadas')
+    ax_ums.set_title('UMs por Veículo')
+    if tipos:
+        ax_ums.legend(fontsize='x-small')
+
+    barras = ax_custo.barh([rotulo for rotulo, _, _ in COMPONENTES_CUSTO],
+                           [resultados[chave] for _, chave, _ in COMPONENTES_CUSTO],
+                           color=[cor for _, _, cor in COMPONENTES_CUSTO])
+    ax_custo.bar_label(barras, labels=[f"R${resultados[chave]:,.2f}" for _, chave, _ in COMPONENTES_CUSTO],
+                       fontsize='small')
+    ax_custo.set_xlabel('Custo (R$)')
+    ax_custo.set_title('Custo por Componente')
+
+    # Peso e volume das UMs não alocadas
+    colunas = colunas_ums(instancia)
+    alocados_ids = [um_id for a in alocacoes for um_id in a['cargas']]
+    nao_alocada = ~np.isin(colunas['id'], alocados_ids)
+    if nao_alocada.any():
+        ax_nao_alocadas.boxplot([colunas['peso'][nao_alocada], colunas['volume'][nao_alocada]])
+        ax_nao_alocadas.set_xticks([1, 2])
+        ax_nao_alocadas.set_xticklabels(['Peso (kg)', 'Volume (m³)'])
+        ax_nao_alocadas.set_yscale('log')
+    else:
+        ax_nao_alocadas.text(0.5, 0.5, 'Todas as UMs alocadas', ha='center', va='center',
+                             transform=ax_nao_alocadas.transAxes)
+    ax_nao_alocadas.set_title(f"UMs Não Alocadas ({resultados['ums_nao_alocadas']})")
+
+    gap = resultados['gap_otimizacao']
+    linhas = [
+        f"Status: {ROTULOS_STATUS.get(resultados['status'], 'Desconhecido')}",
+        f"Tempo de execução: {resultados['tempo_execucao']:.2f} s",
+        f"GAP: {gap:.2f}%" if gap is not None else "GAP: N/A",
+        f"Custo total: R${resultados['custo_total']:,.2f}",
+        f"Veículos ativos: {resultados['veiculos_ativos']} de "
+        f"{resultados['veiculos_ativos'] + resultados['veiculos_inativos']}",
+        f"UMs alocadas: {resultados['ums_alocadas']} de "
+        f"{resultados['ums_alocadas'] + resultados['ums_nao_alocadas']}",
+        f"Peso não alocado: {resultados['peso_nao_alocado']:,.2f} kg",
+        f"Volume não alocado: {resultados['volume_nao_alocado']:,.2f} m³",
+    ]
+    ax_resumo.axis('off')
+    ax_resumo.text(0, 1, '\n'.join(linhas), va='top', family='monospace')
+
+
+def gerar_relatorio_lote(resultados_lista, instancias, caminho_pdf):
+    # Grava o PDF do lote: visão geral, trajetórias do solver (se houver), uma página por instância
+    # com solução e o heatmap de compatibilidade de cada instância. As páginas de tamanho fixo usam
+    # uma única figura, limpa e redesenhada a cada uso; a altura do heatmap depende da instância.
+    os.makedirs(os.path.dirname(caminho_pdf), exist_ok=True)
+    with PdfPages(caminho_pdf, metadata={'Title': 'Relatório do lote'}) as pdf:
+        fig, eixos = plt.subplots(2, 2, figsize=(16, 10))
+        desenhar_visao_geral(eixos, resultados_lista)
+        fig.suptitle(f"Lote de {len(resultados_lista)} instâncias")
+        fig.tight_layout()
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        if any(r.get('trajetoria') for r in resultados_lista):
+            fig, (ax_primal, ax_gap) = plt.subplots(1, 2, figsize=(16, 7))
+            desenhar_trajetorias(ax_primal, ax_gap, resultados_lista)
+            fig.tight_layout()
+            pdf.savefig(fig)
+            plt.close(fig)
+
+        fig, eixos = plt.subplots(2, 3, figsize=(18, 10))
+        for resultados, instancia in zip(resultados_lista, instancias):
+            if resultados['melhor_solucao'] is not None:
+                for ax in eixos.flat:
+                    ax.clear()
+                    ax.axis('on')
+                desenhar_instancia(eixos, resultados, instancia)
+                fig.suptitle(f"INSTÂNCIA: {resultados['tipo_instancia']}")
+                fig.tight_layout()
+                pdf.savefig(fig)
+
+            # Heatmap logo após a página da instância (depende só da instância, não da solução)
+            df = tabela_heatmap_compatibilidade(instancia)
+            if df is not None:
+                fig_heatmap, ax = plt.subplots(figsize=tamanho_heatmap_compatibilidade(df))
+                desenhar_heatmap_compatibilidade(ax, instancia, df)
+                fig_heatmap.suptitle(f"INSTÂNCIA: {resultados['tipo_instancia']}")
+                fig_heatmap.tight_layout()
+                pdf.savefig(fig_heatmap)
+                plt.close(fig_heatmap)
+        plt.close(fig)
+
 # ====================== EXECUÇÃO CONTROLADA ====================== #
 
 
-def executar_instancia_com_timeout(tipo_instancia, instancia):
+def extrair_solucao(modelo, x, y, z, alpha, instancia):
+    # Lê a solução em bloco (um getAttr por família de variáveis) e calcula todas as métricas de resultados
+    # com arrays de índices (UM, veículo) de cada x, em tempo linear no número de variáveis.
+    ums = instancia["ums"]
+    veiculos = instancia["veiculos"]
+    n_u = len(ums)
+    n_v = len(veiculos)
+    pos_um = {i['id']: k for k, i in enumerate(ums)}
+    pos_veiculo = {v['id']: k for k, v in enumerate(veiculos)}
+
+    # x_ivc: 1 se a UM i foi alocada ao veículo v para o cliente c (chaves existentes; no modelo
+    # esparso nem toda tripla possui variável)
+    valores_x = np.array(modelo.getAttr('X', list(x.values())), dtype=float)
+    x_um = np.fromiter((pos_um[i_id] for i_id, _, _ in x.keys()),
+                       dtype=np.int64, count=len(x))
+    x_veiculo = np.fromiter((pos_veiculo[v_id] for _, v_id, _ in x.keys()),
+                            dtype=np.int64, count=len(x))
+
+    # y_vc, z_v e alpha_v reposicionados na ordem dos veículos
+    valores_y = np.array(modelo.getAttr('X', list(y.values())), dtype=float)
+    y_veiculo = np.fromiter((pos_veiculo[v_id] for v_id, _ in y.keys()),
+                            dtype=np.int64, count=len(y))
+    valores_z = np.zeros(n_v)
+    valores_z[[pos_veiculo[v_id] for v_id in z.keys()]] = modelo.getAttr(
+        'X', list(z.values()))
+    valores_alpha = np.zeros(n_v)
+    valores_alpha[[pos_veiculo[v_id] for v_id in alpha.keys()]] = modelo.getAttr(
+        'X', list(alpha.values()))
+
+    colunas = colunas_ums(instancia)
+    peso = colunas['peso']
+    volume = colunas['volume']
+    custo = np.array([v['custo'] for v in veiculos], dtype=float)
+
+    alocado = valores_x > 0.9
+    soma_x_um = np.bincount(x_um, weights=valores_x, minlength=n_u)
+    max_x_um = np.zeros(n_u)
+    np.maximum.at(max_x_um, x_um, valores_x)
+
+    # Veículo ativo: leva alguma UM (x > 0.9) ou foi marcado como ativo (alpha > 0.9)
+    ativo = (np.bincount(x_veiculo[alocado], minlength=n_v) > 0) | (valores_alpha > 0.9)
+    # UM não alocada: todas as suas x < 0.1
+    nao_alocada = max_x_um < 0.1
+
+    # Cargas por veículo, na ordem das UMs da instância
+    ordem = np.lexsort((x_um[alocado], x_veiculo[alocado]))
+    pares = np.unique(np.stack([x_veiculo[alocado][ordem], x_um[alocado][ordem]], axis=1), axis=0) \
+        if alocado.any() else np.empty((0, 2), dtype=np.int64)
+    cargas_por_veiculo = defaultdict(list)
+    for v, i in pares.tolist():
+        cargas_por_veiculo[veiculos[v]['id']].append(ums[i]['id'])
+
+    veiculos_ativos = int(ativo.sum())
+    ums_nao_alocadas = int(nao_alocada.sum())
+
+    return {
+        # valor da função objetivo (Custo de transporte + Frete morto + Penalidades por não alocação)
+        'custo_total': modelo.ObjVal,
+        'veiculos_ativos': veiculos_ativos,
+        'veiculos_inativos': n_v - veiculos_ativos,
+        'ums_alocadas': n_u - ums_nao_alocadas,
+        'ums_nao_alocadas': ums_nao_alocadas,
+        'peso_nao_alocado': float(peso[nao_alocada].sum()),
+        'volume_nao_alocado': float(volume[nao_alocada].sum()),
+        'frete_morto_total': float(valores_z.sum()),
+        # custo do veículo * y_vc para cada par veículo-cliente
+        'custo_transporte': float(np.dot(custo[y_veiculo], valores_y)),
+        # peso * penalidade * (1 - total de alocações da UM)
+        'custo_nao_alocacao': float(np.sum(peso * instancia["penalidade"] * (1 - soma_x_um))),
+        'alocacoes': montar_alocacoes(instancia, cargas_por_veiculo,
+                                      {v['id']: float(valores_z[k]) for k, v in enumerate(veiculos)}),
+    }
+
+
+# ====================== TRAJETÓRIA DO SOLVER ====================== #
+
+
+def _valor_objetivo(valor):
+    # O Gurobi usa +-GRB.INFINITY (1e100) quando ainda não há incumbente/bound
+    return None if valor is None or abs(valor) >= GRB.INFINITY else valor
+
+
+def criar_callback_trajetoria(trajetoria):
+    # Callback que acrescenta pontos [tempo, incumbente, bound, nós] em 'trajetoria'
+    ultima_amostra = [-INTERVALO_TRAJETORIA]
+
+    def callback(modelo, onde):
+        if onde == GRB.Callback.MIPSOL:
+            tempo = modelo.cbGet(GRB.Callback.RUNTIME)
+            # MIPSOL_OBJ é a solução nova; MIPSOL_OBJBST a melhor anterior (minimização)
+            incumbente = min(modelo.cbGet(GRB.Callback.MIPSOL_OBJ),
+                             modelo.cbGet(GRB.Callback.MIPSOL_OBJBST))
+            bound = modelo.cbGet(GRB.Callback.MIPSOL_OBJBND)
+            nos = modelo.cbGet(GRB.Callback.MIPSOL_NODCNT)
+        elif onde == GRB.Callback.MIP:
+            tempo = modelo.cbGet(GRB.Callback.RUNTIME)
+            if tempo - ultima_amostra[0] < INTERVALO_TRAJETORIA:
+                return
+            incumbente = modelo.cbGet(GRB.Callback.MIP_OBJBST)
+            bound = modelo.cbGet(GRB.Callback.MIP_OBJBND)
+            nos = modelo.cbGet(GRB.Callback.MIP_NODCNT)
+        else:
+            return
+        ultima_amostra[0] = tempo
+        trajetoria.append([tempo, _valor_objetivo(incumbente), _valor_objetivo(bound), nos])
+
+    return callback
+
+
+def gap_relativo(incumbente, bound):
+    # Mesma definição do MIPGap do Gurobi: |incumbente - bound| / |incumbente|
+    if incumbente is None or bound is None:
+        return None
+    diferenca = abs(incumbente - bound)
+    if diferenca < 1e-9:
+        return 0.0
+    return diferenca / abs(incumbente) if incumbente != 0 else float('inf')
+
+
+def gap_primal(incumbente, referencia):
+    # Função de gap primal (Berthold, 2013): 1 sem incumbente; |ref - inc| / max(|ref|, |inc|) com incumbente
+    if incumbente is None:
+        return 1.0
+    if abs(incumbente - referencia) < 1e-9:
+        return 0.0
+    return abs(referencia - incumbente) / max(abs(referencia), abs(incumbente))
+
+
+def metricas_trajetoria(trajetoria, tempo_total):
+    # Tempo até a primeira incumbente, tempo até gap <= 1% e integral primal em [0, tempo_total]
+    # (referência = melhor incumbente da execução; a função de gap primal é constante entre amostras)
+    tempo_primeira = next((t for t, inc, _, _ in trajetoria if inc is not None), None)
+    tempo_gap_1 = next((t for t, inc, bnd, _ in trajetoria
+                        if gap_relativo(inc, bnd) is not None and gap_relativo(inc, bnd) <= 0.01), None)
+
+    incumbentes = [inc for _, inc, _, _ in trajetoria if inc is not None]
+    integral = None
+    if incumbentes:
+        referencia = min(incumbentes)
+        integral = 0.0
+        tempo_anterior, valor_anterior = 0.0, 1.0
+        for t, inc, _, _ in trajetoria:
+            integral += valor_anterior * (t - tempo_anterior)
+            tempo_anterior, valor_anterior = t, gap_primal(inc, referencia)
+        integral += valor_anterior * max(0.0, tempo_total - tempo_anterior)
+
+    return {
+        'tempo_primeira_incumbente': tempo_primeira,
+        'tempo_gap_1pct': tempo_gap_1,
+        'integral_primal': integral,
+    }
+
+
+def resolver_instancia(tipo_instancia, instancia, threads=None, fases=None):
+    # Constrói o modelo, otimiza e extrai o dicionário de resultados (sem gerar visualizações)
+    # fases: lista de nova_medicao() onde cada etapa é registrada (None = sem instrumentação)
+    # Cria o modelo
+    inicio_construcao = time.perf_counter()
+    with medir_fase(fases, 'construcao_modelo'):
+        modelo, x, y, z, alpha = construir_modelo(instancia)
+    tempo_construcao = time.perf_counter() - inicio_construcao
+    print(
+        f"🔧 Modelo construído em {tempo_construcao:.2f} segundos (construtor: {CONSTRUTOR_MODELO})")
+
+    # Configura o timeout (1 hora = 3600 segundos)
+    modelo.Params.TimeLimit = TIMEOUT  # timeout em segundos
+
+    # Subproblemas paralelos recebem uma fatia das threads da máquina
+    if threads is not None:
+        modelo.Params.Threads = threads
+
+    # Gera log com resultados
+    os.makedirs(PASTA_LOGS_GUROBI, exist_ok=True)
+    modelo.Params.LogFile = os.path.join(PASTA_LOGS_GUROBI, f"gurobi_log_{tipo_instancia}.log")
+
+    # MANTER VALORES PADRÃO DO GUROBI E MENCIONAR ISSO NO ARTIGO
+    # Para agilizar os testes
+    # modelo.Params.MIPGap = 0.01       # Aceita 1% de gap
+    # modelo.Params.MIPFocus = 1        # Foco em soluções factíveis rápidas
+    # modelo.Params.Heuristics = 0.5    # Aumenta esforço em heurísticas
+
+    # Obter mais informações da otimização
+    # modelo.Params.MIPGapAbs = 1e-6  # Precisão absoluta
+    # modelo.Params.MIPGap = 0.0      # Busca o ótimo (gap zero)
+    modelo.Params.OutputFlag = 1    # Habilita logs do solver
+
+    # Solução inicial (MIP start) da heurística construtiva
+    solucao_inicial = None
+    if SOLUCAO_INICIAL:
+        with medir_fase(fases, 'heuristica_construtiva'):
+            solucao_inicial = heuristica_construtiva(instancia)
+            aplicar_solucao_inicial(modelo, x, y, z, alpha,
+                                    instancia, solucao_inicial)
+        print(
+            f"🧭 Heurística construtiva: {solucao_inicial['objetivo']:.2f} em {solucao_inicial['tempo']:.3f} segundos")
+
+    # Otimiza o modelo com o solver do gurobi
+    trajetoria = [] if CAPTURAR_TRAJETORIA else None
+    with medir_fase(fases, 'otimizacao'):
+        if trajetoria is None:
+            modelo.optimize()
+        else:
+            modelo.optimize(criar_callback_trajetoria(trajetoria))
+
+    # Cria um dicionário para armazenar todos os resultados e inicializa com valores zerados
+    resultados = {
+        'tipo_instancia': tipo_instancia,
+        'status': modelo.status,
+        'tempo_execucao': modelo.Runtime,
+        'tempo_construcao_modelo': tempo_construcao,
+        'custo_total': None,
+        'veiculos_ativos': 0,
+        'veiculos_inativos': len(instancia["veiculos"]),
+        'ums_alocadas': 0,
+        'ums_nao_alocadas': len(instancia["ums"]),
+        'peso_nao_alocado': 0,
+        'volume_nao_alocado': 0,
+        'frete_morto_total': 0,
+        'custo_transporte': 0,
+        'custo_nao_alocacao': 0,
+        'alocacoes': [],
+        # Dados da solução:
+        'tempo_para_otimo': modelo.RunTime if modelo.status == GRB.OPTIMAL else None,
+        'melhor_solucao': modelo.ObjVal if modelo.SolCount > 0 else None,
+        # 'solucao_relaxada': modelo.ObjBound if hasattr(modelo, 'ObjBound') else None,
+        'solucao_relaxada': modelo.ObjBound if modelo.SolCount > 0 else None,
+        # Em porcentagem
+        'gap_otimizacao': modelo.MIPGap*100 if hasattr(modelo, 'MIPGap') else None,
+        # Nós do branch-and-bound (mede o efeito da quebra de simetria)
+        'nos_explorados': int(modelo.NodeCount),
+        # Solução inicial fornecida ao Gurobi (None se SOLUCAO_INICIAL = False)
+        'custo_heuristica': solucao_inicial['objetivo'] if solucao_inicial else None,
+        'tempo_heuristica': solucao_inicial['tempo'] if solucao_inicial else None,
+    }
+
+    if modelo.SolCount > 0:  # Se encontrar qualquer solução #modelo.status == GRB.OPTIMAL:
+        with medir_fase(fases, 'extracao_solucao'):
+            resultados.update(extrair_solucao(modelo, x, y, z, alpha, instancia))
+
+    if trajetoria is not None:
+        # Ponto final com o estado ao término (tempo limite ou ótimo)
+        trajetoria.append([modelo.Runtime,
+                           modelo.ObjVal if modelo.SolCount > 0 else None,
+                           _valor_objetivo(modelo.ObjBound) if modelo.SolCount > 0 else None,
+                           modelo.NodeCount])
+        resultados['trajetoria'] = trajetoria
+        resultados.update(metricas_trajetoria(trajetoria, modelo.Runtime))
+
+    return resultados
+
+
+def dividir_instancia_por_regiao(instancia):
+    # delta só permite que um veículo atenda clientes do seu próprio destino. Quando a UM também fica
+    # restrita ao seu próprio cliente (ver modelo_restrito_por_regiao), o modelo se separa exatamente em
+    # um subproblema independente por região (veículos, clientes e UMs da região)
+    destino_cliente = {c['id']: c['destino'] for c in instancia["clientes"]}
+
+    subinstancias = {}
+
+    def subinstancia(regiao):
+        if regiao not in subinstancias:
+            subinstancias[regiao] = {
+                "veiculos": [],
+                "ums": [],
+                "clientes": [],
+                "penalidade": instancia.get("penalidade", 0)
+            }
+        return subinstancias[regiao]
+
+    for v in instancia["veiculos"]:
+        subinstancia(v['destino'])["veiculos"].append(v)
+    for c in instancia["clientes"]:
+        subinstancia(c['destino'])["clientes"].append(c)
+    for i in instancia["ums"]:
+        subinstancia(destino_cliente.get(i['cliente'], ''))["ums"].append(i)
+
+    return dict(sorted(subinstancias.items()))
+
+
+def _resolver_subproblema(tipo_instancia, subinstancia, threads):
+    # Executado em um processo separado: cada processo cria seu próprio ambiente Gurobi
+    return resolver_instancia(tipo_instancia, subinstancia, threads=threads)
+
+
+def combinar_resultados_regioes(tipo_instancia, instancia, parciais, paralelo=True):
+    # Junta os resultados dos subproblemas em um único dicionário com os mesmos campos de resolver_instancia
+    status_parciais = [r['status'] for r in parciais]
+    if all(st == GRB.OPTIMAL for st in status_parciais):
+        status = GRB.OPTIMAL
+    elif GRB.TIME_LIMIT in status_parciais:
+        status = GRB.TIME_LIMIT
+    else:
+        status = next(st for st in status_parciais if st != GRB.OPTIMAL)
+
+    def somar(campo):
+        return sum(r[campo] for r in parciais)
+
+    def somar_opcional(campo):
+        valores = [r.get(campo) for r in parciais]
+        return None if any(v is None for v in valores) else sum(valores)
+
+    # Em paralelo o tempo de parede é o do subproblema mais lento
+    tempos = [r['tempo_execucao'] for r in parciais]
+    tempo_execucao = (max(tempos) if paralelo else sum(tempos)) if tempos else 0
+
+    melhor_solucao = somar_opcional('melhor_solucao')
+    solucao_relaxada = somar_opcional('solucao_relaxada')
+    gap_otimizacao = None
+    if melhor_solucao is not None and solucao_relaxada is not None:
+        # Mesma definição do MIPGap do Gurobi: |bound - incumbente| / |incumbente|
+        diferenca = abs(melhor_solucao - solucao_relaxada)
+        gap_otimizacao = 0.0 if diferenca < 1e-9 else (
+            diferenca / abs(melhor_solucao) * 100 if melhor_solucao != 0 else float('inf'))
+
+    ordem_veiculos = {v['id']: k for k, v in enumerate(instancia["veiculos"])}
+    alocacoes = sorted((aloc for r in parciais for aloc in r['alocacoes']),
+                       key=lambda aloc: ordem_veiculos[aloc['veiculo_id']])
+
+    veiculos_ativos = somar('veiculos_ativos')
+    ums_alocadas = somar('ums_alocadas')
+
+    return {
+        'tipo_instancia': tipo_instancia,
+        'status': status,
+        'tempo_execucao': tempo_execucao,
+        'tempo_construcao_modelo': somar('tempo_construcao_modelo'),
+        'custo_total': somar_opcional('custo_total'),
+        'veiculos_ativos': veiculos_ativos,
+        'veiculos_inativos': len(instancia["veiculos"]) - veiculos_ativos,
+        'ums_alocadas': ums_alocadas,
+        'ums_nao_alocadas': len(instancia["ums"]) - ums_alocadas,
+        'peso_nao_alocado': somar('peso_nao_alocado'),
+        'volume_nao_alocado': somar('volume_nao_alocado'),
+        'frete_morto_total': somar('frete_morto_total'),
+        'custo_transporte': somar('custo_transporte'),
+        'custo_nao_alocacao': somar('custo_nao_alocacao'),
+        'alocacoes': alocacoes,
+        'tempo_para_otimo': tempo_execucao if status == GRB.OPTIMAL else None,
+        'melhor_solucao': melhor_solucao,
+        'solucao_relaxada': solucao_relaxada,
+        'gap_otimizacao': gap_otimizacao,
+        'nos_explorados': somar_opcional('nos_explorados'),
+        'custo_heuristica': somar_opcional('custo_heuristica'),
+        'tempo_heuristica': somar_opcional('tempo_heuristica'),
+    }
+
+
+def resolver_por_regiao(tipo_instancia, instancia, threads=None):
+    # Resolve cada região como um subproblema independente, em paralelo, e combina as soluções
+    # Com o construtor denso a separação não é exata: resolve o modelo único no lugar
+    if not modelo_restrito_por_regiao():
+        print("⚠️ Decomposição ignorada: o construtor denso permite UMs em veículos de outras regiões")
+        return resolver_instancia(tipo_instancia, instancia, threads)
+
+    subinstancias = dividir_instancia_por_regiao(instancia)
+    descricao = [f"{regiao or 'sem região'} ({len(sub['ums'])} UMs, {len(sub['veiculos'])} veículos)"
+                 for regiao, sub in subinstancias.items()]
+    print(f"🧩 Decomposição por região: {', '.join(descricao)}")
+
+    num_processos = max(1, min(len(subinstancias), os.cpu_count() or 1))
+    # Processos de um Pool (daemon) não podem criar filhos: nesse caso resolve em sequência
+    paralelo = num_processos > 1 and not mp.current_process().daemon
+
+    parciais = []
+    if paralelo:
+        threads = max(1, (os.cpu_count() or 1) // num_processos)
+        with ProcessPoolExecutor(max_workers=num_processos) as executor:
+            futuros = [executor.submit(_resolver_subproblema, f"{tipo_instancia}_{regiao}", sub, threads)
+                       for regiao, sub in subinstancias.items()]
+            parciais = [futuro.result() for futuro in futuros]
+    else:
+        parciais = [resolver_instancia(f"{tipo_instancia}_{regiao}", sub, threads)
+                    for regiao, sub in subinstancias.items()]
+
+    if any(r is None for r in parciais):
+        raise RuntimeError("falha ao resolver um dos subproblemas regionais")
+
+    return combinar_resultados_regioes(tipo_instancia, instancia, parciais, paralelo)
+
+
+# ====================== PRESOLVE ====================== #
+
+# Reduções válidas para qualquer solução ótima do modelo (a não alocação é permitida, então nenhuma
+# quantidade mínima de veículos pode ser imposta a partir da demanda):
+#   - veículo sem capacidade de peso ou de volume: não leva nada, ativá-lo só custaria
+#   - tipo de veículo retirado da compatibilidade da UM quando nenhum veículo desse tipo na região da UM
+#     comporta o peso e o volume dela (x seria sempre 0)
+#   - UM que não cabe em nenhum veículo compatível da sua região: fica fixada como não alocada e a sua
+#     penalidade vira uma constante somada ao objetivo
+#   - veículo que nenhuma UM restante pode usar (inclui veículos de regiões sem clientes)
+#   - cliente sem UMs restantes (os y_vc dele nunca seriam necessários)
+# As reduções supõem que a UM só viaja em veículos da região do seu próprio cliente, como na heurística
+# e nos construtores esparso e matricial. No construtor denso (ver modelo_restrito_por_regiao) a UM pode
+# ir em um veículo de outra região e o presolve mudaria o ótimo: nesse caso ele não é aplicado.
+
+
+def presolve_aplicavel():
+    # PRESOLVE ligado e o modelo resolvido restringe cada UM à região do seu cliente
+    if not PRESOLVE:
+        return False
+    return MODO_SOLUCAO == 'heuristica' or modelo_restrito_por_regiao()
+
+
+def presolve_instancia(instancia):
+    # Devolve (instância reduzida, relatório). Os ids de veículos, UMs e clientes são mantidos, então
+    # as alocações da instância reduzida já estão nos ids originais (ver restaurar_resultados_presolve)
+    veiculos = instancia["veiculos"]
+    ums = instancia["ums"]
+    colunas = colunas_ums(instancia)
+    perfil_um, compat_perfil = matriz_compatibilidade_perfis(instancia)
+
+    cap_peso = np.array([v['capacidade_peso'] for v in veiculos], dtype=float)
+    cap_vol = np.array([v['capacidade_volume'] for v in veiculos], dtype=float)
+    com_capacidade = (cap_peso > 0) & (cap_vol > 0)
+    regiao_veiculo = np.array([str(v['destino']) for v in veiculos], dtype=object)
+    regiao_um = colunas['regiao'].astype(str).astype(object)
+    tipos, tipo_veiculo = np.unique(np.array([str(v['tipo']) for v in veiculos]), return_inverse=True)
+    tipo_veiculo = tipo_veiculo.ravel()
+
+    # usavel_tipo[i, t]: algum veículo do tipo t na região da UM i é compatível e comporta a UM
+    usavel_tipo = np.zeros((len(ums), len(tipos)), dtype=bool)
+    veiculo_usado = np.zeros(len(veiculos), dtype=bool)
+    variaveis_antes = 0
+    for regiao in np.unique(regiao_um):
+        idx_u = np.flatnonzero(regiao_um == regiao)
+        idx_regiao = np.flatnonzero(regiao_veiculo == regiao)
+        compat = compat_perfil[perfil_um[idx_u]][:, idx_regiao]
+        variaveis_antes += int(compat.sum())
+        usavel = (compat & com_capacidade[idx_regiao]
+                  & (colunas['peso'][idx_u, None] <= cap_peso[idx_regiao] + 1e-9)
+                  & (colunas['volume'][idx_u, None] <= cap_vol[idx_regiao] + 1e-9))
+        veiculo_usado[idx_regiao] |= usavel.any(axis=0)
+        for t in np.unique(tipo_veiculo[idx_regiao]):
+            usavel_tipo[idx_u, t] = usavel[:, tipo_veiculo[idx_regiao] == t].any(axis=1)
+
+    mantida = usavel_tipo.any(axis=1)
+    fixada = ~mantida
+    veiculo_mantido = veiculo_usado & com_capacidade
+    padroes, padrao_um = np.unique(usavel_tipo[mantida], axis=0, return_inverse=True)
+    padrao_um = padrao_um.ravel()
+    conjuntos = [frozenset(tipos[p].tolist()) for p in padroes]
+
+    ums_reduzidas = []
+    for k, i in enumerate(np.flatnonzero(mantida).tolist()):
+        um = ums[i]
+        conjunto = conjuntos[padrao_um[k]]
+        if conjunto != veiculos_compativeis_um(um):
+            um = dict(um, tipos_compativeis=conjunto, compatibilidade=','.join(sorted(conjunto)))
+        ums_reduzidas.append(um)
+
+    clientes_com_ums = set(colunas['cliente'][mantida].tolist())
+    clientes_reduzidos = [c for c in instancia["clientes"] if c['id'] in clientes_com_ums]
+    veiculos_reduzidos = [v for v, manter in zip(veiculos, veiculo_mantido.tolist()) if manter]
+
+    colunas_reduzidas = {nome: valores[mantida] for nome, valores in colunas.items() if nome != 'perfil'}
+    colunas_reduzidas['perfil'] = padrao_um.astype(np.int64)
+
+    variaveis_depois = 0
+    for regiao in np.unique(regiao_um[mantida]):
+        idx_u = np.flatnonzero(mantida & (regiao_um == regiao))
+        idx_v = np.flatnonzero(veiculo_mantido & (regiao_veiculo == regiao))
+        variaveis_depois += int(usavel_tipo[idx_u][:, tipo_veiculo[idx_v]].sum())
+
+    peso_fixo = float(colunas['peso'][fixada].sum())
+    objetivo_fixo = float((colunas['peso'] * colunas['penalidade'])[fixada].sum())
+    relatorio = {
+        'veiculos_sem_capacidade': [v['id'] for v, c in zip(veiculos, com_capacidade.tolist()) if not c],
+        'veiculos_sem_uso': [v['id'] for v, c, u in zip(veiculos, com_capacidade.tolist(),
+                                                        veiculo_usado.tolist()) if c and not u],
+        'ums_fixadas_nao_alocadas': colunas['id'][fixada].tolist(),
+        'clientes_sem_ums': [c['id'] for c in instancia["clientes"] if c['id'] not in clientes_com_ums],
+        'variaveis_x_antes': variaveis_antes,
+        'variaveis_x_depois': variaveis_depois,
+        'peso_fixo': peso_fixo,
+        'volume_fixo': float(colunas['volume'][fixada].sum()),
+        # Constante do objetivo das UMs fixadas (penalidade individual, como em criar_modelo)
+        'objetivo_fixo': objetivo_fixo,
+        # Mesma conta de custo_nao_alocacao em extrair_solucao (penalidade da instância)
+        'custo_nao_alocacao_fixo': peso_fixo * instancia.get("penalidade", 0),
+    }
+
+    reduzida = dict(instancia)
+    reduzida.update({
+        "veiculos": veiculos_reduzidos,
+        "ums": ums_reduzidas,
+        "clientes": clientes_reduzidos,
+        "colunas": colunas_reduzidas,
+        "perfis_compatibilidade": conjuntos,
+        # Identidade própria nos caches de modelo (o conteúdo difere do arquivo original)
+        "hash": hashlib.sha256(f"{instancia['hash']}|presolve|v{VERSAO_PRESOLVE}".encode()).hexdigest()
+        if instancia.get("hash") else None,
+    })
+    return reduzida, relatorio
+
+
+def imprimir_presolve(relatorio):
+    print(f"🧹 Presolve: {len(relatorio['veiculos_sem_capacidade'])} veículos sem capacidade, "
+          f"{len(relatorio['veiculos_sem_uso'])} veículos sem UMs utilizáveis, "
+          f"{len(relatorio['ums_fixadas_nao_alocadas'])} UMs fixadas como não alocadas "
+          f"(+{relatorio['objetivo_fixo']:.2f} no objetivo), "
+          f"{len(relatorio['clientes_sem_ums'])} clientes sem UMs removidos")
+    print(f"   variáveis x: {relatorio['variaveis_x_antes']} -> {relatorio['variaveis_x_depois']}")
+
+
+def restaurar_resultados_presolve(resultados, instancia, relatorio):
+    # Resultados da instância reduzida -> instância original: soma as UMs fixadas e a constante do
+    # objetivo, e recontam veículos e UMs sobre a instância completa
+    objetivo_fixo = relatorio['objetivo_fixo']
+    for campo in ('custo_total', 'melhor_solucao', 'solucao_relaxada', 'custo_heuristica'):
+        if resultados.get(campo) is not None:
+            resultados[campo] += objetivo_fixo
+    resultados['veiculos_inativos'] = len(instancia["veiculos"]) - resultados['veiculos_ativos']
+    resultados['ums_nao_alocadas'] = len(instancia["ums"]) - resultados['ums_alocadas']
+    resultados['peso_nao_alocado'] += relatorio['peso_fixo']
+    resultados['volume_nao_alocado'] += relatorio['volume_fixo']
+    resultados['custo_nao_alocacao'] += relatorio['custo_nao_alocacao_fixo']
+
+    if objetivo_fixo and resultados.get('melhor_solucao') is not None and resultados.get('solucao_relaxada') is not None:
+        resultados['gap_otimizacao'] = gap_relativo(resultados['melhor_solucao'],
+                                                    resultados['solucao_relaxada']) * 100
+    if objetivo_fixo and resultados.get('trajetoria'):
+        resultados['trajetoria'] = [[t, None if inc is None else inc + objetivo_fixo,
+                                     None if bnd is None else bnd + objetivo_fixo, nos]
+                                    for t, inc, bnd, nos in resultados['trajetoria']]
+        resultados.update(metricas_trajetoria(resultados['trajetoria'], resultados['tempo_execucao']))
+
+    resultados['presolve'] = relatorio
+    return resultados
+
+
+def executar_instancia_com_timeout(tipo_instancia, instancia, threads=None, fases=None):
 
     try:
         print(f"\n{'='*80}")
         print(f"INICIANDO INSTÂNCIA: {tipo_instancia.upper()}")
         print(f"{'='*80}")
 
-        # Cria o modelo
-        modelo, x, y, z, alpha = criar_modelo(instancia)
-
-        # Configura o timeout (1 hora = 3600 segundos)
-        modelo.Params.TimeLimit = TIMEOUT  # timeout em segundos
-
-        # Gera log com resultados
-        modelo.Params.LogFile = os.path.join(os.path.dirname(
-            __file__), 'Otimizacao', 'Resultados', f"gurobi_log_{tipo_instancia}.log")
-
-        # MANTER VALORES PADRÃO DO GUROBI E MENCIONAR ISSO NO ARTIGO
-        # Para agilizar os testes
-        # modelo.Params.MIPGap = 0.01       # Aceita 1% de gap
-        # modelo.Params.MIPFocus = 1        # Foco em soluções factíveis rápidas
-        # modelo.Params.Heuristics = 0.5    # Aumenta esforço em heurísticas
-
-        # Obter mais informações da otimização
-        # modelo.Params.MIPGapAbs = 1e-6  # Precisão absoluta
-        # modelo.Params.MIPGap = 0.0      # Busca o ótimo (gap zero)
-        modelo.Params.OutputFlag = 1    # Habilita logs do solver
-
-        # Otimiza o modelo com o solver do gurobi
-        modelo.optimize()
-
-        # Cria um dicionário para armazenar todos os resultados e inicializa com valores zerados
-        resultados = {
-            'tipo_instancia': tipo_instancia,
-            'status': modelo.status,
-            'tempo_execucao': modelo.Runtime,
-            'custo_total': None,
-            'veiculos_ativos': 0,
-            'veiculos_inativos': len(instancia["veiculos"]),
-            'ums_alocadas': 0,
-            'ums_nao_alocadas': len(instancia["ums"]),
-            'peso_nao_alocado': 0,
-            'volume_nao_alocado': 0,
-            'frete_morto_total': 0,
-            'custo_transporte': 0,
-            'custo_nao_alocacao': 0,
-            'alocacoes': [],
-            # Dados da solução:
-            'tempo_para_otimo': modelo.RunTime if modelo.status == GRB.OPTIMAL else None,
-            'melhor_solucao': modelo.ObjVal if modelo.SolCount > 0 else None,
-            # 'solucao_relaxada': modelo.ObjBound if hasattr(modelo, 'ObjBound') else None,
-            'solucao_relaxada': modelo.ObjBound if modelo.SolCount > 0 else None,
-            # Em porcentagem
-            'gap_otimizacao': modelo.MIPGap*100 if hasattr(modelo, 'MIPGap') else None,
-        }
-
-        if modelo.SolCount > 0:  # Se encontrar qualquer solução #modelo.status == GRB.OPTIMAL:
-            # for i in instancia["ums"]:
-            #     for v in instancia["veiculos"]:
-            #         for c in instancia["clientes"]:
-            #             chave = (i["id"], v["id"], c["id"])
-            #             valor = x[chave].x  # Valor da variável na solução
-            #             x_val[chave] = valor
-
-            # x_ivc: 1 se a UM 1 foi alocada ao veículo v para o cliente c
-            x_val = {(i["id"], v["id"], c["id"]): x[(i["id"], v["id"], c["id"])].x
-                     # .x retorna o valor da variável na solução encontrada.
-                     # Se a solução foi x = 1 (alocada), x[(...)].x retornará 1.0.
-                     # Se não foi alocada, retornará 0.0
-                     for i in instancia["ums"]
-                     for v in instancia["veiculos"]
-                     for c in instancia["clientes"]}
-
-            # y_vc: 1 se o veículo v foi usado para atender o cliente c e 0 caso contrário
-            y_val = {(v["id"], c["id"]): y[(v["id"], c["id"])].x
-                     for v in instancia["veiculos"]
-                     for c in instancia["clientes"]}
-
-            # z_v: valor do frete mortopara o veículo v
-            z_val = {v["id"]: z[v["id"]].x for v in instancia["veiculos"]}
-
-            # print("\n🟠🟠🟠🟠🟠 Valores das variáveis:")
-            # # Verificar se há valores 1.0
-            # print("x_val samples:", list(x_val.values())[:5])
-            # print("y_val samples:", list(y_val.values())[:5])
-            # print("z_val samples:", list(z_val.values())[:5])
-
-            if hasattr(modelo, 'ObjVal'):
-                # Evitar erros quando os atributos não estão disponíveis
-                resultados['custo_total'] = modelo.ObjVal
-            # Calcula métricas
-            # valor da função objetivo na solução encontrada pelo Gurobi. Armazena o custo total da solução (Custo de transporte + Frete morto + Penalidades por não alocação) no dicionário de resultados
-            resultados['custo_total'] = modelo.objVal
-
-            resultados['veiculos_ativos'] = sum(  # conta quantos veículos satisfazem a condição abaixo:
-                # Para cada veículo v, verifica:
-                1 for v in instancia["veiculos"]
-                if any(x_val.get((i["id"], v["id"], c["id"]), 0) > 0.9  # ANY: se existe QUALQUER UM i alocada a ele (qualquer cliente c)
-                       for i in instancia["ums"]
-                       for c in instancia["clientes"])
-                # verifica se o veículo foi marcado como ativo
-                or alpha[v["id"]].x > 0.9
-            )
+        original = instancia
+        relatorio_presolve = None
+        if PRESOLVE and not presolve_aplicavel():
+            print("⚠️ Presolve ignorado: o construtor denso permite UMs em veículos de outras regiões")
+        elif PRESOLVE:
+            with medir_fase(fases, 'presolve'):
+                instancia, relatorio_presolve = presolve_instancia(original)
+            imprimir_presolve(relatorio_presolve)
+
+        if MODO_SOLUCAO == 'heuristica':
+            with medir_fase(fases, 'solver_heuristico'):
+                resultados = resolver_heuristica(tipo_instancia, instancia)
+        elif MODO_DECOMPOSICAO:
+            with medir_fase(fases, 'resolucao_por_regiao'):
+                resultados = resolver_por_regiao(
+                    tipo_instancia, instancia, threads)
+        else:
+            resultados = resolver_instancia(
+                tipo_instancia, instancia, threads, fases)
 
-            # número de veículos ativos subtraído do total de veículos disponíveis
-            resultados['veiculos_inativos'] = len(
-                instancia["veiculos"]) - resultados['veiculos_ativos']
-
-            # Cargas não alocadas
-            nao_alocadas = [  # Cria uma lista com os IDs das UMs que não foram alocadas a nenhum veículo
-                i["id"] for i in instancia["ums"]  # pra cada UM i verifica:
-                if all(x_val.get((i["id"], v["id"], c["id"]), 0) < 0.1  # se o valor de x_val (alocação) é menor que 0.1 (ou seja, =~ 0)
-                       # Para todos os veículos v
-                       for v in instancia["veiculos"]
-                       # e para todos os cliente c
-                       for c in instancia["clientes"])
-            ]
-
-            # Contabiliza UMs alocadas e não alocadas
-            resultados['ums_nao_alocadas'] = len(nao_alocadas)
-            resultados['ums_alocadas'] = len(
-                instancia["ums"]) - len(nao_alocadas)
-
-            # Soma o peso e o volume total das UMs não alocadas
-            resultados['peso_nao_alocado'] = sum(
-                i["peso"] for i in instancia["ums"] if i["id"] in nao_alocadas)
-            resultados['volume_nao_alocado'] = sum(
-                i["volume"] for i in instancia["ums"] if i["id"] in nao_alocadas)
-
-            # Custos detalhados
-
-            # Soma todos os valores de frete morto dos veículos. z_val: dicionário que mapeia veículo → valor do frete morto
-            resultados['frete_morto_total'] = sum(z_val.values())
-
-            # Calcula custo total do transporte - soma dos custos dos veículos ativos
-            resultados['custo_transporte'] = sum(
-                # custo do veículo (v["custo"]) * y_val (se o veículo foi usado para aquele cliente (retorna 1 se usado ou 0 cc))
-                v["custo"] * y_val.get((v["id"], c["id"]), 0)
-                # Para cada combinação veículo-cliente:
-                for v in instancia["veiculos"]
-                for c in instancia["clientes"]
-            )
-
-            # Calcula custo de não alocação
-            resultados['custo_nao_alocacao'] = sum(  # Soma todas as penalidades aplicadas às cargas não alocadas
-                i["peso"] * instancia["penalidade"] * (1 - sum(  # Aplica a penalidade: peso * penalidade * (1 - total_alocacoes)
-                    # Se alocada: 1 - 1 = 0 (sem custo), se não alocada: 1 - 0 = 1 (custo máximo)
-                    # x_ivc = 1 se a UM i foi alocada ao veículo v para o cliente c e 0 se não foi alocada
-                    x_val.get((i["id"], v["id"], c["id"]), 0)
-                    for v in instancia["veiculos"]
-                    for c in instancia["clientes"]))
-                for i in instancia["ums"]  # Para cada UM
-            )
-            # Agora calcula com penalidade individual da um
-            # resultados['custo_nao_alocacao'] = sum(  # Soma todas as penalidades aplicadas às cargas não alocadas
-            #     i["penalidade"] * (1 - sum( # Aplica a penalidade: penalidade * (1 - total_alocacoes)
-            #         # Se alocada: 1 - 1 = 0 (sem custo), se não alocada: 1 - 0 = 1 (custo máximo)
-            #         # x_ivc = 1 se a UM i foi alocada ao veículo v para o cliente c e 0 se não foi alocada
-            #         x_val.get((i["id"], v["id"], c["id"]), 0)
-            #         for v in instancia["veiculos"]
-            #         for c in instancia["clientes"]))
-            #     for i in instancia["ums"]# Para cada UM
-            # )
-
-            # Detalhes das alocações por veículo
-            # Para cada veículo, cria uma lista de IDs das UMs alocadas a ele
-            for v in instancia["veiculos"]:
-                cargas = [
-                    i["id"] for i in instancia["ums"]
-                    if any(x_val.get((i["id"], v["id"], c["id"]), 0) > 0.9  # ANY Verifica se a UM foi alocada ao veículo para qualquer cliente
-                           for c in instancia["clientes"])
-                ]
-
-                if cargas:  # Se o veículo tem cargas alocadas a ele, calcula o valor total de:
-                    peso_total = sum(i["peso"]
-                                     for i in instancia["ums"] if i["id"] in cargas)
-                    volume_total = sum(i["volume"]
-                                       for i in instancia["ums"] if i["id"] in cargas)
-                    frete_morto = z_val.get(v["id"], 0)
-
-                    # Estrutura de Dados das Alocações
-                    resultados['alocacoes'].append({
-                        'veiculo_id': v["id"],
-                        'veiculo_tipo': v["tipo"],
-                        'destino': v["destino"],
-                        'cargas': cargas,
-                        'peso_total': peso_total,
-                        'peso_minimo': v["carga_minima"],
-                        'capacidade_peso': v["capacidade_peso"],
-                        'volume_total': volume_total,
-                        'capacidade_volume': v["capacidade_volume"],
-                        'custo_veiculo': v["custo"],
-                        'frete_morto': frete_morto,
-                        'taxa_utilizacao_peso': (peso_total / v["capacidade_peso"]) * 100,
-                        'taxa_utilizacao_volume': (volume_total / v["capacidade_volume"]) * 100
-                    })
-
-        if resultados and modelo.SolCount > 0:
-            pasta_visualizacoes = os.path.join(
-                os.path.dirname(__file__), 'Otimizacao', 'Visualizacoes')
-            gerar_visualizacoes(resultados, instancia, pasta_visualizacoes)
+        if resultados and relatorio_presolve is not None:
+            resultados = restaurar_resultados_presolve(resultados, original, relatorio_presolve)
 
+        # Os gráficos são gerados fora daqui, pela fila de gráficos do lote (ver enfileirar_graficos)
         return resultados
 
     except Exception as e:
@@ -802,7 +2984,8 @@ def imprimir_resultados_detalhados(resultados):
         GRB.TIME_LIMIT: "Tempo limite atingido",
         GRB.INFEASIBLE: "Problema inviável",
         GRB.INF_OR_UNBD: "Infinito ou ilimitado",
-        GRB.UNBOUNDED: "Ilimitado"
+        GRB.UNBOUNDED: "Ilimitado",
+        GRB.SUBOPTIMAL: "Solução heurística"
     }
 
     print(
@@ -819,10 +3002,30 @@ def imprimir_resultados_detalhados(resultados):
         f"🔮 Solução relaxada: {resultados['solucao_relaxada'] if resultados['solucao_relaxada'] is not None else 'N/A'}")
     print(
         f"📊 GAP de otimização: {resultados['gap_otimizacao']:.2f}%" if resultados['gap_otimizacao'] is not None else "N/A")
+    if resultados.get('nos_explorados') is not None:
+        print(f"🌳 Nós explorados: {resultados['nos_explorados']}")
+    if resultados.get('custo_heuristica') is not None:
+        print(
+            f"🧭 Solução inicial (heurística): {resultados['custo_heuristica']:.2f} em {resultados['tempo_heuristica']:.3f} segundos")
+    if resultados.get('trajetoria'):
+        def segundos(valor):
+            return f"{valor:.2f}s" if valor is not None else "N/A"
+        integral = resultados.get('integral_primal')
+        if integral is not None:
+            print(f"📈 Trajetória: 1ª incumbente em {segundos(resultados.get('tempo_primeira_incumbente'))}, "
+                  f"gap ≤ 1% em {segundos(resultados.get('tempo_gap_1pct'))}, "
+                  f"integral primal {integral:.3f}")
+        else:
+            print(f"📈 Trajetória: nenhuma incumbente encontrada")
+    if resultados.get('fases'):
+        print(f"\n⏱️ FASES:")
+        for f in resultados['fases']:
+            memoria = f"{f['memoria_pico_mb']:.1f} MB" if f['memoria_pico_mb'] is not None else "N/A"
+            print(f"  {f['fase']:<36} parede {f['tempo_parede']:8.3f}s | CPU {f['tempo_cpu']:8.3f}s | memória pico {memoria}")
 
     # versao anterior
 
-    if resultados['status'] == GRB.OPTIMAL or resultados['status'] == GRB.TIME_LIMIT:
+    if resultados['status'] in (GRB.OPTIMAL, GRB.TIME_LIMIT, GRB.SUBOPTIMAL):
         # Função auxiliar para formatação segura
         def safe_format(value, fmt=".2f", prefix=""):
             return f"{prefix}{value:{fmt}}" if value is not None else "N/A"
@@ -886,15 +3089,15 @@ def imprimir_resultados_detalhados(resultados):
     print(f"\n{'='*80}")
 
 
-def exportar_resultados_csv(resultados_lista, instancias_originais):
+def exportar_resultados_csv(resultados_lista, instancias_originais, caminho_saida=None):
 
     # Exporta resultados para CSV
 
     #     resultados_lista: Lista de dicionários de resultados
     #     instancias_originais: Lista dos dados originais das instâncias
-    #     caminho_saida: Pasta de destino (padrão no Google Drive)
+    #     caminho_saida: Pasta de destino (padrão: Otimizacao/Resultados)
 
-    caminho_saida = os.path.join(os.path.dirname(
+    caminho_saida = caminho_saida or os.path.join(os.path.dirname(
         __file__), 'Otimizacao', 'Resultados')
 
     # Verificação de segurança
@@ -938,12 +3141,13 @@ def exportar_resultados_csv(resultados_lista, instancias_originais):
                 "Melhor Solução", "Solução Relaxada", "GAP (%)", "Custo Total",
                 "Custo Transporte", "Frete Morto", "Custo Não Alocação",
                 "Veículos Ativos", "Veículos Inativos", "UMs Alocadas", "UMs Não Alocadas",
-                "Peso Não Alocado", "Volume Não Alocado"
+                "Peso Não Alocado", "Volume Não Alocado", "Custo Heurística",
+                "Tempo 1ª Incumbente (s)", "Tempo GAP 1% (s)", "Integral Primal", "Nós Explorados"
             ])
 
             writer.writerow([
-                "Ótimo" if resultados.get(
-                    'status') == GRB.OPTIMAL else "Timeout",
+                {GRB.OPTIMAL: "Ótimo", GRB.SUBOPTIMAL: "Heurística"}.get(
+                    resultados.get('status'), "Timeout"),
                 f"{resultados.get('tempo_execucao', 0):.2f}",
                 f"{resultados.get('tempo_para_otimo', 0):.2f}" if resultados.get(
                     'tempo_para_otimo') is not None else "N/A",
@@ -963,10 +3167,33 @@ def exportar_resultados_csv(resultados_lista, instancias_originais):
                 resultados.get('ums_alocadas', 0),
                 resultados.get('ums_nao_alocadas', 0),
                 f"{resultados.get('peso_nao_alocado', 0):.2f}",
-                f"{resultados.get('volume_nao_alocado', 0):.2f}"
+                f"{resultados.get('volume_nao_alocado', 0):.2f}",
+                f"{resultados.get('custo_heuristica', 0):.2f}" if resultados.get(
+                    'custo_heuristica') is not None else "N/A",
+                f"{resultados.get('tempo_primeira_incumbente', 0):.2f}" if resultados.get(
+                    'tempo_primeira_incumbente') is not None else "N/A",
+                f"{resultados.get('tempo_gap_1pct', 0):.2f}" if resultados.get(
+                    'tempo_gap_1pct') is not None else "N/A",
+                f"{resultados.get('integral_primal', 0):.3f}" if resultados.get(
+                    'integral_primal') is not None else "N/A",
+                resultados.get('nos_explorados') if resultados.get(
+                    'nos_explorados') is not None else "N/A"
             ])
             writer.writerow([])
 
+            # Seção de fases (apenas com INSTRUMENTACAO)
+            if resultados.get('fases'):
+                writer.writerow(["FASES"])
+                writer.writerow(["Fase", "Tempo Parede (s)", "Tempo CPU (s)", "Memória Pico (MB)"])
+                for f in resultados['fases']:
+                    writer.writerow([
+                        f['fase'],
+                        f"{f['tempo_parede']:.3f}",
+                        f"{f['tempo_cpu']:.3f}",
+                        f"{f['memoria_pico_mb']:.1f}" if f['memoria_pico_mb'] is not None else "N/A"
+                    ])
+                writer.writerow([])
+
             # Seção de alocações
             writer.writerow(["VEÍCULOS ATIVOS"])
             writer.writerow([
@@ -1009,9 +3236,9 @@ def exportar_resultados_csv(resultados_lista, instancias_originais):
 
                     # Determina motivo
                     motivo = "Decisão ótima"
+                    compativeis = veiculos_compativeis_um(um)
                     if not any(
-                        v.get('tipo', '') in um.get(
-                            'compatibilidade', '').split(',')
+                        v.get('tipo', '') in compativeis
                         for v in instancia.get('veiculos', [])
                     ):
                         motivo = "Incompatibilidade"
@@ -1034,7 +3261,341 @@ def exportar_resultados_csv(resultados_lista, instancias_originais):
     print(f"\n✅ Relatório salvo em: {caminho_completo}")
 
 
-def executar_todas_instancias_geradas():
+# ====================== MEMOIZAÇÃO DE RESULTADOS ====================== #
+
+
+def parametros_resultado(hash_conteudo, threads):
+    # Tudo o que determina o resultado de uma instância: conteúdo do arquivo, parâmetros do solver,
+    # threads do Gurobi e versão do código
+    return {
+        'instancia': hash_conteudo,
+        'parametros': {nome: globals()[nome] for nome in PARAMETROS_RESULTADO},
+        'threads': threads,
+        'versao_modelo': VERSAO_MODELO,
+        'versao_resultados': VERSAO_RESULTADOS,
+    }
+
+
+def chave_resultado(hash_conteudo, threads):
+    conteudo = json.dumps(parametros_resultado(hash_conteudo, threads), sort_keys=True)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def ler_resultado_memo(chave):
+    # Resultados guardados para a chave, ou None se não houver (ou o arquivo estiver ilegível)
+    try:
+        with open(os.path.join(PASTA_MEMO_RESULTADOS, f"{chave}.json"), encoding='utf-8') as f:
+            return json.load(f)['resultados']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def gravar_resultado_memo(chave, parametros, resultados):
+    # Guarda também os parâmetros da chave, para saber de onde veio cada arquivo do memo
+    os.makedirs(PASTA_MEMO_RESULTADOS, exist_ok=True)
+    _gravar_json_atomico(os.path.join(PASTA_MEMO_RESULTADOS, f"{chave}.json"), {
+        'parametros': parametros,
+        'resultados': resultados
+    })
+
+# ====================== CHECKPOINT DO LOTE ====================== #
+
+
+def caminho_checkpoint(nome_instancia):
+    return os.path.join(PASTA_CHECKPOINT, f"{nome_instancia}.json")
+
+
+def gravar_checkpoint(nome_instancia, parametros, resultados):
+    # Registro atômico da instância concluída: uma interrupção do lote não perde o que já terminou
+    os.makedirs(PASTA_CHECKPOINT, exist_ok=True)
+    _gravar_json_atomico(caminho_checkpoint(nome_instancia), {
+        'instancia': nome_instancia,
+        'concluido_em': datetime.now().isoformat(timespec='seconds'),
+        'parametros': parametros,
+        'resultados': resultados
+    })
+
+
+def ler_checkpoint(nome_instancia):
+    try:
+        with open(caminho_checkpoint(nome_instancia), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def checkpoint_concluido(caminho_instancia, nome_instancia, threads):
+    # A instância já tem registro feito com os parâmetros atuais (mesmo arquivo, solver e código)?
+    registro = ler_checkpoint(nome_instancia)
+    return (registro is not None and
+            registro.get('parametros') == parametros_resultado(hash_instancia(caminho_instancia), threads))
+
+
+def consolidar_checkpoints(tarefas):
+    # Refaz o relatório (exportar_resultados_csv) a partir dos registros das instâncias em 'tarefas',
+    # na ordem dada; instâncias sem registro ficam de fora
+    resultados_totais = []
+    instancias_originais = []
+    for caminho_instancia, nome_instancia in tarefas:
+        registro = ler_checkpoint(nome_instancia)
+        if registro is None:
+            continue
+        resultados_totais.append(registro['resultados'])
+        instancias_originais.append(criar_instancia(caminho_instancia))
+
+    if resultados_totais:
+        fases = nova_medicao()
+        with medir_fase(fases, 'exportacao_csv'):
+            exportar_resultados_csv(resultados_totais, instancias_originais)
+        if fases:
+            print(f"⏱️ Exportação: {fases[0]['tempo_parede']:.3f}s")
+    return len(resultados_totais)
+
+
+# ====================== FILA DE GRÁFICOS ====================== #
+
+
+def _renderizar_instancia(caminho_instancia, resultados, configuracao=None):
+    # Executado no pool de gráficos: recarrega a instância (pelo cache binário, quando houver)
+    # e gera os gráficos a partir do registro de resultados
+    if configuracao:
+        globals().update(configuracao)
+    fases = nova_medicao()
+    gerar_visualizacoes(resultados, criar_instancia(caminho_instancia), PASTA_VISUALIZACOES, fases)
+    return fases
+
+
+def _renderizar_lote(tarefas, configuracao=None):
+    # Executado no pool de gráficos: figuras do lote a partir dos registros das instâncias em 'tarefas'.
+    # 'relatorio': o PDF completo do lote; 'png': só as trajetórias sobrepostas (as instâncias já
+    # foram enfileiradas uma a uma)
+    if configuracao:
+        globals().update(configuracao)
+    fases = nova_medicao()
+    resultados_totais = []
+    caminhos = []
+    for caminho_instancia, nome_instancia in tarefas:
+        registro = ler_checkpoint(nome_instancia)
+        if registro is not None:
+            resultados_totais.append(registro['resultados'])
+            caminhos.append(caminho_instancia)
+    if not resultados_totais:
+        return fases
+
+    with medir_fase(fases, 'relatorio_lote'):
+        if FORMATO_GRAFICOS == 'relatorio':
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            caminho_pdf = os.path.join(PASTA_VISUALIZACOES, f"relatorio_lote_{timestamp}.pdf")
+            gerar_relatorio_lote(resultados_totais, [criar_instancia(c) for c in caminhos], caminho_pdf)
+            print(f"📑 Relatório do lote salvo em: {caminho_pdf}")
+        else:
+            # Curvas do solver de todas as instâncias sobrepostas (apenas com CAPTURAR_TRAJETORIA)
+            plot_trajetorias_lote(resultados_totais, PASTA_VISUALIZACOES)
+    return fases
+
+
+def iniciar_fila_graficos():
+    # Pool em segundo plano que consome os resultados enfileirados; None com GERAR_GRAFICOS desligado.
+    # 'spawn': os processos de gráficos não herdam o estado do Gurobi nem as threads do processo principal
+    if not GERAR_GRAFICOS:
+        return None
+    return {
+        'executor': ProcessPoolExecutor(max_workers=WORKERS_GRAFICOS, mp_context=mp.get_context('spawn')),
+        'pendentes': [],
+    }
+
+
+def enfileirar_graficos(fila, caminho_instancia, resultados):
+    # Não bloqueia: o resultado é entregue ao pool e a próxima instância começa em seguida.
+    # No formato 'relatorio' as instâncias entram no PDF do lote (ver enfileirar_lote)
+    if (fila is None or FORMATO_GRAFICOS != 'png'
+            or not resultados or resultados.get('melhor_solucao') is None):
+        return
+    futuro = fila['executor'].submit(_renderizar_instancia, caminho_instancia, resultados,
+                                     configuracao_atual())
+    fila['pendentes'].append((resultados['tipo_instancia'], futuro))
+
+
+def enfileirar_lote(fila, tarefas):
+    # Figuras do lote inteiro, depois que todas as instâncias têm registro
+    if fila is None:
+        return
+    fila['pendentes'].append(('lote', fila['executor'].submit(
+        _renderizar_lote, tarefas, configuracao_atual())))
+
+
+def aguardar_graficos(fila):
+    # Espera o pool esvaziar (fim do lote); uma falha em um gráfico não afeta os resultados
+    if fila is None:
+        return
+    if fila['pendentes']:
+        print(f"\n🖼️ Aguardando {len(fila['pendentes'])} tarefas de gráficos...")
+    for nome_instancia, futuro in fila['pendentes']:
+        try:
+            fases = futuro.result()
+            if fases:
+                print(f"🖼️ Gráficos de {nome_instancia}: {sum(f['tempo_parede'] for f in fases):.2f}s")
+        except Exception as e:
+            print(f"⚠️ Falha ao gerar os gráficos de {nome_instancia}: {str(e)}")
+    fila['executor'].shutdown()
+
+
+def renderizar_checkpoints(tarefas):
+    # Modo somente gráficos: gera de novo os gráficos a partir dos registros guardados das instâncias
+    # em 'tarefas', sem resolver nada
+    fila = iniciar_fila_graficos()
+    encontrados = 0
+    for caminho_instancia, nome_instancia in tarefas:
+        registro = ler_checkpoint(nome_instancia)
+        if registro is None:
+            continue
+        encontrados += 1
+        enfileirar_graficos(fila, caminho_instancia, registro['resultados'])
+    if encontrados:
+        enfileirar_lote(fila, tarefas)
+    else:
+        print("⚠️ Nenhum resultado guardado para gerar gráficos!")
+    aguardar_graficos(fila)
+    return encontrados
+
+
+def configuracao_atual():
+    # Valores atuais das constantes de execução (alteradas pela linha de comando, por exemplo).
+    # Workers criados por 'spawn' reimportam o módulo e perderiam essas alterações.
+    return {nome: globals()[nome] for nome in CONFIGURACAO_EXECUCAO}
+
+
+def _executar_arquivo(caminho_completo, nome_instancia, threads=None, configuracao=None):
+    # Carrega e resolve uma instância (executado no processo principal ou em um worker do lote)
+    if configuracao:
+        globals().update(configuracao)
+
+    print(f"\n{'='*80}")
+    print(f"🚀 PROCESSANDO INSTÂNCIA: {nome_instancia}")
+    print(f"{'='*80}")
+
+    fases = nova_medicao()
+
+    # Carregar dados
+    with medir_fase(fases, 'carregar_dados'):
+        instancia = criar_instancia(caminho_completo)
+
+    # Reaproveita o resultado de uma execução anterior com a mesma instância e os mesmos parâmetros
+    parametros = parametros_resultado(instancia["hash"], threads)
+    chave = chave_resultado(instancia["hash"], threads) if USAR_MEMO_RESULTADOS else None
+    resultados = None
+    if chave and not FORCAR_RESOLUCAO:
+        resultados = ler_resultado_memo(chave)
+        if resultados is not None and CAPTURAR_TRAJETORIA and 'trajetoria' not in resultados:
+            # Resultado guardado sem a trajetória pedida: resolve de novo para capturá-la
+            resultados = None
+        if resultados is not None:
+            # Mesmo conteúdo pode estar em outro arquivo: o nome é sempre o da execução atual
+            resultados['tipo_instancia'] = nome_instancia
+            # As fases medidas são as desta execução (só a carga); sem instrumentação, nenhuma
+            resultados.pop('fases', None)
+            if fases is not None:
+                resultados['fases'] = fases
+            print(f"♻️ Resultado reaproveitado de execução anterior (memo {chave[:12]})")
+
+    # Executar
+    if resultados is None:
+        resultados = executar_instancia_com_timeout(
+            nome_instancia, instancia, threads, fases)
+        if resultados and fases is not None:
+            resultados['fases'] = fases
+        if resultados and chave:
+            try:
+                gravar_resultado_memo(chave, parametros, resultados)
+            except (OSError, TypeError) as e:
+                print(f"⚠️ Não foi possível guardar o resultado de {nome_instancia}: {e}")
+
+    if resultados:
+        gravar_checkpoint(nome_instancia, parametros, resultados)
+
+    if resultados:
+        imprimir_resultados_detalhados(resultados)
+    else:
+        print(f"❌ Falha ao executar instância {nome_instancia}")
+
+    return instancia, resultados
+
+
+def _worker_lote(conexao, caminho_completo, nome_instancia, threads, configuracao):
+    # Processo de uma instância do lote paralelo: devolve (instancia, resultados) ou o erro pela conexão
+    try:
+        conexao.send(('ok', _executar_arquivo(caminho_completo, nome_instancia, threads, configuracao)))
+    except Exception as e:
+        conexao.send(('erro', str(e)))
+    finally:
+        conexao.close()
+
+
+def _executar_lote_paralelo(tarefas, num_workers, threads, fila_graficos=None):
+    # Executa as instâncias em até num_workers processos e devolve os pares (instancia, resultados)
+    # na mesma ordem de 'tarefas'. Um worker que falha, trava ou estoura o prazo não derruba o lote.
+    # Cada resultado recebido vai para a fila de gráficos (se houver).
+    # Cada instância roda em um processo novo (libera a memória do modelo) e o prazo conta a partir do
+    # início desse processo: um worker que estoura o prazo é encerrado e a vaga passa para a próxima
+    # instância, que recebe o prazo inteiro
+    limite_por_instancia = LIMITE_WORKER_FATOR * TIMEOUT + LIMITE_WORKER_FOLGA
+    configuracao = configuracao_atual()
+    saidas = [(None, None)] * len(tarefas)
+    fila = list(range(len(tarefas)))
+    ativos = {}  # conexão de leitura -> (índice da tarefa, processo, prazo)
+    try:
+        while fila or ativos:
+            while fila and len(ativos) < num_workers:
+                k = fila.pop(0)
+                caminho, nome = tarefas[k]
+                leitura, escrita = mp.Pipe(duplex=False)
+                # daemon: como nos workers de um Pool, a decomposição por região roda em sequência
+                processo = mp.Process(target=_worker_lote, daemon=True,
+                                      args=(escrita, caminho, nome, threads, configuracao))
+                processo.start()
+                escrita.close()
+                ativos[leitura] = (k, processo, time.perf_counter() + limite_por_instancia)
+
+            proximo_prazo = min(prazo for _, _, prazo in ativos.values())
+            prontas = mp.connection.wait(list(ativos),
+                                         timeout=max(0.0, proximo_prazo - time.perf_counter()))
+            for leitura in prontas:
+                k, processo, _ = ativos.pop(leitura)
+                caminho, nome = tarefas[k]
+                try:
+                    estado, valor = leitura.recv()
+                except EOFError:
+                    estado, valor = 'erro', "o worker terminou sem devolver resultado"
+                leitura.close()
+                processo.join()
+                if estado == 'ok':
+                    saidas[k] = valor
+                    enfileirar_graficos(fila_graficos, caminho, valor[1])
+                else:
+                    print(f"❌ Erro crítico ao processar {nome}: {valor}")
+
+            agora = time.perf_counter()
+            for leitura, (k, processo, prazo) in list(ativos.items()):
+                if agora >= prazo:
+                    print(
+                        f"❌ Instância {tarefas[k][1]} excedeu o prazo do worker ({limite_por_instancia:.0f}s)")
+                    processo.terminate()
+                    processo.join()
+                    leitura.close()
+                    del ativos[leitura]
+    finally:
+        # Encerra também workers ainda em execução (ex.: interrupção do lote)
+        for leitura, (_, processo, _) in ativos.items():
+            processo.terminate()
+            processo.join()
+            leitura.close()
+    return saidas
+
+
+def executar_todas_instancias_geradas(num_workers=1, threads_por_worker=None, retomar=False):
+    # Cada instância concluída grava um registro em PASTA_CHECKPOINT e o relatório final é montado a
+    # partir desses registros. Com retomar=True, instâncias que já têm registro feito com os parâmetros
+    # atuais não são executadas de novo (continua um lote interrompido).
     # Configurações
     PASTA_INSTANCIAS = os.path.join(os.path.dirname(
         os.path.abspath(__file__)), 'Otimizacao')
@@ -1042,9 +3603,8 @@ def executar_todas_instancias_geradas():
         os.path.abspath(__file__)), 'Otimizacao', 'Resultados')
     os.makedirs(PASTA_RESULTADOS, exist_ok=True)
 
-    # Encontrar todos os arquivos CSV de instâncias
-    arquivos_instancias = [f for f in os.listdir(PASTA_INSTANCIAS)
-                           if f.endswith('.csv') and not f.startswith('00_')]
+    # Encontrar todos os arquivos CSV de instâncias (ordem fixa para o relatório)
+    arquivos_instancias = listar_instancias(PASTA_INSTANCIAS)
 
     if not arquivos_instancias:
         print("❌ Nenhuma instância encontrada na pasta!")
@@ -1052,52 +3612,285 @@ def executar_todas_instancias_geradas():
 
     print(f"🔍 Encontradas {len(arquivos_instancias)} instâncias para executar")
 
-    resultados_totais = []
-    instancias_originais = []
-
-    for arquivo in arquivos_instancias:
-        try:
-            nome_instancia = arquivo.replace('.csv', '')
-            print(f"\n{'='*80}")
-            print(f"🚀 PROCESSANDO INSTÂNCIA: {nome_instancia}")
-            print(f"{'='*80}")
-
-            # Carregar dados
-            caminho_completo = os.path.join(PASTA_INSTANCIAS, arquivo)
-            dados = carregar_dados(caminho_completo)
-            instancia = {
-                "veiculos": dados['veiculos'],
-                "ums": dados['ums'],
-                "clientes": dados['clientes'],
-                "penalidade": dados['parametros']['Penalidade por não alocação']
-            }
-            instancias_originais.append(instancia)
-
-            # Executar
-            resultados = executar_instancia_com_timeout(
-                nome_instancia, instancia)
+    tarefas = [(os.path.join(PASTA_INSTANCIAS, arquivo), nome_da_instancia(arquivo))
+               for arquivo in arquivos_instancias]
 
-            if resultados:
-                resultados_totais.append(resultados)
-                imprimir_resultados_detalhados(resultados)
-            else:
-                print(f"❌ Falha ao executar instância {nome_instancia}")
+    if num_workers > 1:
+        # Divide as threads da máquina entre os workers para não sobrecarregar a CPU
+        threads = threads_por_worker or max(
+            1, (os.cpu_count() or 1) // num_workers)
+    else:
+        threads = threads_por_worker
 
-        except Exception as e:
-            print(f"❌ Erro crítico ao processar {arquivo}: {str(e)}")
+    # Registros que não valem para este lote são apagados, para não entrarem no relatório
+    pendentes = []
+    for caminho_completo, nome_instancia in tarefas:
+        if retomar and checkpoint_concluido(caminho_completo, nome_instancia, threads):
             continue
+        if os.path.exists(caminho_checkpoint(nome_instancia)):
+            os.remove(caminho_checkpoint(nome_instancia))
+        pendentes.append((caminho_completo, nome_instancia))
+    if retomar:
+        print(f"⏩ Retomando lote: {len(tarefas) - len(pendentes)} instâncias já concluídas, "
+              f"{len(pendentes)} a executar")
 
-    # Exportar resultados consolidados
-    if resultados_totais:
+    # Gráficos em segundo plano: a resolução nunca espera a renderização
+    fila_graficos = iniciar_fila_graficos()
+
+    if num_workers > 1:
+        print(
+            f"⚙️ Executando com {num_workers} workers e {threads} threads do Gurobi por worker")
+        _executar_lote_paralelo(pendentes, num_workers, threads, fila_graficos)
+    else:
+        for caminho_completo, nome_instancia in pendentes:
+            try:
+                _, resultados = _executar_arquivo(caminho_completo, nome_instancia, threads)
+                enfileirar_graficos(fila_graficos, caminho_completo, resultados)
+            except Exception as e:
+                print(f"❌ Erro crítico ao processar {nome_instancia}: {str(e)}")
+
+    # Exportar resultados consolidados (a partir dos registros, na ordem dos arquivos)
+    if consolidar_checkpoints(tarefas):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         nome_arquivo = f"resultados_consolidados_{timestamp}.csv"
-        exportar_resultados_csv(resultados_totais, instancias_originais)
         print(
             f"\n✅ Todas instâncias processadas! Resultados em: {nome_arquivo}")
     else:
         print("\n⚠️ Nenhuma instância foi executada com sucesso!")
 
+    enfileirar_lote(fila_graficos, tarefas)
+    aguardar_graficos(fila_graficos)
 
-if __name__ == "__main__":
 
-    executar_todas_instancias_geradas()
+def comparar_formulacoes(formulacoes=('ivc', 'iv'), pasta_instancias=None):
+    # Benchmark lado a lado das formulações sobre as instâncias da pasta (padrão: Otimizacao/)
+    # Registra tamanho do modelo, tempo de construção, bound da relaxação linear, tempo de solução,
+    # melhor solução e gap no TIMEOUT. Quando todas as formulações chegam ao ótimo os objetivos
+    # devem coincidir (as formulações são equivalentes); divergências são sinalizadas.
+    pasta_instancias = pasta_instancias or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'Otimizacao')
+    pasta_resultados = os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), 'Otimizacao', 'Resultados')
+    os.makedirs(pasta_resultados, exist_ok=True)
+
+    arquivos = listar_instancias(pasta_instancias)
+
+    linhas = []
+    for arquivo in arquivos:
+        nome_instancia = nome_da_instancia(arquivo)
+        instancia = criar_instancia(os.path.join(pasta_instancias, arquivo))
+
+        for formulacao in formulacoes:
+            inicio = time.perf_counter()
+            modelo, *_ = construir_modelo(instancia, formulacao)
+            modelo.update()
+            tempo_construcao = time.perf_counter() - inicio
+
+            # Bound da relaxação linear (raiz, sem cortes do Gurobi)
+            relaxado = modelo.relax()
+            relaxado.Params.OutputFlag = 0
+            relaxado.optimize()
+            bound_lp = relaxado.ObjVal if relaxado.status == GRB.OPTIMAL else None
+
+            modelo.Params.TimeLimit = TIMEOUT
+            modelo.Params.OutputFlag = 0
+            modelo.optimize()
+
+            linhas.append({
+                'instancia': nome_instancia,
+                'formulacao': formulacao,
+                'variaveis': modelo.NumVars,
+                'restricoes': modelo.NumConstrs,
+                'nao_zeros': modelo.NumNZs,
+                'tempo_construcao': tempo_construcao,
+                'bound_lp': bound_lp,
+                'status': modelo.status,
+                'tempo_execucao': modelo.Runtime,
+                'melhor_solucao': modelo.ObjVal if modelo.SolCount > 0 else None,
+                'solucao_relaxada': modelo.ObjBound if modelo.SolCount > 0 else None,
+                'gap_otimizacao': modelo.MIPGap * 100 if modelo.SolCount > 0 else None,
+            })
+            print(f"📐 {nome_instancia} [{formulacao}]: {modelo.NumVars} variáveis, "
+                  f"{modelo.NumConstrs} restrições, {modelo.Runtime:.2f}s")
+
+        # Verificação de equivalência
+        otimos = [l['melhor_solucao'] for l in linhas
+                  if l['instancia'] == nome_instancia and l['status'] == GRB.OPTIMAL]
+        if len(otimos) == len(formulacoes) and max(otimos) - min(otimos) > 1e-4 * max(1, abs(max(otimos))):
+            print(f"⚠️ Formulações divergem em {nome_instancia}: {otimos}")
+
+    if not linhas:
+        print("❌ Nenhuma instância encontrada na pasta!")
+        return None
+
+    df = pd.DataFrame(linhas)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    caminho = os.path.join(pasta_resultados,
+                           f"comparacao_formulacoes_{timestamp}.csv")
+    df.to_csv(caminho, sep=';', index=False)
+
+    print(df.pivot(index='instancia', columns='formulacao',
+                   values=['variaveis', 'restricoes', 'bound_lp', 'tempo_execucao', 'gap_otimizacao']).to_string())
+    print(f"\n✅ Comparação salva em: {caminho}")
+    return df
+
+
+def comparar_simetria(modos=(False, 'ativacao', 'carga'), pasta_instancias=None, threads=None):
+    # Resolve cada instância da pasta (padrão: Otimizacao/) com cada modo de QUEBRA_SIMETRIA, pelo mesmo
+    # caminho do lote (presolve + MIP start), e registra nós explorados, tempo para o ótimo e gap.
+    # Todos os modos devem chegar ao mesmo ótimo; divergências são sinalizadas.
+    global QUEBRA_SIMETRIA
+    pasta_instancias = pasta_instancias or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'Otimizacao')
+    pasta_resultados = os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), 'Otimizacao', 'Resultados')
+    os.makedirs(pasta_resultados, exist_ok=True)
+
+    modo_original = QUEBRA_SIMETRIA
+    linhas = []
+    try:
+        for arquivo in listar_instancias(pasta_instancias):
+            nome_instancia = nome_da_instancia(arquivo)
+            instancia = criar_instancia(os.path.join(pasta_instancias, arquivo))
+            reduzida = presolve_instancia(instancia)[0] if presolve_aplicavel() else instancia
+            classes = classes_veiculos_identicos(reduzida)
+
+            for modo in modos:
+                QUEBRA_SIMETRIA = modo
+                resultados = resolver_instancia(nome_instancia, reduzida, threads)
+                linhas.append({
+                    'instancia': nome_instancia,
+                    'simetria': modo or 'nenhuma',
+                    'veiculos': len(reduzida["veiculos"]),
+                    'classes_identicas': len(classes),
+                    'veiculos_em_classes': sum(len(membros) for membros in classes),
+                    'status': resultados['status'],
+                    'nos_explorados': resultados['nos_explorados'],
+                    'tempo_execucao': resultados['tempo_execucao'],
+                    'tempo_para_otimo': resultados['tempo_para_otimo'],
+                    'melhor_solucao': resultados['melhor_solucao'],
+                    'gap_otimizacao': resultados['gap_otimizacao'],
+                })
+                print(f"🔀 {nome_instancia} [{modo or 'nenhuma'}]: {resultados['nos_explorados']} nós, "
+                      f"{resultados['tempo_execucao']:.2f}s")
+
+            otimos = [l['melhor_solucao'] for l in linhas
+                      if l['instancia'] == nome_instancia and l['status'] == GRB.OPTIMAL]
+            if len(otimos) == len(modos) and max(otimos) - min(otimos) > 1e-4 * max(1, abs(max(otimos))):
+                print(f"⚠️ Modos de simetria divergem em {nome_instancia}: {otimos}")
+    finally:
+        QUEBRA_SIMETRIA = modo_original
+
+    if not linhas:
+        print("❌ Nenhuma instância encontrada na pasta!")
+        return None
+
+    df = pd.DataFrame(linhas)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    caminho = os.path.join(pasta_resultados,
+                           f"comparacao_simetria_{timestamp}.csv")
+    df.to_csv(caminho, sep=';', index=False)
+
+    print(df.pivot(index='instancia', columns='simetria',
+                   values=['nos_explorados', 'tempo_execucao', 'gap_otimizacao']).to_string())
+    print(f"\n✅ Comparação salva em: {caminho}")
+    return df
+
+
+def converter_instancias_cache(pasta_instancias=None):
+    # Grava o cache binário de todas as instâncias da pasta (padrão: Otimizacao/) que ainda não o têm
+    # ou cujo CSV mudou, para que o lote e os workers já encontrem as instâncias convertidas
+    pasta_instancias = pasta_instancias or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'Otimizacao')
+
+    for arquivo in listar_instancias(pasta_instancias):
+        caminho = os.path.join(pasta_instancias, arquivo)
+        if cache_valido(caminho) is not None:
+            print(f"✔️ {arquivo}: cache atualizado")
+            continue
+        inicio = time.time()
+        salvar_cache(caminho, ler_instancia_csv(caminho))
+        print(f"💾 {arquivo}: cache gravado em {time.time() - inicio:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Executa o modelo de alocação de cargas sobre as instâncias de Otimizacao/")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="número de instâncias resolvidas em paralelo (padrão: 1)")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="threads do Gurobi por worker (padrão: núcleos / workers)")
+    parser.add_argument('--heuristica', action='store_true',
+                        help="resolve com o solver heurístico (sem Gurobi) usando TIMEOUT como orçamento")
+    parser.add_argument('--decomposicao', action='store_true',
+                        help="resolve cada região como um subproblema independente")
+    parser.add_argument('--comparar-formulacoes', action='store_true',
+                        help="executa o benchmark das formulações 'ivc' e 'iv' em vez do lote")
+    parser.add_argument('--simetria', choices=['ativacao', 'carga'],
+                        help="quebra a simetria entre veículos idênticos (ordem de ativação ou também de carga)")
+    parser.add_argument('--comparar-simetria', action='store_true',
+                        help="compara nós e tempo sem e com cada modo de quebra de simetria em vez do lote")
+    parser.add_argument('--gerar-cache', action='store_true',
+                        help="apenas converte as instâncias para o cache binário")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="lê sempre o CSV, sem usar nem gravar o cache binário")
+    parser.add_argument('--retomar', '--resume', action='store_true',
+                        help="continua um lote interrompido, pulando instâncias já concluídas")
+    parser.add_argument('--consolidar', action='store_true',
+                        help="apenas refaz o relatório a partir dos registros das instâncias concluídas")
+    parser.add_argument('--instrumentar', nargs='?', const='rss', choices=['rss', 'tracemalloc'],
+                        help="mede tempo e memória de cada fase (padrão: pico de RSS)")
+    parser.add_argument('--trajetoria', action='store_true',
+                        help="registra incumbente/bound/gap ao longo do tempo e plota as curvas do lote")
+    parser.add_argument('--sem-graficos', '--no-plots', action='store_true',
+                        help="não gera os gráficos das instâncias")
+    parser.add_argument('--formato-graficos', choices=['relatorio', 'png'], default=FORMATO_GRAFICOS,
+                        help="'relatorio': um PDF por lote; 'png': arquivos separados por instância")
+    parser.add_argument('--somente-graficos', '--plots-only', action='store_true',
+                        help="gera de novo os gráficos a partir dos resultados guardados, sem resolver")
+    parser.add_argument('--presolve', action='store_true',
+                        help="reduz a instância antes de construir o modelo (não se aplica ao construtor denso)")
+    parser.add_argument('--forcar', action='store_true',
+                        help="resolve todas as instâncias de novo, ignorando resultados guardados")
+    parser.add_argument('--cache-modelos', action='store_true',
+                        help="reaproveita modelos já construídos de Otimizacao/cache_modelos")
+    args = parser.parse_args()
+
+    if args.heuristica:
+        MODO_SOLUCAO = 'heuristica'
+    if args.decomposicao:
+        MODO_DECOMPOSICAO = True
+    if args.sem_cache:
+        USAR_CACHE_BINARIO = False
+    if args.cache_modelos:
+        USAR_CACHE_MODELO = True
+    if args.forcar:
+        FORCAR_RESOLUCAO = True
+    if args.presolve:
+        PRESOLVE = True
+    if args.simetria:
+        QUEBRA_SIMETRIA = args.simetria
+    if args.instrumentar:
+        INSTRUMENTACAO = args.instrumentar
+    if args.trajetoria:
+        CAPTURAR_TRAJETORIA = True
+    if args.sem_graficos:
+        GERAR_GRAFICOS = False
+    FORMATO_GRAFICOS = args.formato_graficos
+
+    if args.gerar_cache:
+        converter_instancias_cache()
+    elif args.consolidar or args.somente_graficos:
+        pasta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Otimizacao')
+        tarefas = [(os.path.join(pasta, arquivo), nome_da_instancia(arquivo))
+                   for arquivo in listar_instancias(pasta)]
+        if args.somente_graficos:
+            renderizar_checkpoints(tarefas)
+        else:
+            consolidar_checkpoints(tarefas)
+    elif args.comparar_formulacoes:
+        comparar_formulacoes()
+    elif args.comparar_simetria:
+        comparar_simetria(threads=args.threads)
+    else:
+        executar_todas_instancias_geradas(args.workers, args.threads, args.retomar)
@@ -17,33 +17,32 @@ GERADOR DE INSTÂNCIAS:
 - 1 instância mini com 2 veículos, 2 clientes e 5 UMs
 """
 
+import numpy as np
 import pandas as pd
-import random
 import os
-import warnings
-warnings.simplefilter(action='ignore', category=FutureWarning) # oculta alerta do Pandas sobre uma mudança futura no comportamento da função pd.concat()
+import gzip
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # ====================== ⚙️ CONFIGURAÇÕES ======================
 TAMANHO_GRID = 100
 NUM_REGIOES = 4
 PASTA_SAIDA = os.path.join(os.path.dirname(__file__), 'Instancias_Penalidade')
+# Linhas geradas e gravadas por vez (clientes e UMs): limita a memória em instâncias muito grandes
+TAMANHO_BLOCO = 100_000
+
+# Semente base do catálogo: cada instância deriva a sua a partir desta, da configuração e da variação
+SEMENTE_BASE = 2024
 
 # Configurações de tamanho das instâncias
+# 'num_instancias' = variações por configuração (cada variação gera versão centro e canto)
 CONFIGURACOES = [
-    {'num_veiculos': 30, 'max_ums': 500, 'num_clientes': 30, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},  # 10 instâncias
-    {'num_veiculos': 30, 'max_ums': 400, 'num_clientes': 30, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},  # 10 instâncias
-    {'num_veiculos': 20, 'max_ums': 300, 'num_clientes': 20, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20},  # 10 instâncias
-    {'num_veiculos': 2, 'max_ums': 5, 'num_clientes': 2, 'min_cargas_cliente': 2, 'max_cargas_cliente': 3}        # 1 instância mini
+    {'num_veiculos': 30, 'max_ums': 500, 'num_clientes': 30, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20, 'num_instancias': 5},  # 10 instâncias
+    {'num_veiculos': 30, 'max_ums': 400, 'num_clientes': 30, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20, 'num_instancias': 5},  # 10 instâncias
+    {'num_veiculos': 20, 'max_ums': 300, 'num_clientes': 20, 'min_cargas_cliente': 6, 'max_cargas_cliente': 20, 'num_instancias': 5},  # 10 instâncias
+    {'num_veiculos': 2, 'max_ums': 5, 'num_clientes': 2, 'min_cargas_cliente': 2, 'max_cargas_cliente': 3, 'num_instancias': 1}        # 1 instância mini
 ]
 
-# Quantidade de instâncias por configuração
-NUM_INSTANCIAS = {
-    30: 5,  # 10 instâncias para 30 veículos/500 UMs
-    30: 5,  # 10 instâncias para 30 veículos/400 UMs
-    20: 5,  # 5 instâncias para 20 veículos/300 UMs
-    2: 1     # 1 instância mini
-}
-
 # Dados dos veículos
 VEICULOS_BASE = [
     {'tipo': 'Bi-trem Carga Seca', 'capacidade_peso': 36000, 'capacidade_vol': 70, 'custo': 1500},
@@ -84,7 +83,7 @@ def calcular_penalidade_global(veiculos):
     penalidade_ideal = (sum(custos_por_kg) / len(custos_por_kg)) * 1.2
     return max(0.3, min(1.5, penalidade_ideal))
 
-def gerar_frota(num_veiculos):
+def gerar_frota(num_veiculos, rng):
     frota = []
 
     # Sempre inclui veículo sem recursos por formalidade
@@ -100,113 +99,129 @@ def gerar_frota(num_veiculos):
 
     # Adiciona veículos aleatórios, garante pelo menos um veículo por região
     regioes = [f"R{i}" for i in range(1, NUM_REGIOES+1)]
-    
-    # garante um veículo por região
-    for i, regiao in enumerate(regioes[:min(num_veiculos, NUM_REGIOES)]):
-        veiculo = random.choice([v for v in VEICULOS_BASE if v['tipo'] != 'Sem recursos'])
-        frota.append({
-            'tipo': veiculo['tipo'],
-            'capacidade_peso': veiculo['capacidade_peso'],
-            'capacidade_vol': veiculo['capacidade_vol'],
-            'custo': veiculo['custo'],
-            'destino': regiao,
-            'id': i+1,
-            'descricao': veiculo['tipo'],
-            'carga_minima': max(1, veiculo['capacidade_peso'] // 2)
-        })
+    base = [v for v in VEICULOS_BASE if v['tipo'] != 'Sem recursos']
+
+    # garante um veículo por região e preenche o restante com regiões aleatórias
+    num_garantidos = min(num_veiculos, NUM_REGIOES)
+    ids = list(range(1, num_garantidos + 1)) + list(range(len(regioes) + 1, num_veiculos + 1))
+    destinos = regioes[:num_garantidos] + [
+        f"R{r}" for r in rng.integers(1, NUM_REGIOES + 1, size=len(ids) - num_garantidos)]
+    sorteados = rng.integers(0, len(base), size=len(ids))
 
-    # preenche o restante aleatoriamente
-    for i in range(len(regioes)+1, num_veiculos + 1):
-        veiculo = random.choice([v for v in VEICULOS_BASE if v['tipo'] != 'Sem recursos'])
+    for id_veiculo, destino, k in zip(ids, destinos, sorteados.tolist()):
+        veiculo = base[k]
         frota.append({
             'tipo': veiculo['tipo'],
             'capacidade_peso': veiculo['capacidade_peso'],
             'capacidade_vol': veiculo['capacidade_vol'],
             'custo': veiculo['custo'],
-            'destino': f"R{random.randint(1, NUM_REGIOES)}",
-            'id': i,
+            'destino': destino,
+            'id': id_veiculo,
             'descricao': veiculo['tipo'],
             'carga_minima': max(1, veiculo['capacidade_peso'] // 2)
         })
 
     return frota
 
-def distribuir_cargas_por_cliente(num_clientes, min_cargas, max_cargas, total_ums):
-    cargas_por_cliente = []
-    ums_distribuidas = 0
-
+def distribuir_cargas_por_cliente(num_clientes, min_cargas, max_cargas, total_ums, rng):
     # Distribuição inicial garantindo o mínimo
-    for _ in range(num_clientes):
-        cargas = random.randint(min_cargas, max_cargas)
-        cargas_por_cliente.append(cargas)
-        ums_distribuidas += cargas
-
-    # Ajuste para não ultrapassar o total
-    while ums_distribuidas > total_ums:  # Caso exceda
-        for i in range(num_clientes):
-            if cargas_por_cliente[i] > min_cargas:
-                cargas_por_cliente[i] -= 1
-                ums_distribuidas -= 1
-                if ums_distribuidas == total_ums:
-                    break
-
-    # Distribuição das UMs restantes (se houver)
-    while ums_distribuidas < total_ums:
-        cliente = random.randint(0, num_clientes - 1)
-        if cargas_por_cliente[cliente] < max_cargas:
-            cargas_por_cliente[cliente] += 1
-            ums_distribuidas += 1
+    cargas_por_cliente = rng.integers(min_cargas, max_cargas + 1, size=num_clientes)
+    excesso = int(cargas_por_cliente.sum()) - total_ums
+
+    # Ajuste para não ultrapassar o total: cada rodada retira uma UM de cada cliente acima do mínimo,
+    # na ordem dos clientes, até eliminar o excesso
+    while excesso > 0:
+        elegiveis = np.flatnonzero(cargas_por_cliente > min_cargas)
+        if not elegiveis.size:
+            break
+        elegiveis = elegiveis[:excesso]
+        cargas_por_cliente[elegiveis] -= 1
+        excesso -= len(elegiveis)
+
+    # Distribuição das UMs restantes (se houver) entre clientes sorteados abaixo do máximo
+    falta = -excesso
+    while falta > 0:
+        elegiveis = np.flatnonzero(cargas_por_cliente < max_cargas)
+        if not elegiveis.size:
+            break
+        sorteados = np.bincount(rng.choice(len(elegiveis), size=falta),
+                                minlength=len(elegiveis))
+        acrescimo = np.minimum(sorteados, max_cargas - cargas_por_cliente[elegiveis])
+        cargas_por_cliente[elegiveis] += acrescimo
+        falta -= int(acrescimo.sum())
 
     return cargas_por_cliente
 
-def determinar_penalidade_e_criterio(peso, volume, restricao, cliente_id):
+def determinar_penalidade_e_criterio(peso, volume, restricao, cliente_id, rng):
+    # Vetorizado sobre o bloco inteiro de UMs (arrays de mesmo tamanho); as regras são avaliadas em ordem
+    # Os três sorteios de cada UM saem de uma mesma linha de rng.random((n, 3)), então o resultado
+    # não depende do tamanho do bloco
+    sorteio = rng.random((len(peso), 3))
+    estrategica = sorteio[:, 0] < 0.05                                 # 5% de chance de ser uma UM estratégica
+    importante = (sorteio[:, 1] < 0.15) | (cliente_id % 5 == 0)        # 15% de chance ou cada 5º cliente
+    grande = (peso > 1000) | (volume > 8)                              # UMs grandes (peso > 1000kg ou volume > 8m³)
+    restrita = np.isin(restricao, ['Não empilhar', 'Frágil', 'Pesado'])  # UMs com restrições especiais
+    normal = peso >= 500                                               # UMs com peso entre 500-1000kg
+
+    # Categorias: 0 estratégica, 1 cliente importante, 2 grande, 3 restrição, 4 normal, 5 comum
+    categoria = np.select([estrategica, importante, grande, restrita, normal],
+                          [0, 1, 2, 3, 4], default=5)
+    minimo = np.array([5.0, 2.0, 2.0, 1.5, 0.8, 0.3])[categoria]
+    maximo = np.array([10.0, 5.0, 5.0, 3.0, 1.5, 0.5])[categoria]
+    penalidade = np.round(minimo + (maximo - minimo) * sorteio[:, 2], 2)
+
+    criterios = np.array([
+        "Estratégica - impacto operacional grave, peça única ou projeto com multa por atraso",
+        "Cliente importante - risco de multas ou perda de contrato",
+        "Carga grande - ocupa muito espaço e pode exigir veículo extra",
+        "",
+        "Prioridade normal - carga média ou cliente regular",
+        "Carga comum - baixa prioridade"
+    ], dtype=object)
+    criterio = criterios[categoria]
+    criterio[categoria == 3] = ("Carga com restrição (" + restricao[categoria == 3].astype(object) +
+                                ") - limita opções de transporte")
 
-    # 5% de chance de ser uma UM estratégica (independente de outros fatores)
-    if random.random() < 0.05:
-        penalidade = round(random.uniform(5.0, 10.0), 2)
-        criterio = "Estratégica - impacto operacional grave, peça única ou projeto com multa por atraso"
-    
-    # 15% de chance de ser um cliente importante (independente de peso/volume)
-    elif random.random() < 0.15 or cliente_id % 5 == 0:  # também marca cada 5º cliente como importante
-        penalidade = round(random.uniform(2.0, 5.0), 2)
-        criterio = "Cliente importante - risco de multas ou perda de contrato"
-    
-    # UMs grandes (peso > 1000kg ou volume > 8m³)
-    elif peso > 1000 or volume > 8:
-        penalidade = round(random.uniform(2.0, 5.0), 2)
-        criterio = "Carga grande - ocupa muito espaço e pode exigir veículo extra"
-    
-    # UMs com restrições especiais
-    elif restricao in ['Não empilhar', 'Frágil', 'Pesado']:
-        penalidade = round(random.uniform(1.5, 3.0), 2)
-        criterio = f"Carga com restrição ({restricao}) - limita opções de transporte"
-    
-    # UMs com peso entre 500-1000kg ou volume médio
-    elif peso >= 500:
-        penalidade = round(random.uniform(0.8, 1.5), 2)
-        criterio = "Prioridade normal - carga média ou cliente regular"
-    
-    # Todas as outras UMs (comuns)
-    else:
-        penalidade = round(random.uniform(0.3, 0.5), 2)
-        criterio = "Carga comum - baixa prioridade"
-    
     return penalidade, criterio
 
 # ====================== 🏭 GERADOR DE INSTÂNCIAS ======================
 # ter veículos para todas as regiões!!!!
 
-def gerar_instancia(config, pos_raiz, variacao):
+COLUNAS = [
+    'tipo', 'id', 'descricao', 'valor', 'peso', 'volume', 'destino',
+    'x', 'y', 'cliente', 'compatibilidade', 'restricao', 'capacidade_peso',
+    'capacidade_vol', 'custo', 'carga_minima', 'penalidade', 'Criterio Penalidade'
+]
 
-    colunas = [
-        'tipo', 'id', 'descricao', 'valor', 'peso', 'volume', 'destino',
-        'x', 'y', 'cliente', 'compatibilidade', 'restricao', 'capacidade_peso',
-        'capacidade_vol', 'custo', 'carga_minima', 'penalidade', 'Criterio Penalidade'
-    ]
+def secao(colunas):
+    # DataFrame de uma seção do arquivo; dtype object mantém inteiros sem ".0" no CSV (mesmo formato de antes)
+    return pd.DataFrame(colunas).astype(object).reindex(columns=COLUNAS)
+
+def gravar_secao(arquivo, colunas):
+    # Acrescenta as linhas de uma seção (ou de um bloco dela) ao arquivo já aberto, sem cabeçalho
+    secao(colunas).to_csv(arquivo, sep=';', decimal='.', index=False, header=False)
+
+def blocos(total, tamanho_bloco):
+    # Intervalos [inicio, fim) de no máximo tamanho_bloco linhas
+    for inicio in range(0, total, tamanho_bloco):
+        yield inicio, min(inicio + tamanho_bloco, total)
+
+def abrir_saida(caminho_arquivo, comprimir):
+    # newline='' mantém o terminador de linha escrito pelo pandas (o mesmo de quando gravava pelo caminho)
+    if comprimir:
+        return gzip.open(caminho_arquivo, 'wt', encoding='utf-8', newline='')
+    return open(caminho_arquivo, 'w', encoding='utf-8', newline='')
+
+def gerar_instancia(config, pos_raiz, variacao, rng=None, pasta_saida=None, comprimir=False,
+                    tamanho_bloco=TAMANHO_BLOCO):
+    # Gera e grava a instância em streaming: cada seção vai para o arquivo assim que é criada e
+    # clientes/UMs são produzidos em blocos de tamanho_bloco linhas, então a memória não cresce
+    # com o tamanho da instância. Com comprimir=True o arquivo é gravado como .csv.gz.
+    rng = rng if rng is not None else np.random.default_rng()
+    pasta_saida = pasta_saida or PASTA_SAIDA
 
-    df = pd.DataFrame(columns=colunas)
     regioes = definir_regioes()
-    veiculos = gerar_frota(config['num_veiculos'])
+    veiculos = gerar_frota(config['num_veiculos'], rng)
     penalidade_global = calcular_penalidade_global(veiculos)
 
     num_clientes = config['num_clientes']
@@ -216,9 +231,17 @@ def gerar_instancia(config, pos_raiz, variacao):
         num_clientes,
         config['min_cargas_cliente'],
         config['max_cargas_cliente'],
-        config['max_ums']
+        config['max_ums'],
+        rng
     )
-    total_ums = sum(cargas_por_cliente)
+    total_ums = int(cargas_por_cliente.sum())
+    # primeira UM (base 0) de cada cliente seguinte: o cliente da UM k é searchsorted(fim_cliente, k, 'right') + 1
+    fim_cliente = np.cumsum(cargas_por_cliente)
+
+    # Um fluxo aleatório por coluna sorteada: cada bloco continua o fluxo de onde o anterior parou,
+    # então o conteúdo do arquivo não depende de tamanho_bloco
+    (rng_coord, rng_peso, rng_volume, rng_restricao,
+     rng_descricao, rng_penalidade) = rng.spawn(6)
 
     nome_arquivo = gerar_nome_arquivo(
         config['num_veiculos'],
@@ -228,102 +251,101 @@ def gerar_instancia(config, pos_raiz, variacao):
         pos_raiz
     )
 
-    # Penalidade global
-    df = pd.concat([df, pd.DataFrame([{
-        'tipo': 'parametro',
-        'id': 1,
-        'descricao': 'Penalidade por não alocação',
-        'valor': round(penalidade_global, 4)
-    }])], ignore_index=True, sort=False)
-
-    # Nó raiz
-    df = pd.concat([df, pd.DataFrame([{
-        'tipo': 'no',
-        'id': 0,
-        'descricao': 'No_Raiz',
-        'destino': 'CENTRO' if pos_raiz == 'centro' else 'CANTO'
-    }])], ignore_index=True, sort=False)
-
-    # garante distribuição por regiões
-    contadores_regiao = {1: 1, 2: 1, 3: 1, 4: 1}
-    clientes_por_regiao = {1: 0, 2: 0, 3: 0, 4: 0}
-    
-    # Distribui clientes pelas regiões
-    for regiao_id in range(1, NUM_REGIOES+1):
-        clientes_por_regiao[regiao_id] = num_clientes // NUM_REGIOES
-    
-    # Distribui clientes restantes
-    clientes_restantes = num_clientes % NUM_REGIOES
-    for regiao_id in range(1, clientes_restantes + 1):
-        clientes_por_regiao[regiao_id] += 1
-
-    cliente_id = 1
-    for regiao_id, num_clientes_regiao in clientes_por_regiao.items():
-        regiao = next(r for r in regioes if r['id'] == regiao_id)
-        
-        for _ in range(num_clientes_regiao):
-            x = random.uniform(regiao['x_min'], regiao['x_max'])
-            y = random.uniform(regiao['y_min'], regiao['y_max'])
-            
-            df = pd.concat([df, pd.DataFrame([{
+    criar_pasta(pasta_saida)
+    extensao = '.csv.gz' if comprimir else '.csv'
+    caminho_arquivo = os.path.join(pasta_saida, f"{nome_arquivo}{extensao}")
+
+    with abrir_saida(caminho_arquivo, comprimir) as arquivo:
+        arquivo.write(';'.join(COLUNAS) + os.linesep)
+
+        # Penalidade global
+        gravar_secao(arquivo, {
+            'tipo': ['parametro'],
+            'id': [1],
+            'descricao': ['Penalidade por não alocação'],
+            'valor': [round(penalidade_global, 4)]
+        })
+
+        # Nó raiz
+        gravar_secao(arquivo, {
+            'tipo': ['no'],
+            'id': [0],
+            'descricao': ['No_Raiz'],
+            'destino': ['CENTRO' if pos_raiz == 'centro' else 'CANTO']
+        })
+
+        # Distribui clientes pelas regiões (restantes vão para as primeiras regiões)
+        clientes_por_regiao = np.full(NUM_REGIOES, num_clientes // NUM_REGIOES)
+        clientes_por_regiao[:num_clientes % NUM_REGIOES] += 1
+        fim_regiao = np.cumsum(clientes_por_regiao)
+        inicio_regiao = fim_regiao - clientes_por_regiao
+        limites = np.array([[r['x_min'], r['x_max'], r['y_min'], r['y_max']] for r in regioes], dtype=float)
+
+        for inicio, fim in blocos(num_clientes, tamanho_bloco):
+            indices = np.arange(inicio, fim)
+            regiao = np.searchsorted(fim_regiao, indices, side='right')  # base 0
+            contador = indices - inicio_regiao[regiao] + 1  # cliente dentro da sua região (1, 2, ...)
+            x_min, x_max, y_min, y_max = limites[regiao].T
+            coordenadas = rng_coord.random((fim - inicio, 2))
+            gravar_secao(arquivo, {
                 'tipo': 'cliente',
-                'id': cliente_id,
-                'descricao': f'Cliente_R{regiao_id}_{contadores_regiao[regiao_id]}',
-                'destino': f"R{regiao_id}",
-                'x': x,
-                'y': y
-            }])], ignore_index=True, sort=False)
-            
-            cliente_id += 1
-            contadores_regiao[regiao_id] += 1
-
-    # Veículos
-    for veiculo in veiculos:
-        df = pd.concat([df, pd.DataFrame([{
+                'id': indices + 1,
+                'descricao': [f'Cliente_R{r}_{k}' for r, k in zip((regiao + 1).tolist(), contador.tolist())],
+                'destino': [f"R{r}" for r in (regiao + 1).tolist()],
+                'x': x_min + (x_max - x_min) * coordenadas[:, 0],
+                'y': y_min + (y_max - y_min) * coordenadas[:, 1]
+            })
+
+        # Veículos
+        gravar_secao(arquivo, {
             'tipo': 'veiculo',
-            'id': veiculo['id'],
-            'descricao': f"Veiculo_{veiculo['tipo']}",
-            'destino': veiculo['destino'],
-            'capacidade_peso': veiculo['capacidade_peso'],
-            'capacidade_vol': veiculo['capacidade_vol'],
-            'custo': veiculo['custo'],
-            'carga_minima': veiculo.get('carga_minima', max(1, veiculo['capacidade_peso'] // 2)) #ajustar para quanto???
-        }])], ignore_index=True, sort=False)
+            'id': [v['id'] for v in veiculos],
+            'descricao': [f"Veiculo_{v['tipo']}" for v in veiculos],
+            'destino': [v['destino'] for v in veiculos],
+            'capacidade_peso': [v['capacidade_peso'] for v in veiculos],
+            'capacidade_vol': [v['capacidade_vol'] for v in veiculos],
+            'custo': [v['custo'] for v in veiculos],
+            'carga_minima': [v.get('carga_minima', max(1, v['capacidade_peso'] // 2)) for v in veiculos] #ajustar para quanto???
+        })
 
-    tipos_carga = ['chapa', 'tira', 'perfil', 'tubo']
-    um_id = 1
+        # Perfil de compatibilidade: a lista de tipos é gravada uma vez numa linha 'compatibilidade'
+        # e cada UM referencia o perfil como '#id' (antes a lista inteira era repetida em toda UM)
+        veiculos_compatíveis = ','.join(dict.fromkeys(v['tipo'] for v in veiculos if v['tipo'] != 'Sem recursos'))
+        gravar_secao(arquivo, {
+            'tipo': ['compatibilidade'],
+            'id': [1],
+            'descricao': ['Perfil_1'],
+            'compatibilidade': [veiculos_compatíveis]
+        })
+
+        # UMs: colunas sorteadas bloco a bloco
+        tipos_carga = np.array(['chapa', 'tira', 'perfil', 'tubo'], dtype=object)
+        restricoes = np.array(['Não empilhar', 'Frágil', 'Pesado', ''], dtype=object)
 
-    for cliente_id in range(1, num_clientes + 1):
-        num_cargas = cargas_por_cliente[cliente_id - 1]
+        for inicio, fim in blocos(total_ums, tamanho_bloco):
+            n = fim - inicio
+            cliente_um = np.searchsorted(fim_cliente, np.arange(inicio, fim), side='right') + 1
+            peso = rng_peso.integers(500, 3001, size=n)
+            volume = np.round(0.5 + 9.5 * rng_volume.random(n), 1)
+            restricao = restricoes[rng_restricao.integers(0, len(restricoes), size=n)]
+            descricao = tipos_carga[rng_descricao.integers(0, len(tipos_carga), size=n)]
 
-        for _ in range(num_cargas):
-            veiculos_compatíveis = [v['tipo'] for v in veiculos if v['tipo'] != 'Sem recursos']
-            peso = random.randint(500, 3000)
-            volume = round(random.uniform(0.5, 10.0), 1)
-            restricao = random.choice(['Não empilhar', 'Frágil', 'Pesado', ''])
-            
             # Determina penalidade e critério
-            penalidade, criterio_penalidade = determinar_penalidade_e_criterio(peso, volume, restricao, cliente_id)
+            penalidade, criterio_penalidade = determinar_penalidade_e_criterio(
+                peso, volume, restricao, cliente_um, rng_penalidade)
 
-            df = pd.concat([df, pd.DataFrame([{
+            gravar_secao(arquivo, {
                 'tipo': 'um',
-                'id': um_id,
-                'descricao': random.choice(tipos_carga),
+                'id': np.arange(inicio + 1, fim + 1),
+                'descricao': descricao,
                 'peso': peso,
                 'volume': volume,
-                'cliente': cliente_id,
-                'compatibilidade': ','.join(veiculos_compatíveis),
+                'cliente': cliente_um,
+                'compatibilidade': '#1',
                 'restricao': restricao,
                 'penalidade': penalidade,
                 'Criterio Penalidade': criterio_penalidade
-            }])], ignore_index=True, sort=False)
-
-            um_id += 1
-
-    # Salvar
-    criar_pasta(PASTA_SAIDA)
-    caminho_arquivo = os.path.join(PASTA_SAIDA, f"{nome_arquivo}.csv")
-    df.to_csv(caminho_arquivo, sep=';', decimal='.', index=False)
+            })
 
     print(f'Arquivo gerado: {nome_arquivo}')
 
@@ -338,36 +360,70 @@ def gerar_instancia(config, pos_raiz, variacao):
         'Arquivo': nome_arquivo
     }
 
-# ====================== 🚀 EXECUÇÃO PRINCIPAL ======================
+# ====================== 🎲 SEMENTES ======================
+
+POSICOES_RAIZ = ('centro', 'canto')
 
-def gerar_todas_instancias():
-    criar_pasta(PASTA_SAIDA)
-    dados_instancias = []
+def semente_instancia(config, variacao, pos_raiz, semente_base=SEMENTE_BASE):
+    # Semente determinística e independente por instância: depende só da configuração, da variação
+    # e da posição da raiz (não da ordem de execução nem do número de workers)
+    chave = [semente_base, config['num_veiculos'], config['num_clientes'], config['max_ums'],
+             config['min_cargas_cliente'], config['max_cargas_cliente'], variacao,
+             POSICOES_RAIZ.index(pos_raiz)]
+    return np.random.SeedSequence(chave)
 
-    for config in CONFIGURACOES:
-        num_variacoes = NUM_INSTANCIAS[config['num_veiculos']]
-        
-        for variacao in range(1, num_variacoes + 1):
-            # Versão centro
-            dados = gerar_instancia(config, 'centro', variacao)
-            dados_instancias.append(dados)
+def _gerar_tarefa(tarefa):
+    # Executada nos workers: recebe (config, pos_raiz, variacao, semente_base, opcoes) e devolve os metadados
+    config, pos_raiz, variacao, semente_base, opcoes = tarefa
+    rng = np.random.default_rng(semente_instancia(config, variacao, pos_raiz, semente_base))
+    return gerar_instancia(config, pos_raiz, variacao, rng, **opcoes)
 
-            # Versão canto
-            dados = gerar_instancia(config, 'canto', variacao)
-            dados_instancias.append(dados)
+# ====================== 🚀 EXECUÇÃO PRINCIPAL ======================
+
+def gerar_todas_instancias(num_workers=None, semente_base=SEMENTE_BASE, pasta_saida=None,
+                           comprimir=False):
+    pasta_saida = pasta_saida or PASTA_SAIDA
+    criar_pasta(pasta_saida)
+
+    opcoes = {'pasta_saida': pasta_saida, 'comprimir': comprimir}
+    tarefas = [
+        (config, pos_raiz, variacao, semente_base, opcoes)
+        for config in CONFIGURACOES
+        for variacao in range(1, config['num_instancias'] + 1)
+        for pos_raiz in POSICOES_RAIZ  # versão centro e versão canto
+    ]
+
+    # map preserva a ordem das tarefas, então o resumo não depende do número de workers
+    if num_workers == 1:
+        dados_instancias = [_gerar_tarefa(t) for t in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            dados_instancias = list(executor.map(_gerar_tarefa, tarefas))
 
     # Gerar relatório
     resumo = pd.DataFrame(dados_instancias)
-    resumo.to_csv(os.path.join(PASTA_SAIDA, '00_RESUMO_COMPLETO.csv'), index=False)
+    resumo.to_csv(os.path.join(pasta_saida, '00_RESUMO_COMPLETO.csv'), index=False)
 
     # Tabela resumo
     resumo_consolidado = resumo.groupby(['Veículos', 'Clientes', 'UMs']).size().reset_index()
     resumo_consolidado.columns = ['Veículos', 'Clientes', 'UMs', 'Qtd Instâncias']
-    resumo_consolidado.to_csv(os.path.join(PASTA_SAIDA, '00_RESUMO.csv'), index=False)
+    resumo_consolidado.to_csv(os.path.join(pasta_saida, '00_RESUMO.csv'), index=False)
 
     print("\n📊 RESUMO DAS INSTÂNCIAS GERADAS:")
     print(resumo_consolidado.to_string(index=False))
-    print(f"\n📄 Relatório completo salvo em: {os.path.join(PASTA_SAIDA, '00_RESUMO_COMPLETO.csv')}")
+    print(f"\n📄 Relatório completo salvo em: {os.path.join(pasta_saida, '00_RESUMO_COMPLETO.csv')}")
 
 if __name__ == '__main__':
-    gerar_todas_instancias()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Gera o catálogo de instâncias')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processos paralelos de geração (padrão: núcleos da máquina)')
+    parser.add_argument('--semente', type=int, default=SEMENTE_BASE,
+                        help='Semente base do catálogo')
+    parser.add_argument('--pasta-saida', default=None,
+                        help='Pasta de destino das instâncias (padrão: PASTA_SAIDA)')
+    parser.add_argument('--comprimir', action='store_true',
+                        help='Grava as instâncias como .csv.gz')
+    args = parser.parse_args()
+
+    gerar_todas_instancias(num_workers=args.workers, semente_base=args.semente,
+                           pasta_saida=args.pasta_saida, comprimir=args.comprimir)